@@ -0,0 +1,133 @@
+"""
+Microbenchmark: decoding and prompt-building cost of large /format-results and
+/shopping-recommendations bodies, legacy path vs the current one.
+
+The legacy path is stdlib ``json.loads`` with full pydantic validation of every
+row, then ``json.dumps(rows[:20], indent=2)`` for the prompt. The current path is
+the bridge's ``decode_payload`` (orjson when installed, lists capped and left
+unvalidated), then the compact encoding. That encoding does more work than the
+legacy prompt, because it computes statistics over every row.
+
+    python benchmarks/json_payloads.py            # 1k / 10k / 100k rows
+    python benchmarks/json_payloads.py --rows 5000 --json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# pylint: disable=wrong-import-position
+from bridge_json import decode_payload, orjson  # noqa: E402
+from bridge_results import compact_results  # noqa: E402
+
+MERCHANTS = ["Amazon", "Costco", "Doordash", "Instacart", "Target", "Ubereats", "Walmart"]
+
+
+class LegacyFormatPayload(BaseModel):
+    user_query: str
+    sql_query: Optional[str] = None
+    results: List[Dict[str, Any]] = []
+    model: Optional[str] = None
+
+
+def make_rows(count: int) -> List[Dict[str, Any]]:
+    rng = random.Random(count)
+    return [
+        {
+            "transaction_id": f"{rng.getrandbits(64):016x}",
+            "merchant_name": rng.choice(MERCHANTS),
+            "datetime": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00",
+            "order_status": rng.choice(["COMPLETED", "SHIPPED", "CANCELLED"]),
+            "price_total": round(rng.uniform(5, 500), 2),
+            "total_tax": round(rng.uniform(0, 40), 2),
+        }
+        for _ in range(count)
+    ]
+
+
+def legacy_decode(body: bytes) -> LegacyFormatPayload:
+    return LegacyFormatPayload(**json.loads(body))
+
+
+def legacy_prompt(payload: LegacyFormatPayload) -> str:
+    return json.dumps(payload.results[:20], indent=2, default=str)
+
+
+def current_decode(body: bytes) -> List[Dict[str, Any]]:
+    data, lists, _ = decode_payload(body, max_bytes=1 << 30, list_caps={"results": 100_000})
+    LegacyFormatPayload(**data)
+    return lists["results"]
+
+
+def current_prompt(rows: List[Dict[str, Any]]) -> str:
+    return compact_results(rows).render()
+
+
+def timed(func: Callable[[Any], Any], arg: Any, repeat: int) -> Tuple[float, Any]:
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(arg)
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3), result
+
+
+def measure(decode: Callable, prompt: Callable, body: bytes, repeat: int) -> Dict[str, Any]:
+    decode_ms, decoded = timed(decode, body, repeat)
+    prompt_ms, text = timed(prompt, decoded, repeat)
+    return {"decode_ms": decode_ms, "prompt_ms": prompt_ms, "prompt_bytes": len(text)}
+
+
+def run(row_counts: List[int], repeat: int) -> List[Dict[str, Any]]:
+    report = []
+    for count in row_counts:
+        body = json.dumps({"user_query": "How much did I spend?", "results": make_rows(count)})
+        body_bytes = body.encode("utf-8")
+        report.append(
+            {
+                "rows": count,
+                "body_bytes": len(body_bytes),
+                "legacy": measure(legacy_decode, legacy_prompt, body_bytes, repeat),
+                "current": measure(current_decode, current_prompt, body_bytes, repeat),
+            }
+        )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="*", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print a machine-readable report")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    if args.json:
+        print(json.dumps({"codec": "orjson" if orjson else "json", "results": report}))
+        return
+    print(f"codec: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(
+        f"{'rows':>8} {'body MB':>8} {'decode ms (legacy/now)':>24} "
+        f"{'prompt ms (legacy/now)':>24} {'prompt KB (legacy/now)':>24}"
+    )
+    for item in report:
+        legacy, current = item["legacy"], item["current"]
+        print(
+            f"{item['rows']:>8} {item['body_bytes'] / 1e6:>8.2f} "
+            f"{legacy['decode_ms']:>12.2f} /{current['decode_ms']:>9.2f} "
+            f"{legacy['prompt_ms']:>12.2f} /{current['prompt_ms']:>9.2f} "
+            f"{legacy['prompt_bytes'] / 1e3:>12.1f} /{current['prompt_bytes'] / 1e3:>9.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
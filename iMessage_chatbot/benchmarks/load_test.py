@@ -0,0 +1,297 @@
+"""
+Load test for the bridge itself, with Dedalus replaced by a local stub.
+
+``AsyncDedalus``/``DedalusRunner`` are swapped for a stub runner with a
+configurable latency distribution and failure rate. The app is then driven
+in-process over ASGI, so results measure the bridge's own overhead (parsing,
+prompt building, caching, coalescing, queueing) and not network or model time.
+Every endpoint runs at a fixed concurrency. The report covers throughput,
+p50/p95/p99 latency, status counts and peak RSS, as JSON for comparing runs
+over time.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --latency lognormal:0.8:0.4 --failure-rate 0.02 \\
+        --concurrency 32 --requests 500 --output bench.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DEDALUS_API_KEY", "stub")
+
+# pylint: disable=wrong-import-position
+import dedalus_bridge  # noqa: E402
+
+SCHEMA = """
+- transactions: transaction_id, merchant_name, datetime, order_status, payment_method_brand,
+  payment_method_type, price_total, total_discount, total_fee, total_tax, total_tip
+- products: transaction_id, merchant_name, product_name, quantity, product_total,
+  product_unit_price, eligibility
+"""
+MERCHANTS = ["Amazon", "Costco", "Doordash", "Instacart", "Target", "Ubereats", "Walmart"]
+SQL_QUESTIONS = [
+    "How much did I spend at {merchant} last month?",
+    "Show my recent purchases from {merchant}",
+    "Which merchants do I spend the most at?",
+    "Which {merchant} orders had a total over {amount} dollars and were cancelled?",
+]
+INTERPRET_MESSAGES = [
+    "how much did I spend at {merchant} last month",
+    "show me my top 5 products",
+    "I want to buy new headphones but I'm worried about the price, order {amount}",
+]
+
+
+class LatencyModel:
+    """``const:S``, ``uniform:LO:HI`` or ``lognormal:MEDIAN:SIGMA`` (seconds)."""
+
+    def __init__(self, spec: str, seed: int = 7) -> None:
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(value) for value in params]
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.kind == "const":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.random.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return self.random.lognormvariate(0, sigma) * median
+        raise ValueError(f"Unknown latency distribution {self.kind!r}")
+
+
+class StubResult:
+    def __init__(self, final_output: str) -> None:
+        self.final_output = final_output
+
+
+class StubClient:
+    async def aclose(self) -> None:
+        return None
+
+
+class StubRunner:
+    latency = LatencyModel("const:0.05")
+    failure_rate = 0.0
+
+    def __init__(self, client: Any = None) -> None:
+        self.client = client
+
+    @staticmethod
+    def _answer(input_text: str, system_prompt: Optional[str]) -> str:
+        prompt = system_prompt or ""
+        if "SQL" in prompt:
+            return "SELECT merchant_name, SUM(price_total) AS total FROM transactions GROUP BY 1"
+        if "JSON" in prompt or "intent" in input_text.lower():
+            return json.dumps({"intent": "fallback", "time_range": {}, "limit": None, "params": {}})
+        return "Stub answer: " + " ".join(input_text.split()[:40])
+
+    async def _delay(self) -> None:
+        await asyncio.sleep(self.latency.sample())
+        if self.failure_rate and self.latency.random.random() < self.failure_rate:
+            raise RuntimeError("stub upstream failure")
+
+    async def _stream(self, text: str) -> AsyncIterator[str]:
+        await self._delay()
+        for word in text.split():
+            yield word + " "
+
+    # pylint: disable-next=redefined-builtin
+    def run(self, input: str, model: str, **kwargs: Any) -> Any:
+        text = self._answer(input, kwargs.get("system_prompt"))
+        if kwargs.get("stream"):
+            return self._stream(text)
+        return self._complete(text)
+
+    async def _complete(self, text: str) -> StubResult:
+        await self._delay()
+        return StubResult(text)
+
+
+def _rows(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {
+            "merchant_name": rng.choice(MERCHANTS),
+            "datetime": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "price_total": round(rng.uniform(5, 500), 2),
+        }
+        for _ in range(count)
+    ]
+
+
+def workloads(rows: int, unique: bool) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    rng = random.Random(11)
+    result_rows = _rows(rows, rng)
+    history = [
+        {"merchant": row["merchant_name"], "total": row["price_total"]} for row in result_rows
+    ]
+
+    def fill(template: str, index: int) -> str:
+        text = template.format(merchant=MERCHANTS[index % len(MERCHANTS)], amount=index % 97)
+        return f"{text} (#{index})" if unique else text
+
+    return {
+        "/format-results": lambda i: {
+            "user_query": fill("How much did I spend at {merchant}?", i),
+            "results": result_rows,
+        },
+        "/generate-sql": lambda i: {
+            "question": fill(SQL_QUESTIONS[i % len(SQL_QUESTIONS)], i),
+            "schema": SCHEMA,
+        },
+        "/shopping-recommendations": lambda i: {
+            "category": ["shoes", "electronics", "groceries"][i % 3],
+            "purchase_history": history,
+            "top_merchants": [{"name": name, "total": 100.0} for name in MERCHANTS[:3]],
+            "favorite_merchants": MERCHANTS[:2],
+            "total_purchases": len(history) + (i if unique else 0),
+        },
+        "/interpret-query": lambda i: {
+            "message": fill(INTERPRET_MESSAGES[i % len(INTERPRET_MESSAGES)], i),
+        },
+    }
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    build: Callable[[int], Dict[str, Any]],
+    concurrency: int,
+    requests: int,
+) -> Dict[str, Any]:
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def worker() -> None:
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            body = build(index)
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as error:
+                status = type(error).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {
+            name: round(percentile(latencies, q) * 1000, 2)
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "statuses": statuses,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    StubRunner.latency = LatencyModel(args.latency)
+    StubRunner.failure_rate = args.failure_rate
+    dedalus_bridge.AsyncDedalus = StubClient
+    dedalus_bridge.DedalusRunner = StubRunner
+
+    app = dedalus_bridge.app
+    selected = workloads(args.rows, args.unique)
+    if args.endpoints:
+        selected = {name: selected[name] for name in args.endpoints}
+
+    reports = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bridge", timeout=None
+        ) as client:
+            for endpoint, build in selected.items():
+                reports.append(
+                    await drive(client, endpoint, build, args.concurrency, args.requests)
+                )
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "latency": args.latency,
+            "failure_rate": args.failure_rate,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "rows": args.rows,
+            "unique": args.unique,
+        },
+        "endpoints": reports,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency", default="const:0.05", help="stub upstream latency model")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--rows", type=int, default=200, help="rows per results/history body")
+    parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="make every request distinct so caches and coalescing do not absorb load",
+    )
+    parser.add_argument("--endpoints", nargs="*", help="subset of endpoints to drive")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    for item in report["endpoints"]:
+        latency = item["latency_ms"]
+        print(
+            f"{item['endpoint']:<28} {item['throughput_rps']:>8.1f} req/s  "
+            f"p50 {latency['p50']:>8.2f}ms  p95 {latency['p95']:>8.2f}ms  "
+            f"p99 {latency['p99']:>8.2f}ms  {item['statuses']}",
+            file=sys.stderr,
+        )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
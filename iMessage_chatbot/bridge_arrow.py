@@ -0,0 +1,97 @@
+"""
+Arrow IPC input for /format-results.
+
+Callers with large results can POST an Arrow IPC stream
+(``application/vnd.apache.arrow.stream``) instead of a JSON list of row dicts.
+The body is read in place, without copying it. Statistics are computed with
+Arrow compute kernels, and only the sample rows are turned into Python objects.
+Dictionary-encoded columns (pandas categoricals, most Parquet readers) are
+decoded first, since the min/max kernels do not take them. pyarrow is optional
+and imported on first use.
+"""
+
+from typing import Any, Dict, List
+
+from bridge_results import CompactResults, clip_text, round_number
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class InvalidArrowStream(ValueError):
+    """The request body is not a readable Arrow IPC stream (malformed or truncated)."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.compute  # pylint: disable=import-outside-toplevel,unused-import
+        import pyarrow.ipc  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as exc:
+        raise ImportError(
+            "pyarrow is required for Arrow request bodies. Install with `pip install pyarrow`."
+        ) from exc
+    return pyarrow
+
+
+def read_arrow_stream(body: bytes) -> Any:
+    pa = _pyarrow()
+    try:
+        return pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowException as error:
+        raise InvalidArrowStream(f"Body is not a valid Arrow IPC stream: {error}") from error
+
+
+def _column_stats(column: Any, top_k: int) -> Dict[str, Any]:
+    pa = _pyarrow()
+    pc = pa.compute
+    stats: Dict[str, Any] = {"count": len(column) - column.null_count}
+    if not stats["count"]:
+        return stats
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    kind = column.type
+    if pa.types.is_integer(kind) or pa.types.is_floating(kind) or pa.types.is_decimal(kind):
+        # top_k_unstable ranks nulls too; with fewer values than top_k they would be taken.
+        values = column.drop_null().cast(pa.float64())
+        bounds = pc.min_max(values).as_py()
+        stats.update(
+            sum=round_number(pc.sum(values).as_py()),
+            mean=round_number(pc.mean(values).as_py()),
+            min=round_number(bounds["min"]),
+            max=round_number(bounds["max"]),
+            top=[
+                round_number(value)
+                for value in values.take(pc.top_k_unstable(values, top_k)).to_pylist()
+            ],
+        )
+        return stats
+
+    if pa.types.is_nested(kind):
+        # Lists, structs and maps have no value_counts or min/max kernel.
+        return stats
+    counts = pc.value_counts(column.drop_null()).flatten()
+    values, frequencies = counts
+    stats["distinct"] = len(values)
+    if not pa.types.is_boolean(kind):
+        bounds = pc.min_max(column).as_py()
+        stats.update(min=clip_text(str(bounds["min"])), max=clip_text(str(bounds["max"])))
+    if len(values) < stats["count"]:
+        counts_table = pa.table({"value": values, "count": frequencies})
+        order = pc.select_k_unstable(counts_table, top_k, sort_keys=[("count", "descending")])
+        top = counts_table.take(order)
+        stats["top"] = [
+            [clip_text(str(value)), count]
+            for value, count in zip(top["value"].to_pylist(), top["count"].to_pylist())
+        ]
+    return stats
+
+
+def compact_arrow(table: Any, sample_rows: int = 20, top_k: int = 3) -> CompactResults:
+    names: List[str] = list(table.column_names)
+    sample = table.slice(0, sample_rows).to_pylist()
+    return CompactResults(
+        row_count=table.num_rows,
+        columns=names,
+        sample=[[row[name] for name in names] for row in sample],
+        stats={name: _column_stats(table.column(name), top_k) for name in names},
+    )
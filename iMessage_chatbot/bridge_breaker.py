@@ -0,0 +1,204 @@
+"""
+Per-model circuit breakers around upstream Dedalus calls.
+
+Each model has a breaker that watches its recent calls. Errors count as
+failures, and so do answers slower than ``slow_call_seconds``. Once at least
+``min_calls`` of the last ``window`` calls (within ``window_seconds``) fail at
+``failure_ratio`` or more, the breaker opens. While open, calls are rejected
+with ``CircuitOpen`` right away, and routes fall back to degraded answers
+instead of waiting on a sick upstream. After ``cooldown_seconds`` it turns
+half-open and lets ``probes`` calls through: a good probe closes it, a bad one
+re-opens it for another cooldown.
+
+Timeouts count as failures. Queue rejections and cancelled calls (e.g. a losing
+hedge, or a caller whose own deadline ran out) say nothing about upstream
+health, so they are not counted.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+from bridge_limits import CapacityExceeded
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(CapacityExceeded):
+    """Raised instead of calling a model whose breaker is open."""
+
+    def __init__(self, model: str, retry_after: int) -> None:
+        super().__init__(model, "circuit open", 503, retry_after)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        model: str,
+        *,
+        window: int = 20,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_ratio: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        cooldown_seconds: float = 30.0,
+        probes: int = 1,
+    ) -> None:
+        self.model = model
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.probes = max(1, probes)
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=max(1, window))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "opened": 0,
+            "closed": 0,
+            "rejected": 0,
+            "probes": 0,
+            "failures": 0,
+            "slow": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.cooldown_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def rejecting(self) -> bool:
+        """True while ``admit`` would raise."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == OPEN or (
+                state == HALF_OPEN and self._probes_in_flight >= self.probes
+            )
+
+    def retry_after(self) -> int:
+        remaining = self.cooldown_seconds - (time.monotonic() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+    def admit(self) -> bool:
+        """
+        Let a call through or raise ``CircuitOpen``. Returns True when the call
+        is a half-open probe; pass that back to ``record``.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                self.counters["probes"] += 1
+                return True
+            self.counters["rejected"] += 1
+            raise CircuitOpen(self.model, self.retry_after())
+
+    def record(self, probe: bool, outcome: str, latency: float) -> None:
+        """Record a finished call; ``outcome`` is ok, error, timeout, cancelled or rejected."""
+        with self._lock:
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if outcome not in ("ok", "error", "timeout"):
+                return
+            now = time.monotonic()
+            slow = outcome == "ok" and latency > self.slow_call_seconds
+            failed = outcome != "ok" or slow
+            if slow:
+                self.counters["slow"] += 1
+            elif failed:
+                self.counters["failures"] += 1
+
+            if probe or self._state == HALF_OPEN:
+                if failed:
+                    self._trip(now)
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self.counters["closed"] += 1
+                return
+
+            self._outcomes.append((now, failed))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            failures = sum(1 for _, bad in self._outcomes if bad)
+            if (
+                self._state == CLOSED
+                and calls >= self.min_calls
+                and failures / calls >= self.failure_ratio
+            ):
+                self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.counters["opened"] += 1
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            calls = len(self._outcomes)
+            failures = sum(1 for _, bad in self._outcomes if bad)
+            described: Dict[str, Any] = dict(
+                self.counters,
+                state=state,
+                recent_calls=calls,
+                recent_failures=failures,
+            )
+            if state == OPEN:
+                described["retry_after"] = self.retry_after()
+            return described
+
+
+class BreakerBoard:
+    """One breaker per model, created on first use with shared settings."""
+
+    def __init__(self, *, enabled: bool = True, **settings: Any) -> None:
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(model, **self.settings)
+            return breaker
+
+    def admit(self, model: str) -> bool:
+        return self.get(model).admit() if self.enabled else False
+
+    def record(self, model: str, probe: bool, outcome: str, latency: float) -> None:
+        if self.enabled:
+            self.get(model).record(probe, outcome, latency)
+
+    def is_open(self, model: str) -> bool:
+        """True while calls to ``model`` would be rejected."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            breaker = self._breakers.get(model)
+        return breaker is not None and breaker.rejecting()
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.model: breaker.describe() for breaker in breakers}
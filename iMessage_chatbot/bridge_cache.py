@@ -0,0 +1,170 @@
+"""
+Response cache for the Dedalus bridge.
+
+Most chat turns are near-duplicates ("how much did I spend at Amazon last month"),
+so the bridge keeps recent model answers keyed by a normalized form of the
+question plus a hash of everything else that shapes the answer (model, system
+prompt, schema). Entries are evicted LRU-first once the size limits are hit and
+expire after a TTL.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+_QUOTES = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"'})
+
+
+def normalize_question(text: str) -> str:
+    """
+    Canonicalize a user question so trivially different phrasings share a key.
+    Only case, quotes, whitespace and trailing punctuation are folded; words are
+    left alone because they can change the meaning of the query.
+    """
+    text = (text or "").translate(_QUOTES).lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def context_hash(*parts: Optional[str]) -> str:
+    """Stable digest of the prompt context (model, system prompt, schema, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+def make_cache_key(endpoint: str, question: str, *context: Optional[str]) -> str:
+    return f"{endpoint}:{context_hash(*context)}:{normalize_question(question)}"
+
+
+class CacheStats:
+    """Per-endpoint hit/miss/eviction counters."""
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def incr(self, endpoint: str, counter: str) -> None:
+        bucket = self._counters.setdefault(
+            endpoint, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        )
+        bucket[counter] = bucket.get(counter, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        for endpoint, counters in list(self._counters.items()):
+            lookups = counters["hits"] + counters["misses"]
+            result[endpoint] = dict(
+                counters, hit_rate=round(counters["hits"] / lookups, 4) if lookups else 0.0
+            )
+        return result
+
+
+class ResponseCache:
+    """
+    In-process LRU + TTL cache. Any object exposing the same ``get``/``set``/
+    ``invalidate``/``clear``/``stats`` methods can be plugged into the bridge
+    in its place. Request paths use the ``aget``/``aset``/``ainvalidate`` forms,
+    so a cache doing I/O can keep it off the event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl_seconds: float = 300.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, endpoint: str, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._drop(key)
+                self.stats.incr(endpoint, "evictions")
+                entry = None
+            if entry is None:
+                self.stats.incr(endpoint, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self.stats.incr(endpoint, "hits")
+            return entry[2]
+
+    async def aget(self, endpoint: str, key: str) -> Optional[str]:
+        return self.get(endpoint, key)
+
+    def set(self, endpoint: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        if not self.enabled or value is None:
+            return
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires_at, endpoint, value)
+            self._bytes += size
+            self.stats.incr(endpoint, "stores")
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest_key, (_, oldest_endpoint, _) = next(iter(self._entries.items()))
+                self._drop(oldest_key)
+                self.stats.incr(oldest_endpoint, "evictions")
+
+    async def aset(
+        self, endpoint: str, key: str, value: str, ttl: Optional[float] = None
+    ) -> None:
+        self.set(endpoint, key, value, ttl)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    async def ainvalidate(self, key: str) -> None:
+        self.invalidate(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "endpoints": self.stats.snapshot(),
+        }
+
+    def _drop(self, key: str) -> None:
+        _, _, value = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
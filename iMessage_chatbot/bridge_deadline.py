@@ -0,0 +1,202 @@
+"""
+Request deadlines, per-stage timeouts and cancellation on client disconnect.
+
+Callers send their remaining budget in milliseconds in the ``X-Deadline-Ms``
+header (requests without it get a default budget). ``DeadlineMiddleware`` turns
+that budget into a ``Deadline`` held in a context variable. Every task the
+request spawns inherits it, so stages deep inside a route can bound their waits
+without the deadline being passed along by hand.
+
+``bounded(stage, awaitable, limit)`` waits for at most the smaller of the
+stage's own limit and what is left of the request's budget. On expiry the
+awaitable is cancelled and ``DeadlineExceeded`` is raised, saying which stage
+ran out and whether the stage or the request budget was the tighter one.
+
+The middleware also cancels the route when the client disconnects before the
+response has started, and answers ``504`` itself if the route is still running
+once the budget (plus a short grace) is spent. Abandoned requests therefore
+stop holding model slots and sockets.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEADLINE_HEADER = "x-deadline-ms"
+
+_current: "contextvars.ContextVar[Optional[Deadline]]" = contextvars.ContextVar(
+    "bridge_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """A stage did not finish within its own limit or the request's budget."""
+
+    def __init__(self, stage: str, timeout: float, budget: str) -> None:
+        super().__init__(f"{stage} timed out after {timeout:.2f}s ({budget} budget)")
+        self.stage = stage
+        self.timeout = timeout
+        self.budget = budget
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "error": "deadline_exceeded",
+            "stage": self.stage,
+            "budget": self.budget,
+            "timeout_seconds": round(self.timeout, 3),
+        }
+
+
+class Deadline:
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default: float) -> Optional["Deadline"]:
+        """Budget from an ``X-Deadline-Ms`` value, else ``default`` seconds (0 for none)."""
+        if value:
+            try:
+                return cls(max(0.0, float(value) / 1000))
+            except ValueError:
+                pass
+        return cls(default) if default > 0 else None
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def set_deadline(deadline: Optional[Deadline]) -> "contextvars.Token[Optional[Deadline]]":
+    return _current.set(deadline)
+
+
+async def bounded(stage: str, awaitable: Awaitable[T], limit: Optional[float] = None) -> T:
+    """
+    Await ``awaitable`` for at most ``limit`` seconds or the rest of the current
+    request's budget, whichever is shorter; ``None`` for both waits unbounded.
+    """
+    deadline = _current.get()
+    timeout, budget, reported = limit, "stage", limit
+    if deadline is not None and (timeout is None or deadline.remaining() < timeout):
+        timeout, budget, reported = deadline.remaining(), "request", deadline.budget
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        close = getattr(awaitable, "close", None)
+        if close is not None:
+            close()
+        raise DeadlineExceeded(stage, reported or 0.0, budget)
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as error:
+        raise DeadlineExceeded(stage, reported or timeout, budget) from error
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that sets each HTTP request's ``Deadline`` and cancels the
+    route on client disconnect or once the deadline has passed. ``on_abandon``
+    is called with the reason, ``"disconnected"`` or ``"timeout"``.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        *,
+        default_budget: float,
+        grace: float = 0.25,
+        on_abandon: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.app = app
+        self.default_budget = default_budget
+        self.grace = grace
+        self.on_abandon = on_abandon
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = None
+        for name, value in scope.get("headers", ()):
+            if name.decode("latin-1").lower() == DEADLINE_HEADER:
+                header = value.decode("latin-1")
+        deadline = Deadline.from_header(header, self.default_budget)
+
+        body_read = asyncio.Event()
+        response_started = asyncio.Event()
+
+        async def tracked_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.disconnect" or not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def tracked_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response_started.set()
+            await send(message)
+
+        async def client_gone() -> None:
+            # Only listen once the route has read its body; after that the next
+            # message the server delivers is the disconnect.
+            await body_read.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        token = set_deadline(deadline)
+        try:
+            route = asyncio.ensure_future(self.app(scope, tracked_receive, tracked_send))
+        finally:
+            _current.reset(token)
+        watchers = [
+            asyncio.ensure_future(client_gone()),
+            asyncio.ensure_future(response_started.wait()),
+        ]
+        timeout = None if deadline is None else max(0.0, deadline.remaining()) + self.grace
+        try:
+            done, _ = await asyncio.wait(
+                [route, *watchers], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if route in done or response_started.is_set():
+                for watcher in watchers:
+                    watcher.cancel()
+                await route
+                return
+            route.cancel()
+            await asyncio.gather(route, return_exceptions=True)
+        finally:
+            for watcher in watchers:
+                watcher.cancel()
+            route.cancel()
+
+        if watchers[0] in done:
+            reason, status, detail = "disconnected", 499, {"error": "client_disconnected"}
+        else:
+            reason, status = "timeout", 504
+            detail = DeadlineExceeded("request", deadline.budget, "request").describe()
+        if self.on_abandon is not None:
+            self.on_abandon(reason)
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
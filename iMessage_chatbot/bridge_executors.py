@@ -0,0 +1,190 @@
+"""
+Pluggable SQL executors for the bridge's /ask pipeline.
+
+Every executor exposes ``async execute(sql) -> List[Dict[str, Any]]``. The
+Snowflake executor talks to the live warehouse; the SQLite and DuckDB executors
+load the Knot CSV exports locally so the whole pipeline can be exercised without
+Snowflake credentials.
+"""
+
+import asyncio
+import csv
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+KNOT_DATA_DIR = Path(__file__).resolve().parent.parent / "dataset" / "knot_data"
+DEFAULT_TABLES = {
+    "transactions": KNOT_DATA_DIR / "transactions.csv",
+    "products": KNOT_DATA_DIR / "products.csv",
+}
+
+
+class QueryExecutor:
+    name = "base"
+
+    async def execute(self, sql: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class SnowflakeExecutor(QueryExecutor):
+    """Runs queries on Snowflake using the same SNOWFLAKE_* variables as the loaders."""
+
+    name = "snowflake"
+
+    def __init__(self) -> None:
+        try:
+            import snowflake.connector  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError(
+                "snowflake-connector-python is required for the Snowflake executor. "
+                "Install with `pip install snowflake-connector-python`."
+            ) from exc
+        self._connector = snowflake.connector
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                self._conn = self._connector.connect(
+                    user=os.getenv("SNOWFLAKE_USER"),
+                    password=os.getenv("SNOWFLAKE_PASSWORD"),
+                    account=os.getenv("SNOWFLAKE_ACCOUNT"),
+                    warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+                    database=os.getenv("SNOWFLAKE_DATABASE"),
+                    schema=os.getenv("SNOWFLAKE_SCHEMA", "PUBLIC"),
+                )
+            return self._conn
+
+    def _execute(self, sql: str) -> List[Dict[str, Any]]:
+        cursor = self._connection().cursor()
+        try:
+            cursor.execute(sql)
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    async def execute(self, sql: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._execute, sql)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+
+
+# Numbers written the way they would be printed back: "0012" (IDs, ZIP codes),
+# "+5" or " 7" would change on the way through int/float, so they stay text.
+_CANONICAL_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+_INT64 = 1 << 63
+
+
+def _coerce(value: str) -> Any:
+    if value == "":
+        return None
+    match = _CANONICAL_NUMBER.fullmatch(value)
+    if match is None:
+        return value
+    if match.group(1) is None and "e" not in value.lower():
+        number = int(value)
+        # Longer digit strings (order numbers, card tokens) do not fit SQLite's INTEGER.
+        return number if -_INT64 <= number < _INT64 else value
+    return float(value)
+
+
+class SQLiteExecutor(QueryExecutor):
+    """In-memory SQLite database seeded from CSV files; a stand-in for tests and demos."""
+
+    name = "sqlite"
+
+    def __init__(self, tables: Optional[Mapping[str, Path]] = None) -> None:
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        for table, path in (tables or DEFAULT_TABLES).items():
+            self.load_csv(table, Path(path))
+
+    def load_csv(self, table: str, path: Path) -> None:
+        with path.open(newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            header = next(reader)
+            rows = [[_coerce(value) for value in row] for row in reader]
+        columns = ", ".join(f'"{column}"' for column in header)
+        placeholders = ", ".join("?" for _ in header)
+        with self._lock:
+            self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self._conn.execute(f'CREATE TABLE "{table}" ({columns})')
+            self._conn.executemany(
+                f'INSERT INTO "{table}" VALUES ({placeholders})', rows
+            )
+            self._conn.commit()
+
+    def _execute(self, sql: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql)
+            return [dict(row) for row in cursor.fetchall()]
+
+    async def execute(self, sql: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._execute, sql)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+class DuckDBExecutor(QueryExecutor):
+    """DuckDB over the CSV exports; closer to Snowflake's dialect than SQLite."""
+
+    name = "duckdb"
+
+    def __init__(self, tables: Optional[Mapping[str, Path]] = None) -> None:
+        try:
+            import duckdb  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError(
+                "duckdb is required for the DuckDB executor. Install with `pip install duckdb`."
+            ) from exc
+        self._conn = duckdb.connect(":memory:")
+        self._lock = threading.Lock()
+        for table, path in (tables or DEFAULT_TABLES).items():
+            self._conn.execute(
+                f"CREATE TABLE {table} AS SELECT * FROM read_csv_auto(?)", [str(path)]
+            )
+
+    def _execute(self, sql: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql)
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    async def execute(self, sql: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._execute, sql)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+EXECUTORS = {
+    "snowflake": SnowflakeExecutor,
+    "sqlite": SQLiteExecutor,
+    "duckdb": DuckDBExecutor,
+}
+
+
+def create_executor(name: Optional[str]) -> Optional[QueryExecutor]:
+    """Build the executor named by ``name``; ``None``/``"none"`` disables /ask execution."""
+    if not name or name.lower() == "none":
+        return None
+    try:
+        factory = EXECUTORS[name.lower()]
+    except KeyError as exc:
+        raise ValueError(
+            f"Unknown query executor {name!r}; expected one of {', '.join(EXECUTORS)}"
+        ) from exc
+    return factory()
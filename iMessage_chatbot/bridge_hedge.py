@@ -0,0 +1,161 @@
+"""
+Hedged model calls for latency-critical endpoints.
+
+If the primary call has not answered within the configured percentile of its
+recent latency, a backup request is launched (optionally to a faster model).
+The first acceptable answer wins and the other call is cancelled. Until enough
+samples exist to estimate the percentile, a fixed fallback delay is used.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    percentile: float = 0.9
+    backup_model: Optional[str] = None
+    min_delay: float = 0.25
+    fallback_delay: float = 4.0
+    min_samples: int = 20
+
+
+def parse_hedge_policies(spec: str, **defaults: Any) -> Dict[str, HedgePolicy]:
+    """
+    Parse ``endpoint=percentile[:backup_model]`` entries separated by commas, e.g.
+    ``generate-sql=0.9:openai/gpt-5-mini,format-results=0.95``.
+    """
+    policies: Dict[str, HedgePolicy] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        endpoint, _, rule = entry.partition("=")
+        percentile, _, backup_model = rule.partition(":")
+        policies[endpoint.strip()] = HedgePolicy(
+            percentile=float(percentile or 0.9),
+            backup_model=backup_model.strip() or defaults.get("backup_model"),
+            **{key: value for key, value in defaults.items() if key != "backup_model"},
+        )
+    return policies
+
+
+class LatencyWindow:
+    """Rolling window of recent call latencies per (endpoint, model)."""
+
+    def __init__(self, size: int = 200) -> None:
+        self.size = size
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, endpoint: str, model: str, seconds: float) -> None:
+        window = self._samples.get((endpoint, model))
+        if window is None:
+            window = self._samples[(endpoint, model)] = deque(maxlen=self.size)
+        window.append(seconds)
+
+    def percentile(self, endpoint: str, model: str, q: float, min_samples: int) -> Optional[float]:
+        window = self._samples.get((endpoint, model))
+        if not window or len(window) < min_samples:
+            return None
+        ordered = sorted(window)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class Hedger:
+    def __init__(self, policies: Dict[str, HedgePolicy]) -> None:
+        self.policies = policies
+        self.latency = LatencyWindow()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _incr(self, endpoint: str, counter: str) -> None:
+        bucket = self.counters.setdefault(
+            endpoint,
+            {"calls": 0, "hedges_fired": 0, "primary_won": 0, "backup_won": 0, "both_failed": 0},
+        )
+        bucket[counter] += 1
+
+    def delay_for(self, endpoint: str, model: str) -> Optional[float]:
+        policy = self.policies.get(endpoint)
+        if policy is None:
+            return None
+        estimate = self.latency.percentile(endpoint, model, policy.percentile, policy.min_samples)
+        return max(policy.min_delay, policy.fallback_delay if estimate is None else estimate)
+
+    async def _timed(self, endpoint: str, model: str, call: Callable[[str], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await call(model)
+        self.latency.record(endpoint, model, time.monotonic() - started)
+        return result
+
+    async def run(
+        self,
+        endpoint: str,
+        model: str,
+        call: Callable[[str], Awaitable[Any]],
+        accept: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Run ``call(model)``; when the endpoint has a policy and the call is slow,
+        race it against ``call(backup_model)``. ``accept`` decides whether a result
+        is valid enough to win the race.
+        """
+        delay = self.delay_for(endpoint, model)
+        if delay is None:
+            return await call(model)
+
+        policy = self.policies[endpoint]
+        self._incr(endpoint, "calls")
+        primary = asyncio.ensure_future(self._timed(endpoint, model, call))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._incr(endpoint, "hedges_fired")
+            backup_model = policy.backup_model or model
+            backup = asyncio.ensure_future(self._timed(endpoint, backup_model, call))
+            return await self._race(endpoint, primary, backup, accept)
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def _race(
+        self,
+        endpoint: str,
+        primary: "asyncio.Future[Any]",
+        backup: "asyncio.Future[Any]",
+        accept: Optional[Callable[[Any], bool]],
+    ) -> Any:
+        pending = {primary, backup}
+        fallback: Optional["asyncio.Future[Any]"] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, backup):
+                    if task not in done or task.cancelled() or task.exception() is not None:
+                        continue
+                    if accept is None or accept(task.result()):
+                        self._incr(endpoint, "primary_won" if task is primary else "backup_won")
+                        return task.result()
+                    fallback = fallback or task
+            if fallback is not None:
+                # Neither answer passed ``accept``; hand back the first one anyway.
+                self._incr(endpoint, "primary_won" if fallback is primary else "backup_won")
+                return fallback.result()
+            self._incr(endpoint, "both_failed")
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            endpoint: dict(
+                self.counters.get(endpoint, {}),
+                percentile=policy.percentile,
+                backup_model=policy.backup_model,
+            )
+            for endpoint, policy in self.policies.items()
+        }
@@ -0,0 +1,384 @@
+"""
+Local intent classifier for /interpret-query.
+
+Mirrors the router prompt used by the chatbot (intent, time_range, limit, params)
+with keyword rules, so common questions are classified in well under a
+millisecond instead of a full model round-trip. Every rule carries a confidence;
+ambiguous or unmatched messages score low and fall through to the model.
+
+An optional JSON file of extra keyword weights (``{"intent": {"keyword": weight}}``)
+can be loaded on top of the built-in rules to tune routing without code changes.
+"""
+
+import calendar
+import json
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+MERCHANTS = ("Amazon", "Costco", "Doordash", "Instacart", "Target", "Ubereats", "Walmart")
+_MERCHANT_ALIASES = {
+    "uber eats": "Ubereats",
+    "door dash": "Doordash",
+}
+
+CATEGORY_KEYWORDS = {
+    "shoes": ("shoe", "sneaker", "boots"),
+    "electronics": ("electronic", "device", "laptop", "phone", "headphone", "tv"),
+    "food": ("meal", "food", "dinner", "lunch", "doordash", "uber eats", "ubereats"),
+    "clothing": ("clothing", "clothes", "shirt", "jacket", "dress"),
+    "groceries": ("grocer", "instacart"),
+}
+
+# (intent, pattern, confidence). Patterns are matched against the lowercased message.
+_RULES: List[Tuple[str, str, float]] = [
+    ("fsa_auto", r"\b(fsa|hsa)\b.*\b(auto|file|claim|submit)", 0.95),
+    ("fsa_spend", r"\b(fsa|hsa)\b", 0.9),
+    ("total_spend", r"\b(how much|total)\b.*\bspen[dt]", 0.9),
+    ("total_spend", r"\bspen[dt]\b.*\b(in total|altogether|overall)\b", 0.9),
+    ("recent_orders", r"\b(recent|latest|last \d+)\b.*\b(orders?|purchases?|transactions?)\b", 0.9),
+    ("recent_orders", r"\bwhat did i (buy|order)\b", 0.85),
+    ("top_products", r"\b(top|most (bought|purchased)|best[- ]selling)\b.*\b(products?|items?)\b", 0.9),
+    ("price_drop", r"\bprice\b.*\b(drop|protection|went down)\b", 0.9),
+    ("unit_price", r"\bunit price\b|\bper unit\b", 0.9),
+    ("allergy", r"\b(allerg\w*|avoiding)\b", 0.85),
+    ("returns", r"\breturn window\b|\bcan i (still )?return\b", 0.9),
+    ("tax_deduction", r"\btax\b.*\bdeduct", 0.9),
+    ("affordability", r"\bcan i afford\b|\bafford\b", 0.85),
+    ("bills", r"\bbills?\b", 0.9),
+    ("loans", r"\bloans?\b", 0.9),
+    ("deposits", r"\bdeposits?\b", 0.9),
+    ("financial_health", r"\bfinancial (health|wellness)\b", 0.95),
+    ("cash_flow", r"\bcash ?flow\b", 0.95),
+    ("savings_opportunities", r"\b(save money|savings|saving opportunit\w*)\b", 0.85),
+    ("spending_patterns", r"\bspending (patterns?|habits?)\b|\bhow do i spend\b", 0.9),
+    ("budget_recommendation", r"\bbudget\b", 0.85),
+    ("debt_analysis", r"\bdebts?\b", 0.85),
+    ("monthly_breakdown", r"\b(monthly|by month|per month)\b.*\b(breakdown|break down|trend)\b", 0.9),
+    ("monthly_breakdown", r"\bbreak ?down by month\b", 0.9),
+    ("purchase_review", r"\bwant to buy\b.*\b(worried|too much|should i)\b", 0.9),
+    ("shopping_recommendation", r"\b(recommend|help me decide|want to (buy|get))\b", 0.85),
+]
+
+# Confidence cap for messages with constraints the slots cannot carry; below any
+# sensible local-answer threshold.
+UNRESOLVED_CONFIDENCE = 0.4
+
+# A more specific intent matching suppresses the generic ones it refines.
+_SUBSUMES = {
+    "fsa_auto": ("fsa_spend",),
+    "purchase_review": ("shopping_recommendation",),
+}
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_COUNT = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+# "last 90 days" is a time range, not a row limit.
+_LIMIT_PATTERNS = (
+    re.compile(
+        r"\b(?:top|last|first|latest|recent)\s+" + _COUNT + r"\b"
+        r"(?!\s*(?:days?|weeks?|months?|years?)\b)"
+    ),
+    # Leading counts: "5 most recent orders", "3 biggest purchases".
+    re.compile(
+        r"\b" + _COUNT + r"\s+(?:most\s+)?(?:recent|latest|newest|last|top|biggest|largest)\b"
+    ),
+)
+_MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+
+# Words a scoping preposition ("at", "from", "in", "on", ...) may lead to and
+# still fit the slots: known merchants, time phrases and words that do not
+# narrow the rows. Anything else ("at Starbucks", "on shoes", "in groceries",
+# "via apple pay") is a filter the slots would silently drop.
+_SCOPE_WORDS = frozenset(
+    [merchant.lower() for merchant in MERCHANTS]
+    + [alias.split()[0] for alias in _MERCHANT_ALIASES]
+    + list(_MONTHS)
+    + ["last", "this", "past", "previous", "current", "recent", "month", "months", "year",
+       "years", "week", "weeks", "day", "days", "today", "yesterday", "ytd", "average",
+       "spending", "purchases", "orders", "transactions", "total", "fsa", "hsa", "time",
+       "merchant", "merchants", "store", "stores", "card", "cards", "credit", "debit",
+       "payment", "products", "items", "spend", "fees", "discounts", "taxes", "tips", "all",
+       "least", "most", "once"]
+)
+_SCOPE_QUALIFIER = re.compile(
+    r"\b(at|from|in|by|via|on|for|of|with)\s+"
+    r"(?:(?:my|the|a|an|all|each|every|per)\s+)?([a-z][a-z'&.-]*)"
+)
+_ORDER_STATUS = re.compile(
+    r"\b(?:cancell?ed|cancel|delivered|shipped|refunded|returned|pending|completed|failed"
+    r"|billed|picked up|in transit)\b"
+)
+_PAYMENT_METHOD = re.compile(
+    r"\b(?:visa|master ?card|amex|american express|discover card|paypal|ebt|snap|apple pay"
+    r"|google pay|venmo)\b"
+)
+# Digits left once the limit and time phrases are taken ("show 5 orders").
+_BARE_NUMBER = re.compile(r"(?<![$\d.,])\b\d+\b")
+
+# Constraints none of the slots (one merchant, one parsed time range, a limit)
+# can carry. Questions with any of them are left to the model.
+_COMPARISON = re.compile(r"\b(?:vs|versus|compared? (?:to|with)|comparison|compare)\b")
+_NEGATION = re.compile(
+    r"\b(?:except|excluding|exclude|other than|apart from|besides|without|not|never)\b|n't\b"
+)
+_AMOUNT_THRESHOLD = re.compile(
+    r"\b(?:over|under|above|below|more than|less than|greater than|at least|at most"
+    r"|cheaper than|up to)\s+\$?\d|\$\d[\d,.]*\s*(?:\+|or (?:more|less))"
+)
+_ASCENDING = re.compile(r"\b(?:least|lowest|min|minimum|smallest|cheapest|fewest|bottom)\b")
+_TIME_HINT = re.compile(
+    r"\b(?:since|between|before|after|until|till|during|through|ago|quarter|q[1-4]"
+    r"|weekends?|weekdays?|holidays?|(?:19|20)\d\d|\d{1,2}(?:st|nd|rd|th)"
+    r"|\d{1,2}/\d{1,2}(?:/\d{2,4})?|\d{4}-\d{2}(?:-\d{2})?"
+    r"|(?:" + "|".join(name for name in _MONTHS if name != "may") + r"|may \d)"
+    r"|(?:\d+|a|few|several|couple|past|previous|next|last|this|that|same)\s+(?:of\s+)?"
+    r"(?:days?|weeks?|months?|years?)|yesterday|today)\b"
+)
+
+
+def _month_bounds(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _resolve_time(
+    text: str, today: date
+) -> Tuple[Optional[date], Optional[date], Optional[Tuple[int, int]]]:
+    """``(start, end, span)``, where ``span`` is the part of ``text`` that was resolved."""
+    match = re.search(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month)s?\b", text)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        days = {"day": 1, "week": 7, "month": 30}[unit] * amount
+        return today - timedelta(days=days), today, match.span()
+    match = re.search("yesterday", text)
+    if match:
+        day = today - timedelta(days=1)
+        return day, day, match.span()
+    match = re.search("today", text)
+    if match:
+        return today, today, match.span()
+    match = re.search(r"\b(this|current) week\b", text)
+    if match:
+        return today - timedelta(days=today.weekday()), today, match.span()
+    match = re.search(r"\blast week\b", text)
+    if match:
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6), match.span()
+    match = re.search(r"\b(this|current) month\b", text)
+    if match:
+        return today.replace(day=1), today, match.span()
+    match = re.search(r"\b(last|previous) month\b", text)
+    if match:
+        last_month_end = today.replace(day=1) - timedelta(days=1)
+        return (*_month_bounds(last_month_end.year, last_month_end.month), match.span())
+    match = re.search(r"\b(this|current) year\b|\bytd\b|\byear to date\b", text)
+    if match:
+        return date(today.year, 1, 1), today, match.span()
+    match = re.search(r"\blast year\b", text)
+    if match:
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31), match.span()
+    match = re.search(r"\bin (" + "|".join(_MONTHS) + r")(?:\s+(\d{4}))?\b", text)
+    if match:
+        month = _MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else today.year
+        if not match.group(2) and month > today.month:
+            year -= 1
+        return (*_month_bounds(year, month), match.span())
+    return None, None, None
+
+
+def parse_time_range(text: str, today: Optional[date] = None) -> Dict[str, Optional[str]]:
+    """Resolve relative phrases like "last month" or "past 30 days" to ISO dates."""
+    start, end, _ = _resolve_time(text, today or date.today())
+    return {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+    }
+
+
+def _limit_match(text: str) -> Optional["re.Match[str]"]:
+    for pattern in _LIMIT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+def parse_limit(text: str) -> Optional[int]:
+    match = _limit_match(text)
+    if not match:
+        return None
+    value = match.group(1)
+    return int(value) if value.isdigit() else _NUMBER_WORDS[value]
+
+
+def find_merchant(text: str) -> Optional[str]:
+    merchants = find_merchants(text)
+    return merchants[0] if merchants else None
+
+
+def find_merchants(text: str) -> List[str]:
+    """Every known merchant named in ``text``, aliases first."""
+    found = [merchant for alias, merchant in _MERCHANT_ALIASES.items() if alias in text]
+    for merchant in MERCHANTS:
+        if merchant not in found and re.search(rf"\b{merchant.lower()}\b", text):
+            found.append(merchant)
+    return found
+
+
+def unresolved_constraints(text: str, today: Optional[date] = None) -> List[str]:
+    """
+    Parts of a lowercased question the merchant, time-range and limit slots
+    cannot express: several merchants or a comparison, a negation, an amount
+    threshold, an ascending ranking ("least"), time words left over once
+    ``parse_time_range`` has taken its phrase, or any ``unsupported_scope``.
+    """
+    reasons = []
+    if len(find_merchants(text)) > 1:
+        reasons.append("several merchants")
+    if _COMPARISON.search(text):
+        reasons.append("comparison")
+    if _NEGATION.search(text):
+        reasons.append("negation")
+    if _AMOUNT_THRESHOLD.search(text):
+        reasons.append("amount threshold")
+    if _ASCENDING.search(text):
+        reasons.append("ascending order")
+    _, _, span = _resolve_time(text, today or date.today())
+    rest = text if span is None else text[: span[0]] + " " + text[span[1] :]
+    if _TIME_HINT.search(rest):
+        reasons.append("unresolved time")
+    return reasons + unsupported_scope(text, today)
+
+
+def unsupported_scope(text: str, today: Optional[date] = None) -> List[str]:
+    """
+    Filters in a lowercased question that no slot holds: a merchant outside
+    ``MERCHANTS`` or another "at/on/in/... X" qualifier, an order status, a
+    payment method, or a count that ``parse_limit`` did not take.
+    """
+    reasons = []
+    for preposition, word in _SCOPE_QUALIFIER.findall(text):
+        if word not in _SCOPE_WORDS:
+            reasons.append("unknown merchant" if preposition in ("at", "from") else "qualifier")
+            break
+    if _ORDER_STATUS.search(text):
+        reasons.append("order status")
+    if _PAYMENT_METHOD.search(text):
+        reasons.append("payment method")
+    rest = text
+    for span in (_resolve_time(text, today or date.today())[2], _span(_limit_match(text))):
+        if span is not None:
+            rest = rest[: span[0]] + " " * (span[1] - span[0]) + rest[span[1] :]
+    if _BARE_NUMBER.search(rest):
+        reasons.append("unparsed count")
+    return reasons
+
+
+def _span(match: Optional["re.Match[str]"]) -> Optional[Tuple[int, int]]:
+    return match.span() if match else None
+
+
+def find_category(text: str) -> Optional[str]:
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            return category
+    return None
+
+
+class IntentClassifier:
+    def __init__(self, keyword_weights: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+        self._rules: List[Tuple[str, Pattern[str], float]] = [
+            (intent, re.compile(pattern), confidence) for intent, pattern, confidence in _RULES
+        ]
+        self._keyword_weights = keyword_weights or {}
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "IntentClassifier":
+        if not path:
+            return cls()
+        with Path(path).open(encoding="utf-8") as handle:
+            return cls(json.load(handle))
+
+    def scores(self, text: str) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for intent, pattern, confidence in self._rules:
+            if confidence > scores.get(intent, 0.0) and pattern.search(text):
+                scores[intent] = confidence
+        for intent, keywords in self._keyword_weights.items():
+            weight = sum(value for keyword, value in keywords.items() if keyword in text)
+            if weight:
+                scores[intent] = min(1.0, scores.get(intent, 0.0) + weight)
+        for intent, generic in _SUBSUMES.items():
+            if intent in scores:
+                for other in generic:
+                    scores.pop(other, None)
+        return scores
+
+    def classify(
+        self, message: str, today: Optional[date] = None
+    ) -> Tuple[Dict[str, Any], float]:
+        """
+        Return the router JSON and a confidence in [0, 1]. When several intents
+        match, confidence is reduced by the runner-up score so ambiguous messages
+        fall through to the model. So is a message whose merchants, dates, amounts
+        or ordering the slots cannot carry (see ``unresolved_constraints``).
+        """
+        text = " ".join((message or "").lower().split())
+        ranked = sorted(self.scores(text).items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return _result("fallback"), 0.0
+
+        intent, confidence = ranked[0]
+        if len(ranked) > 1:
+            confidence -= ranked[1][1] * 0.5
+
+        params: Dict[str, Any] = {}
+        merchant = find_merchant(text)
+        if merchant:
+            params["merchant"] = merchant
+        if intent in ("shopping_recommendation", "purchase_review"):
+            params["category"] = find_category(text)
+        if intent == "allergy":
+            match = re.search(r"(?:avoiding|allergy to|allergic to)\s+(\w+)", text)
+            if match:
+                params["allergy"] = match.group(1)
+        if intent == "affordability":
+            match = re.search(r"\$?(\d+(?:\.\d+)?)", text)
+            if match:
+                params["target_amount"] = float(match.group(1))
+
+        unresolved = unresolved_constraints(text, today)
+        if intent == "affordability" and "target_amount" in params:
+            unresolved = [
+                reason
+                for reason in unresolved
+                if reason not in ("amount threshold", "unparsed count")
+            ]
+        if unresolved:
+            confidence = min(confidence, UNRESOLVED_CONFIDENCE)
+
+        limit = parse_limit(text)
+        if limit is None and intent == "recent_orders":
+            limit = 3
+        if limit is None and intent == "top_products":
+            limit = 5
+
+        return _result(intent, parse_time_range(text, today), limit, params), round(confidence, 3)
+
+
+def _result(
+    intent: str,
+    time_range: Optional[Dict[str, Optional[str]]] = None,
+    limit: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    return {
+        "intent": intent,
+        "time_range": time_range or {"start": None, "end": None},
+        "limit": limit,
+        "params": params or {},
+    }
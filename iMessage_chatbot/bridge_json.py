@@ -0,0 +1,142 @@
+"""
+JSON handling for large bridge payloads.
+
+``results`` and ``purchase_history`` can hold thousands of row dicts. orjson is
+used for decoding and encoding when it is installed, with stdlib ``json`` as the
+fallback. Row lists are truncated to their caps and kept as plain dicts instead
+of being validated field by field, so pydantic only checks the small scalar
+fields.
+
+``read_body`` enforces the body-size limit (``max_bytes``) while the body is
+received: a declared ``Content-Length`` over the limit is refused before any of
+it is read, and a chunked body is cut off as soon as it passes the limit. Only a
+body within the limit is decoded. The row caps apply after decoding, so they
+speed up validation and prompt building but do not lower peak memory; lower
+``max_bytes`` to bound that.
+
+Bodies that are not JSON, or not shaped like the route's payload, raise
+``InvalidPayload``, which the bridge answers with 422 and a FastAPI-style
+``detail`` list, as FastAPI's own body parsing did.
+"""
+
+import json
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PayloadTooLarge(ValueError):
+    def __init__(self, size: int, limit: int, *, partial: bool = False) -> None:
+        amount = f"over {limit}" if partial else str(size)
+        super().__init__(f"Request body is {amount} bytes; the limit is {limit}.")
+        self.size = size
+        self.limit = limit
+
+
+class InvalidPayload(ValueError):
+    def __init__(
+        self, message: str, loc: Sequence[Union[str, int]] = ("body",), kind: str = "value_error"
+    ) -> None:
+        super().__init__(message)
+        self.loc = list(loc)
+        self.kind = kind
+
+    def detail(self) -> List[Dict[str, Any]]:
+        return [{"type": self.kind, "loc": self.loc, "msg": str(self)}]
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """The request body, refused with ``PayloadTooLarge`` before it outgrows ``max_bytes``."""
+    declared: Optional[str] = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise PayloadTooLarge(int(declared), max_bytes)
+    chunks: List[bytes] = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise PayloadTooLarge(received, max_bytes, partial=True)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any, *, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(value, default=str, option=option)
+    return json.dumps(
+        value,
+        default=str,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def dumps_text(value: Any, *, indent: bool = False) -> str:
+    return dumps(value, indent=indent).decode("utf-8")
+
+
+def decode_payload(
+    body: bytes, *, max_bytes: int, list_caps: Mapping[str, int]
+) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+    """
+    Decode a JSON object body and split off its large row lists. Returns the
+    remaining fields, the row lists truncated to ``list_caps``, and the row
+    counts that were actually sent.
+    """
+    if len(body) > max_bytes:
+        raise PayloadTooLarge(len(body), max_bytes)
+    try:
+        data = loads(body or b"{}")
+    except ValueError as error:
+        raise InvalidPayload(
+            f"JSON decode error: {error}", ("body", getattr(error, "pos", 0)), "json_invalid"
+        ) from error
+    if not isinstance(data, dict):
+        raise InvalidPayload("Request body must be a JSON object.", kind="dict_type")
+    lists, sizes = split_lists(data, list_caps)
+    return data, lists, sizes
+
+
+def split_lists(
+    data: Dict[str, Any], list_caps: Mapping[str, int]
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+    """
+    Pop the row lists named in ``list_caps`` out of ``data``, truncated to their
+    caps. Returns the lists and the row counts that were actually sent. The
+    dropped rows were already decoded; truncating only spares the later work.
+    """
+    lists: Dict[str, List[Dict[str, Any]]] = {}
+    sizes: Dict[str, int] = {}
+    for field, cap in list_caps.items():
+        rows = data.pop(field, None) or []
+        if not isinstance(rows, list):
+            raise InvalidPayload(
+                f"{field} must be a list of objects.", ("body", field), "list_type"
+            )
+        sizes[field] = len(rows)
+        rows = rows[:cap]
+        if not all(isinstance(row, dict) for row in rows):
+            raise InvalidPayload(
+                f"{field} must be a list of objects.", ("body", field), "dict_type"
+            )
+        lists[field] = rows
+    return lists, sizes
+
+
+class BridgeJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,283 @@
+"""
+Per-model concurrency limits with bounded wait queues.
+
+Each upstream model gets a fixed number of concurrent slots. Callers beyond that
+wait in a FIFO queue of bounded depth; when the queue is full, or a caller cannot
+get a slot before its deadline, a ``CapacityExceeded`` error is raised right away
+with a Retry-After estimate instead of letting latency collapse for everyone.
+
+Each call also has a priority. ``interactive`` calls (chat turns a user is
+waiting on) always have ``reserved`` of a model's slots that ``background``
+calls (recommendations, batch work) cannot take. When a slot frees up, the next
+waiter is chosen by weighted fair queuing over the priorities, not plain FIFO:
+with weights 4:1, interactive waiters get four slots for every background one
+while both are queued. Background calls are never starved, but under load they
+wait instead of interactive ones. In-flight calls are not preempted; cancelling
+them would throw away upstream work already paid for.
+
+With several workers, an optional ``shared`` slot pool (see ``bridge_shared``)
+makes the same limits hold across processes. A caller first gets through its
+local lane, then leases a slot from the shared pool. The reserve holds across
+workers too, because background calls lease against the smaller limit, but the
+weighted ordering is per worker.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+DEFAULT_WEIGHTS: Mapping[str, float] = {INTERACTIVE: 4.0, BACKGROUND: 1.0}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse ``priority=weight`` pairs, e.g. ``interactive=4,background=1``."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        priority, _, weight = entry.partition("=")
+        if priority.strip() not in weights:
+            raise ValueError(f"Unknown priority {priority.strip()!r} in {spec!r}")
+        weights[priority.strip()] = max(0.01, float(weight))
+    return weights
+
+
+class CapacityExceeded(Exception):
+    """Raised when a model lane cannot serve a request in time."""
+
+    def __init__(self, model: str, reason: str, status_code: int, retry_after: int) -> None:
+        super().__init__(f"Model {model} is at capacity ({reason}); retry in {retry_after}s.")
+        self.model = model
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ModelLane:
+    def __init__(
+        self,
+        model: str,
+        limit: int,
+        max_queue: int,
+        *,
+        weights: Mapping[str, float] = DEFAULT_WEIGHTS,
+        reserved: float = 0.0,
+    ) -> None:
+        self.model = model
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        # At least one slot stays usable by background calls.
+        self.reserved = min(self.limit - 1, math.ceil(self.limit * reserved))
+        self.weights = dict(weights)
+        self.active = 0
+        self._active: Dict[str, int] = {priority: 0 for priority in self.weights}
+        self._waiters: Dict[str, Deque["asyncio.Future[None]"]] = {
+            priority: deque() for priority in self.weights
+        }
+        # Weighted fair queuing: each priority's virtual finish time advances by
+        # 1/weight per slot granted; the waiting priority with the lowest goes next.
+        self._finish: Dict[str, float] = {priority: 0.0 for priority in self.weights}
+        self._virtual_time = 0.0
+        self._avg_hold = 1.0
+        self.counters: Dict[str, float] = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        self.priority_counters: Dict[str, Dict[str, float]] = {
+            priority: {"admitted": 0, "queued": 0, "rejected": 0, "wait_seconds_total": 0.0}
+            for priority in self.weights
+        }
+
+    def priority_limit(self, priority: str) -> int:
+        return self.limit if priority == INTERACTIVE else self.limit - self.reserved
+
+    def _depth(self, priority: str) -> int:
+        return sum(1 for waiter in self._waiters[priority] if not waiter.done())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._depth(priority) for priority in self._waiters)
+
+    def _has_room(self, priority: str) -> bool:
+        return self.active < self.limit and self._active[priority] < self.priority_limit(priority)
+
+    def _grant(self, priority: str) -> None:
+        self.active += 1
+        self._active[priority] += 1
+        self._virtual_time = self._finish[priority]
+        self._finish[priority] += 1.0 / self.weights[priority]
+
+    def retry_after(self, priority: str = INTERACTIVE) -> int:
+        backlog = self._depth(priority) + 1
+        return max(1, math.ceil(self._avg_hold * backlog / self.priority_limit(priority)))
+
+    async def acquire(self, timeout: Optional[float], priority: str = INTERACTIVE) -> float:
+        """Wait for a slot; returns the time spent queued in seconds."""
+        counters = self.priority_counters[priority]
+        if self._has_room(priority) and not self._depth(priority):
+            self._grant(priority)
+            self.counters["admitted"] += 1
+            counters["admitted"] += 1
+            return 0.0
+        if self._depth(priority) >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            counters["rejected"] += 1
+            raise CapacityExceeded(self.model, "queue full", 429, self.retry_after(priority))
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        if not self._depth(priority):
+            # A priority that was idle does not bank credit for the time it had no waiters.
+            self._finish[priority] = max(self._finish[priority], self._virtual_time)
+        self._waiters[priority].append(waiter)
+        self.counters["queued"] += 1
+        counters["queued"] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0, priority)
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self._record_wait(waited)
+            counters["wait_seconds_total"] += waited
+
+        if waiter.done() and not waiter.cancelled():
+            self.counters["admitted"] += 1
+            counters["admitted"] += 1
+            return time.monotonic() - started
+        waiter.cancel()
+        self.counters["rejected_timeout"] += 1
+        counters["rejected"] += 1
+        raise CapacityExceeded(self.model, "queue timeout", 503, self.retry_after(priority))
+
+    def release(self, held_seconds: float, priority: str = INTERACTIVE) -> None:
+        if held_seconds:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_seconds
+        self.active -= 1
+        self._active[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, lowest virtual finish time first."""
+        while self.active < self.limit:
+            eligible = []
+            for priority, waiters in self._waiters.items():
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if waiters and self._has_room(priority):
+                    eligible.append(priority)
+            if not eligible:
+                return
+            priority = min(eligible, key=lambda name: self._finish[name])
+            self._grant(priority)
+            self._waiters[priority].popleft().set_result(None)
+
+    def _record_wait(self, waited: float) -> None:
+        self.counters["wait_seconds_total"] += waited
+        self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], waited)
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            limit=self.limit,
+            reserved=self.reserved,
+            active=self.active,
+            queue_depth=self.queue_depth,
+            max_queue=self.max_queue,
+            avg_hold_seconds=round(self._avg_hold, 3),
+            priorities={
+                priority: dict(
+                    counters,
+                    weight=self.weights[priority],
+                    limit=self.priority_limit(priority),
+                    active=self._active[priority],
+                    queue_depth=self._depth(priority),
+                )
+                for priority, counters in self.priority_counters.items()
+            },
+        )
+
+
+class ModelLimiter:
+    def __init__(
+        self,
+        limits: Mapping[str, int],
+        *,
+        default_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        shared: Optional[Any] = None,
+        weights: Mapping[str, float] = DEFAULT_WEIGHTS,
+        reserved: float = 0.0,
+    ) -> None:
+        self.default_limit = default_limit
+        self.shared = shared
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.weights = dict(weights)
+        self.reserved = reserved
+        self._lanes: Dict[str, ModelLane] = {}
+        for model, limit in limits.items():
+            # Several roles may share one model string; keep the most generous limit.
+            current = self._lanes.get(model)
+            if current is None or current.limit < limit:
+                self._lanes[model] = self._new_lane(model, limit)
+
+    def _new_lane(self, model: str, limit: int) -> ModelLane:
+        return ModelLane(
+            model, limit, self.max_queue, weights=self.weights, reserved=self.reserved
+        )
+
+    def lane(self, model: str) -> ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = self._new_lane(model, self.default_limit)
+        return lane
+
+    @asynccontextmanager
+    async def slot(
+        self, model: str, timeout: Optional[float] = None, priority: str = INTERACTIVE
+    ) -> AsyncIterator[float]:
+        lane = self.lane(model)
+        timeout = self.queue_timeout if timeout is None else timeout
+        waited = await lane.acquire(timeout, priority)
+        started = time.monotonic()
+        token = None
+        try:
+            if self.shared is not None:
+                token = await self.shared.acquire(
+                    model,
+                    lane.priority_limit(priority),
+                    None if timeout is None else max(0.0, timeout - waited),
+                )
+                if token is None:
+                    lane.counters["rejected_timeout"] += 1
+                    raise CapacityExceeded(
+                        model, "shared queue timeout", 503, lane.retry_after(priority)
+                    )
+                waited += time.monotonic() - started
+                started = time.monotonic()
+            yield waited
+        finally:
+            if token is not None:
+                self.shared.release(token)
+            lane.release(time.monotonic() - started, priority)
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        # May run on the shared store's thread while the loop adds lanes.
+        lanes = {model: lane.describe() for model, lane in list(self._lanes.items())}
+        if self.shared is not None:
+            for model, active in self.shared.active().items():
+                lanes.setdefault(model, {})["shared_active"] = active
+        return lanes
@@ -0,0 +1,232 @@
+"""
+Local product-similarity index for /shopping-recommendations.
+
+The shopping prompt used to carry the raw purchase history and ask the model to
+invent products. The bridge now indexes real products (name, merchant, unit
+price, FSA/HSA eligibility) from ``products.csv`` and retrieves the ones most
+similar to what the customer bought. Only that short candidate list goes into
+the prompt.
+
+Product names are turned into TF-IDF vectors over hashed word unigrams and
+bigrams (plurals folded), so there is no vocabulary to rebuild. An inverted
+index maps each hashed term to the products containing it, and a query only
+touches the postings of its own terms. Products can be added at any time;
+document frequencies update in place and norms are recomputed lazily on the
+next search.
+"""
+
+import csv
+import heapq
+import math
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from bridge_intents import CATEGORY_KEYWORDS
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and as at by for from in of on or the to with w pack count ct oz lb fl".split()
+)
+# Hashed term space; collisions are rare at catalog sizes well below this.
+_DIMENSIONS = 1 << 20
+
+
+def _fold(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> Counter:
+    """Hashed unigram and bigram counts for a product name or query."""
+    words = [
+        _fold(word) for word in _WORD.findall(text.lower()) if word not in _STOPWORDS
+    ]
+    grams = words + [f"{left} {right}" for left, right in zip(words, words[1:])]
+    return Counter(zlib.crc32(gram.encode("utf-8")) % _DIMENSIONS for gram in grams)
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        return round(float(value), 2) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _field(row: Mapping[str, Any], name: str) -> Any:
+    value = row.get(name)
+    return row.get(name.upper()) if value is None else value
+
+
+@dataclass(frozen=True)
+class Product:
+    key: str
+    name: str
+    merchant: str
+    unit_price: Optional[float]
+    eligibility: str
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> Optional["Product"]:
+        """Build from a products table row (CSV or executor, any column case)."""
+        name = str(_field(row, "product_name") or "").strip()
+        if not name:
+            return None
+        merchant = str(_field(row, "merchant_name") or "").strip()
+        # Keyed by name, not external ID: merchants reissue IDs for the same item.
+        return cls(
+            key=f"{merchant.lower()}:{' '.join(name.lower().split())}",
+            name=name,
+            merchant=merchant,
+            unit_price=_price(_field(row, "product_unit_price")),
+            eligibility=str(_field(row, "eligibility") or "").strip(),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"name": self.name, "merchant": self.merchant}
+        if self.unit_price is not None:
+            item["price"] = self.unit_price
+        if self.eligibility:
+            item["eligibility"] = self.eligibility
+        return item
+
+
+class ProductIndex:
+    def __init__(self) -> None:
+        self._products: List[Product] = []
+        self._positions: Dict[str, int] = {}
+        self._terms: List[Counter] = []
+        self._postings: Dict[int, List[int]] = defaultdict(list)
+        self._document_frequency: Counter = Counter()
+        self._norms: List[float] = []
+        self._stale = False
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"searches": 0, "added": 0, "updated": 0}
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "ProductIndex":
+        index = cls()
+        with Path(path).open(newline="", encoding="utf-8") as handle:
+            index.add_rows(csv.DictReader(handle))
+        with index._lock:
+            index._refresh_norms()
+        return index
+
+    def add_rows(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        return self.add(
+            product for product in map(Product.from_row, rows) if product is not None
+        )
+
+    def add(self, products: Iterable[Product]) -> int:
+        """
+        Index new products; known keys only get their price and eligibility
+        refreshed. Returns how many products were new.
+        """
+        added = 0
+        with self._lock:
+            for product in products:
+                position = self._positions.get(product.key)
+                if position is not None:
+                    self._products[position] = product
+                    self.counters["updated"] += 1
+                    continue
+                position = len(self._products)
+                counts = terms(product.name)
+                self._positions[product.key] = position
+                self._products.append(product)
+                self._terms.append(counts)
+                self._norms.append(0.0)
+                for term in counts:
+                    self._postings[term].append(position)
+                self._document_frequency.update(counts.keys())
+                added += 1
+            if added:
+                self._stale = True
+                self.counters["added"] += added
+        return added
+
+    def _idf(self, term: int) -> float:
+        return math.log((1 + len(self._products)) / (1 + self._document_frequency[term])) + 1
+
+    def _refresh_norms(self) -> None:
+        if not self._stale:
+            return
+        self._norms = [
+            math.sqrt(sum((count * self._idf(term)) ** 2 for term, count in counts.items()))
+            or 1.0
+            for counts in self._terms
+        ]
+        self._stale = False
+
+    def search(
+        self,
+        queries: Sequence[Tuple[str, float]],
+        k: int = 10,
+        *,
+        exclude: Iterable[str] = (),
+    ) -> List[Tuple[Product, float]]:
+        """
+        Products ranked by cosine similarity to the weighted sum of ``queries``
+        (``(text, weight)`` pairs). Scores are not divided by the query norm,
+        which would not change the order. Names in ``exclude`` (case-insensitive)
+        are skipped, e.g. items the customer just bought.
+        """
+        query: Counter = Counter()
+        for text, weight in queries:
+            for term, count in terms(text).items():
+                query[term] += count * weight
+        skip = {name.strip().lower() for name in exclude}
+        with self._lock:
+            self.counters["searches"] += 1
+            self._refresh_norms()
+            scores: Dict[int, float] = defaultdict(float)
+            for term, weight in query.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                # Square-root damping keeps a brand repeated across the history
+                # (e.g. "kirkland signature") from drowning out everything else.
+                weight = math.sqrt(weight) * self._idf(term) ** 2
+                for position in postings:
+                    scores[position] += weight * self._terms[position][term]
+            ranked = heapq.nlargest(
+                k + len(skip),
+                ((score / self._norms[position], position) for position, score in scores.items()),
+            )
+            results = [
+                (self._products[position], round(score, 4))
+                for score, position in ranked
+                if self._products[position].name.lower() not in skip
+            ]
+        return results[:k]
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(self.counters, products=len(self._products), terms=len(self._postings))
+
+
+def recommendation_queries(
+    purchase_history: Sequence[Mapping[str, Any]], category: Optional[str]
+) -> List[Tuple[str, float]]:
+    """
+    Query texts for a customer: recent product names, newest weighted highest,
+    plus the category and its keywords so that, say, "electronics" also finds
+    speakers and headphones rather than only names containing the word.
+    """
+    queries = [
+        (str(item.get("product") or ""), 1.0 / (1 + rank / 10))
+        for rank, item in enumerate(purchase_history)
+        if item.get("product")
+    ]
+    if category:
+        boost = max(2.0, len(queries) / 4)
+        words = [category] + list(CATEGORY_KEYWORDS.get(category.strip().lower(), ()))
+        queries += [(word, boost) for word in words]
+    return queries
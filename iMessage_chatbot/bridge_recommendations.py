@@ -0,0 +1,308 @@
+"""
+Precomputed shopping recommendations.
+
+/shopping-recommendations used to call the shopping model on every request,
+although its answer only changes when the purchase history does. Answers are
+now kept per ``(user_id, category)`` together with a fingerprint of the inputs
+they were generated from (top merchants, favorite merchants and a hash of the
+purchase history). A request whose inputs hash to the stored fingerprint is
+served from the store without a model call.
+
+``RecommendationJob`` keeps the store warm in the background. It polls a cheap
+watermark over the transactions table (row count and latest ``datetime``) and
+only rebuilds inputs and regenerates entries when that watermark moves, i.e.
+when new transactions have arrived. The Knot tables hold a single account, so
+the job precomputes for one configured user.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from bridge_executors import QueryExecutor
+from bridge_json import dumps
+from bridge_products import ProductIndex
+
+logger = logging.getLogger(__name__)
+
+# The queries the chatbot runs before calling /shopping-recommendations (with the
+# joined columns qualified), so the job's inputs fingerprint like the chatbot's.
+HISTORY_SQL = """
+SELECT p.merchant_name, p.product_name, p.product_total, t.datetime,
+    p.product_external_id, p.product_unit_price, p.eligibility
+FROM products p
+JOIN transactions t ON p.transaction_id = t.transaction_id
+ORDER BY t.datetime DESC
+LIMIT 50
+"""
+MERCHANTS_SQL = """
+SELECT merchant_name, COUNT(*) AS transaction_count, SUM(price_total) AS total_spent
+FROM transactions
+GROUP BY merchant_name
+ORDER BY total_spent DESC
+LIMIT 10
+"""
+WATERMARK_SQL = "SELECT COUNT(*) AS row_count, MAX(datetime) AS latest FROM transactions"
+
+
+def _field(row: Mapping[str, Any], name: str) -> Any:
+    """Snowflake returns upper-case column names, the local executors lower-case."""
+    value = row.get(name)
+    return row.get(name.upper()) if value is None else value
+
+
+def _amount(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def normalize_category(category: Optional[str]) -> str:
+    return " ".join((category or "").lower().split())
+
+
+def input_fingerprint(
+    top_merchants: Iterable[Mapping[str, Any]],
+    favorite_merchants: Iterable[str],
+    purchase_history: Iterable[Mapping[str, Any]],
+) -> str:
+    """
+    Hash of the inputs a recommendation depends on. Only merchant names, product
+    names and amounts (to the cent) are hashed. Dates and counts are formatted
+    differently by each data source and would change the hash spuriously, and
+    history order is ignored: items bought together share a timestamp, and each
+    source breaks that tie its own way.
+    """
+    entries = [
+        [item.get("merchant"), item.get("product"), round(_amount(item.get("amount")), 2)]
+        for item in purchase_history
+    ]
+    entries.sort(key=lambda entry: [str(part) for part in entry])
+    history = hashlib.sha256(dumps(entries)).hexdigest()
+    inputs = [
+        [[item.get("name"), round(_amount(item.get("total")), 2)] for item in top_merchants],
+        sorted(str(name) for name in favorite_merchants if name),
+        history,
+    ]
+    return hashlib.sha256(dumps(inputs)).hexdigest()[:24]
+
+
+def shopping_inputs(
+    history_rows: Iterable[Mapping[str, Any]], merchant_rows: Iterable[Mapping[str, Any]]
+) -> Dict[str, Any]:
+    """Build /shopping-recommendations fields from the two queries above, as chat.js does."""
+    history = [
+        {
+            "merchant": _field(row, "merchant_name"),
+            "product": _field(row, "product_name"),
+            "amount": _amount(_field(row, "product_total")),
+            "date": str(_field(row, "datetime")),
+        }
+        for row in history_rows
+    ]
+    top_merchants = [
+        {
+            "name": _field(row, "merchant_name"),
+            "count": _field(row, "transaction_count"),
+            "total": _amount(_field(row, "total_spent")),
+        }
+        for row in merchant_rows
+    ]
+    amounts = [item["amount"] for item in history]
+    return {
+        "purchase_history": history,
+        "top_merchants": top_merchants,
+        "favorite_merchants": list(
+            dict.fromkeys(item["merchant"] for item in history if item["merchant"])
+        )[:5],
+        "average_purchase_amount": sum(amounts) / len(amounts) if amounts else 0.0,
+        "total_purchases": len(history),
+    }
+
+
+@dataclass(frozen=True)
+class Recommendation:
+    user_id: str
+    category: str
+    fingerprint: str
+    text: str
+    generated_at: float
+    source: str
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "category": self.category,
+            "fingerprint": self.fingerprint,
+            "generated_at": self.generated_at,
+            "age_seconds": round(time.time() - self.generated_at, 1),
+            "source": self.source,
+        }
+
+
+class RecommendationStore:
+    """Latest recommendation per (user, category), evicted least recently used."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Recommendation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"hits": 0, "stale": 0, "misses": 0, "stores": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, user_id: str, category: str, fingerprint: str) -> Optional[Recommendation]:
+        """The stored entry if it was generated from the same inputs, else None."""
+        key = (user_id, normalize_category(category))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.fingerprint != fingerprint:
+                self.counters["stale"] += 1
+                return None
+            self.counters["hits"] += 1
+            return entry
+
+    def get(self, user_id: str, category: str) -> Optional[Recommendation]:
+        with self._lock:
+            return self._entries.get((user_id, normalize_category(category)))
+
+    def put(
+        self, user_id: str, category: str, fingerprint: str, text: str, *, source: str
+    ) -> Recommendation:
+        entry = Recommendation(
+            user_id=user_id,
+            category=normalize_category(category),
+            fingerprint=fingerprint,
+            text=text,
+            generated_at=time.time(),
+            source=source,
+        )
+        with self._lock:
+            self._entries[(entry.user_id, entry.category)] = entry
+            self._entries.move_to_end((entry.user_id, entry.category))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.counters["stores"] += 1
+        return entry
+
+    def categories(self, user_id: str) -> List[str]:
+        with self._lock:
+            return [category for user, category in self._entries if user == user_id]
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), max_entries=self.max_entries)
+
+
+Generate = Callable[[str, Dict[str, Any]], Awaitable[str]]
+
+
+class RecommendationJob:
+    """
+    Background refresher for one user's recommendations. ``generate(category,
+    inputs)`` produces the text for one category from ``shopping_inputs`` fields.
+    Products seen in the fetched history are added to ``products`` first, so
+    new purchases are candidates in the regenerated prompts.
+    """
+
+    def __init__(
+        self,
+        executor: QueryExecutor,
+        store: RecommendationStore,
+        generate: Generate,
+        *,
+        user_id: str,
+        categories: Iterable[str] = ("",),
+        interval: float = 60.0,
+        products: Optional[ProductIndex] = None,
+    ) -> None:
+        self.executor = executor
+        self.store = store
+        self.generate = generate
+        self.user_id = user_id
+        self.categories = [normalize_category(category) for category in categories]
+        self.interval = interval
+        self.products = products
+        self.watermark: Optional[Tuple[Any, Any]] = None
+        self.counters: Dict[str, int] = {
+            "checks": 0,
+            "refreshes": 0,
+            "regenerated": 0,
+            "unchanged": 0,
+            "errors": 0,
+        }
+        self._wake = asyncio.Event()
+
+    def notify(self) -> None:
+        """Ask for a watermark check now, e.g. after a transactions import."""
+        self._wake.set()
+
+    async def _watermark(self) -> Tuple[Any, Any]:
+        rows = await self.executor.execute(WATERMARK_SQL)
+        row = rows[0] if rows else {}
+        return _field(row, "row_count"), str(_field(row, "latest"))
+
+    async def run_once(self) -> bool:
+        """Regenerate stale entries if new transactions arrived; True if it did."""
+        self.counters["checks"] += 1
+        watermark = await self._watermark()
+        if watermark == self.watermark:
+            return False
+
+        self.counters["refreshes"] += 1
+        history_rows, merchant_rows = await asyncio.gather(
+            self.executor.execute(HISTORY_SQL), self.executor.execute(MERCHANTS_SQL)
+        )
+        if self.products is not None:
+            self.products.add_rows(history_rows)
+        inputs = shopping_inputs(history_rows, merchant_rows)
+        fingerprint = input_fingerprint(
+            inputs["top_merchants"], inputs["favorite_merchants"], inputs["purchase_history"]
+        )
+        categories = dict.fromkeys(self.categories + self.store.categories(self.user_id))
+        for category in categories:
+            entry = self.store.get(self.user_id, category)
+            if entry is not None and entry.fingerprint == fingerprint:
+                self.counters["unchanged"] += 1
+                continue
+            text = await self.generate(category, inputs)
+            self.store.put(self.user_id, category, fingerprint, text, source="precomputed")
+            self.counters["regenerated"] += 1
+        # Only advance once every category is fresh, so a failure retries next tick.
+        self.watermark = watermark
+        return True
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                self.counters["errors"] += 1
+                logger.exception("Recommendation refresh failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            user_id=self.user_id,
+            categories=self.categories,
+            interval_seconds=self.interval,
+            watermark=list(self.watermark) if self.watermark else None,
+        )
@@ -0,0 +1,229 @@
+"""
+Compact result encoding for /format-results prompts.
+
+Query results used to be pasted into the prompt as indented JSON, with every key
+repeated on every row and only the first 20 rows visible to the model. Results
+are now transposed into columns once. Exact statistics are computed over every
+row the bridge kept: count, sum, mean, min/max and the top values per column.
+The prompt carries those statistics plus a small columnar sample (header once,
+rows as arrays), and says so when a row cap cut the list short.
+
+Results executed by the bridge itself are kept for a while in compacted form,
+so a later /format-results call can reference them by ``result_id``.
+"""
+
+import re
+import threading
+import time
+import uuid
+import heapq
+from collections import Counter, OrderedDict
+from itertools import chain
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from bridge_json import dumps_text
+
+_NATIVE_NUMBERS = (int, float)
+# Decimal strings as Snowflake prints them. Zero-padded strings ("0012") and digit
+# runs longer than a float holds exactly are IDs, ZIP codes or tokens, not amounts.
+_DECIMAL_TEXT = re.compile(r"-?(?:0|[1-9][0-9]{0,14})(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+
+
+def _number(value: Any) -> Optional[float]:
+    """Numeric value of a cell, accepting the decimal strings Snowflake returns."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, str) and _DECIMAL_TEXT.fullmatch(value):
+        return float(value)
+    return None
+
+
+def clip_text(text: str, width: int = 60) -> str:
+    return text if len(text) <= width else text[: width - 3] + "..."
+
+
+def round_number(value: float) -> Any:
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def to_columns(rows: Sequence[Mapping[str, Any]]) -> Dict[str, List[Any]]:
+    """Transpose rows into columns, keeping first-seen column order."""
+    names = dict.fromkeys(chain.from_iterable(rows))
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def column_stats(values: Iterable[Any], top_k: int = 3) -> Dict[str, Any]:
+    present = [value for value in values if value is not None and value != ""]
+    stats: Dict[str, Any] = {"count": len(present)}
+    numbers: Optional[List[float]] = None
+    if all(type(value) in _NATIVE_NUMBERS for value in present):
+        numbers = present
+    else:
+        numbers = []
+        for value in present:
+            number = _number(value)
+            if number is None:
+                numbers = None
+                break
+            numbers.append(number)
+    if present and numbers is not None:
+        total = sum(numbers)
+        stats.update(
+            sum=round_number(float(total)),
+            mean=round_number(total / len(numbers)),
+            min=round_number(float(min(numbers))),
+            max=round_number(float(max(numbers))),
+            top=[round_number(float(number)) for number in heapq.nlargest(top_k, numbers)],
+        )
+        return stats
+    counts = Counter(map(str, present))
+    stats["distinct"] = len(counts)
+    if counts:
+        stats.update(min=clip_text(min(counts)), max=clip_text(max(counts)))
+    if len(counts) < len(present):
+        # Only repeated values say anything; a column of unique IDs has no "top".
+        stats["top"] = [[clip_text(value), count] for value, count in counts.most_common(top_k)]
+    return stats
+
+
+@dataclass
+class CompactResults:
+    row_count: int
+    columns: List[str]
+    sample: List[List[Any]]
+    stats: Dict[str, Dict[str, Any]]
+    # Rows the caller sent beyond the bridge's row cap; not in the statistics.
+    dropped_rows: int = 0
+
+    @property
+    def total_rows(self) -> int:
+        return self.row_count + self.dropped_rows
+
+    def render(self) -> str:
+        if not self.row_count:
+            return "The query returned no rows."
+        if self.dropped_rows:
+            scope = (
+                f"Statistics over the first {self.row_count} of {self.total_rows} row(s) "
+                f"(the other {self.dropped_rows} were cut at the row limit), per column:"
+            )
+        else:
+            scope = f"Exact statistics over all {self.row_count} row(s), per column:"
+        return (
+            f"{scope}\n"
+            f"{dumps_text(self.stats)}\n"
+            f"First {len(self.sample)} row(s) as [{', '.join(self.columns)}]:\n"
+            + "\n".join(dumps_text(row) for row in self.sample)
+        )
+
+
+def compact_results(
+    rows: Sequence[Mapping[str, Any]],
+    sample_rows: int = 20,
+    top_k: int = 3,
+    *,
+    sent_rows: Optional[int] = None,
+) -> CompactResults:
+    """
+    Statistics and a sample for ``rows``. ``sent_rows`` is how many rows the
+    caller sent before a cap cut the list down to ``rows``. This is plain Python
+    over every cell (about 2 ms per 1k rows), so routes run it off the event loop.
+    """
+    columns = to_columns(rows)
+    names = list(columns)
+    return CompactResults(
+        row_count=len(rows),
+        columns=names,
+        sample=[[row.get(name) for name in names] for row in rows[:sample_rows]],
+        stats={name: column_stats(values, top_k) for name, values in columns.items()},
+        dropped_rows=max(0, (sent_rows or 0) - len(rows)),
+    )
+
+
+def summarize_results(results: CompactResults, max_rows: int = 5, max_columns: int = 6) -> str:
+    """
+    Plain-text answer built from the compacted results alone, for when the model
+    is unavailable: the row count, per-column totals or most common values, and
+    the first few rows as a table.
+    """
+    if not results.row_count:
+        return "The query returned no rows."
+    lines = [f"The query returned {results.total_rows} row(s)."]
+    if results.dropped_rows:
+        lines.append(f"Figures below cover the first {results.row_count}.")
+    for name in results.columns:
+        stats = results.stats.get(name, {})
+        if "sum" in stats:
+            lines.append(
+                f"- {name}: total {stats['sum']}, average {stats['mean']} "
+                f"(min {stats['min']}, max {stats['max']})"
+            )
+        elif stats.get("top"):
+            value, count = stats["top"][0]
+            lines.append(f"- {name}: {stats['distinct']} distinct, most often {value} ({count}x)")
+
+    columns = results.columns[:max_columns]
+    table = [[clip_text(str(name), 24) for name in columns]] + [
+        [clip_text("" if cell is None else str(cell), 24) for cell in row[:max_columns]]
+        for row in results.sample[:max_rows]
+    ]
+    widths = [max(len(row[index]) for row in table) for index in range(len(columns))]
+    rendered = [
+        " | ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in table
+    ]
+    rendered.insert(1, "-+-".join("-" * width for width in widths))
+    lines += ["", *rendered]
+    if results.total_rows > len(table) - 1:
+        lines.append(f"... {results.total_rows - (len(table) - 1)} more row(s)")
+    return "\n".join(lines)
+
+
+class UnknownResultError(LookupError):
+    """A result_id was referenced that is not (or no longer) held by this worker."""
+
+    def __init__(self, result_id: str) -> None:
+        super().__init__(
+            f"Result {result_id} is not held by this worker (expired, unknown, or kept by "
+            "another worker); send the rows again."
+        )
+        self.result_id = result_id
+
+
+class ResultStore:
+    """
+    Recently executed results, kept in compacted form so /format-results can
+    reference them by ID instead of receiving the rows again.
+    """
+
+    def __init__(self, max_entries: int = 64, ttl_seconds: float = 600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, CompactResults]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, results: CompactResults) -> str:
+        result_id = "res_" + uuid.uuid4().hex[:16]
+        with self._lock:
+            self._entries[result_id] = (time.monotonic() + self.ttl_seconds, results)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str) -> CompactResults:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(result_id, None)
+                raise UnknownResultError(result_id)
+            self._entries.move_to_end(result_id)
+            return entry[1]
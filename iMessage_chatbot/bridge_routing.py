@@ -0,0 +1,155 @@
+"""
+Complexity-based model routing.
+
+/generate-sql always used the heavy SQL model and /shopping-recommendations the
+heavy shopping model, even for single-table totals or a pick from a short
+candidate list. Each request is now scored locally, and requests below a route's
+threshold go to the fast default model. /generate-sql escalates to the heavy
+model when the fast model's SQL fails validation.
+
+SQL signals: tables the question implies (more than one means a join), analytic
+operations (ratios, comparisons, trends, rankings), several merchants compared,
+time phrases ``parse_time_range`` cannot resolve, large requested results and
+long questions. Shopping signals: no retrieved candidates to ground the answer,
+a long purchase history and an open-ended category.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from bridge_intents import CATEGORY_KEYWORDS, MERCHANTS, parse_limit, parse_time_range
+from bridge_sql_validate import SchemaCatalog
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Column-name words too generic to say which table a question is about.
+_GENERIC_COLUMN_WORDS = frozenset(
+    "id name total sub type json external last four method url currency".split()
+)
+_ANALYTIC = re.compile(
+    r"\b(average|avg|median|percent\w*|ratio|share|growth|trend\w*|compare\w*|versus|vs"
+    r"|difference|change|rank\w*|cumulative|running|distribution|correlat\w*"
+    r"|year over year|month over month|week over week)\b"
+)
+_GROUPING = re.compile(r"\b(per|each|by (day|week|month|year|merchant|product|category))\b")
+_TIME_WORDS = re.compile(
+    r"\b(since|between|before|after|during|quarter|q[1-4]|weekend|holiday\w*|season\w*"
+    r"|20\d\d|days?|weeks?|months?|years?)\b"
+)
+
+
+def _fold(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+@dataclass
+class Complexity:
+    score: int = 0
+    reasons: List[str] = field(default_factory=list)
+
+    def add(self, points: int, reason: str) -> None:
+        self.score += points
+        self.reasons.append(reason)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"score": self.score, "reasons": self.reasons}
+
+
+def implied_tables(words: List[str], catalog: Optional[SchemaCatalog]) -> List[str]:
+    """Tables whose name, or a column word specific to them, appears in the question."""
+    if not catalog:
+        return []
+    present = set(words)
+    tables = []
+    for table, columns in catalog.tables.items():
+        others = set().union(*(cols for name, cols in catalog.tables.items() if name != table))
+        keywords = {_fold(table.split(".")[-1].lower())}
+        for column in columns - others:
+            keywords.update(
+                _fold(part)
+                for part in column.lower().split("_")
+                if part and part not in _GENERIC_COLUMN_WORDS
+            )
+        if keywords & present:
+            tables.append(table)
+    return tables
+
+
+def sql_complexity(question: str, catalog: Optional[SchemaCatalog]) -> Complexity:
+    text = question.lower()
+    words = [_fold(word) for word in _WORD.findall(text)]
+    complexity = Complexity()
+
+    tables = implied_tables(words, catalog)
+    if len(tables) > 1:
+        complexity.add(2, f"joins {', '.join(sorted(tables))}")
+    analytic = {match.group(0) for match in _ANALYTIC.finditer(text)}
+    if analytic:
+        complexity.add(len(analytic), f"analytic: {', '.join(sorted(analytic))}")
+    if _GROUPING.search(text) and analytic:
+        complexity.add(1, "grouped aggregation")
+    merchants = [merchant for merchant in MERCHANTS if merchant.lower() in text]
+    if len(merchants) > 1:
+        complexity.add(1, f"{len(merchants)} merchants")
+    time_range = parse_time_range(text)
+    if _TIME_WORDS.search(text) and not time_range["start"]:
+        complexity.add(1, "unresolved time range")
+    limit = parse_limit(text)
+    if limit is not None and limit > 100:
+        complexity.add(1, f"large result ({limit} rows)")
+    if len(words) > 25:
+        complexity.add(1, f"long question ({len(words)} words)")
+    return complexity
+
+
+def shopping_complexity(history_size: int, category: Optional[str], candidates: int) -> Complexity:
+    complexity = Complexity()
+    if not candidates:
+        complexity.add(2, "no candidate products")
+    if history_size > 100:
+        complexity.add(1, f"long history ({history_size} items)")
+    words = (category or "").lower().split()
+    if len(words) > 2 and not any(keyword in CATEGORY_KEYWORDS for keyword in words):
+        complexity.add(1, "open-ended category")
+    return complexity
+
+
+class ModelRouter:
+    """Send requests scoring under a route's threshold to the fast model."""
+
+    def __init__(
+        self, fast_model: str, thresholds: Mapping[str, int], *, enabled: bool = True
+    ) -> None:
+        self.fast_model = fast_model
+        self.thresholds = dict(thresholds)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _incr(self, route: str, counter: str) -> None:
+        with self._lock:
+            bucket = self._counters.setdefault(route, {"fast": 0, "heavy": 0, "escalated": 0})
+            bucket[counter] += 1
+
+    def choose(self, route: str, heavy_model: str, complexity: Complexity) -> Tuple[str, str]:
+        """Returns ``(model, tier)`` with tier ``"fast"`` or ``"heavy"``."""
+        threshold = self.thresholds.get(route)
+        if self.enabled and threshold is not None and complexity.score < threshold:
+            tier, model = "fast", self.fast_model
+        else:
+            tier, model = "heavy", heavy_model
+        self._incr(route, tier)
+        return model, tier
+
+    def escalated(self, route: str) -> None:
+        self._incr(route, "escalated")
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "fast_model": self.fast_model,
+                "thresholds": dict(self.thresholds),
+                "routes": {route: dict(counters) for route, counters in self._counters.items()},
+            }
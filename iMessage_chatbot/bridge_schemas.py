@@ -0,0 +1,131 @@
+"""
+Registry of database schemas referenced by ID.
+
+The chatbot used to resend its full schema description on every /generate-sql
+call. A schema is now registered once (``POST /schemas``) and referenced by a
+content-hash ID. Each entry keeps a compacted copy of the text for prompts and
+the parsed table/column catalog used by the SQL validator. Whitespace-only
+differences hash to the same ID, so they also share cache entries.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from bridge_sql_validate import SchemaCatalog, parse_schema
+
+
+class UnknownSchemaError(LookupError):
+    """A schema ID was referenced that is not (or no longer) registered on this worker."""
+
+    def __init__(self, schema_id: str) -> None:
+        super().__init__(
+            f"Schema {schema_id} is not registered on this worker; send it inline or POST it "
+            "to /schemas again."
+        )
+        self.schema_id = schema_id
+
+
+def compact_schema(schema: str) -> str:
+    """
+    Strip indentation and blank lines, and join wrapped column lists back onto
+    their ``- table:`` line, so the prompt carries one line per table.
+    """
+    lines: List[str] = []
+    for raw_line in schema.splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            continue
+        previous = lines[-1] if lines else ""
+        continues_columns = (
+            previous.startswith("-")
+            and previous.endswith(",")
+            and not line.startswith("-")
+            and ":" not in line
+        )
+        if continues_columns:
+            lines[-1] = f"{previous} {line}"
+        else:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def schema_id_for(compact: str) -> str:
+    return "sch_" + hashlib.sha256(compact.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class RegisteredSchema:
+    schema_id: str
+    text: str
+    catalog: SchemaCatalog
+    raw_bytes: int
+    registered_at: float
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "schema_id": self.schema_id,
+            "tables": {table: sorted(columns) for table, columns in self.catalog.tables.items()},
+            "raw_bytes": self.raw_bytes,
+            "compact_bytes": len(self.text.encode("utf-8")),
+        }
+
+
+class SchemaRegistry:
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, RegisteredSchema]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"registered": 0, "hits": 0, "unknown": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def register(self, schema: str) -> RegisteredSchema:
+        compact = compact_schema(schema)
+        schema_id = schema_id_for(compact)
+        with self._lock:
+            entry = self._entries.get(schema_id)
+            if entry is not None:
+                self._entries.move_to_end(schema_id)
+                return entry
+        entry = RegisteredSchema(
+            schema_id=schema_id,
+            text=compact,
+            catalog=parse_schema(compact),
+            raw_bytes=len(schema.encode("utf-8")),
+            registered_at=time.time(),
+        )
+        with self._lock:
+            self._entries[schema_id] = entry
+            self._entries.move_to_end(schema_id)
+            self.counters["registered"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evicted"] += 1
+        return entry
+
+    def get(self, schema_id: str) -> RegisteredSchema:
+        with self._lock:
+            entry = self._entries.get(schema_id)
+            if entry is None:
+                self.counters["unknown"] += 1
+                raise UnknownSchemaError(schema_id)
+            self._entries.move_to_end(schema_id)
+            self.counters["hits"] += 1
+            return entry
+
+    def resolve(
+        self, schema: Optional[str] = None, schema_id: Optional[str] = None
+    ) -> RegisteredSchema:
+        """Look up ``schema_id``, or register an inline ``schema`` on the fly."""
+        if schema_id:
+            return self.get(schema_id)
+        return self.register(schema or "")
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), max_entries=self.max_entries)
@@ -0,0 +1,254 @@
+"""
+Per-session conversation context.
+
+Bridge requests used to be stateless. The chatbot resent the purchase history,
+top merchants and earlier turns on every call, and every prompt was rebuilt
+from them. A request can now carry a ``session_id``. The bridge keeps that
+session's shopping context and recent turns, so later requests only send what
+changed:
+
+* purchase history items are merged by (merchant, product, date), newest first,
+  so resending the whole list and sending only the new items are equivalent;
+* top merchants, favorite merchants and purchase totals replace the stored
+  values when a request carries them;
+* each answered question is kept as a turn, and the last ``max_turns`` are
+  quoted in later prompts so follow-up questions make sense.
+
+What prompts need from a session is computed when the session changes, not on
+every request: a condensed purchase summary, the recommendation input
+fingerprint and the rendered recent turns.
+
+Sessions are dropped least recently used beyond ``max_sessions`` and after
+``ttl_seconds`` without a request. Like result and schema IDs, they live in
+the worker that served them. A response reporting ``"new": true`` means the
+bridge had no context for the session, and the caller should send the full
+context again.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from bridge_recommendations import input_fingerprint
+from bridge_results import clip_text
+
+MAX_SESSION_ID = 128
+
+
+def _amount(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _history_key(item: Mapping[str, Any]) -> Tuple[str, str, str]:
+    return (
+        str(item.get("merchant") or "").lower(),
+        str(item.get("product") or "").lower(),
+        str(item.get("date") or ""),
+    )
+
+
+def condense_history(
+    purchase_history: Sequence[Mapping[str, Any]], top_merchants: Sequence[Mapping[str, Any]]
+) -> str:
+    """One paragraph summing up a purchase history: totals, date range, top products and stores."""
+    if not purchase_history:
+        return ""
+    amounts = [_amount(item.get("amount")) for item in purchase_history]
+    dates = sorted(str(item["date"])[:10] for item in purchase_history if item.get("date"))
+    products = Counter(
+        clip_text(str(item["product"]), 40) for item in purchase_history if item.get("product")
+    )
+    if top_merchants:
+        merchants = [
+            f"{item.get('name')} ${_amount(item.get('total')):,.2f}" for item in top_merchants[:5]
+        ]
+    else:
+        spend: Counter = Counter()
+        for item, amount in zip(purchase_history, amounts):
+            spend[str(item.get("merchant") or "unknown")] += amount
+        merchants = [f"{name} ${total:,.2f}" for name, total in spend.most_common(5)]
+    summary = (
+        f"{len(purchase_history)} purchases totaling ${sum(amounts):,.2f} "
+        f"(average ${sum(amounts) / len(amounts):,.2f})"
+    )
+    if dates:
+        summary += f" from {dates[0]} to {dates[-1]}"
+    summary += f". Spend by merchant: {', '.join(merchants)}."
+    if products:
+        top = ", ".join(f"{name} ({count})" for name, count in products.most_common(5))
+        summary += f" Most bought: {top}."
+    return summary
+
+
+@dataclass(frozen=True)
+class Turn:
+    question: str
+    answer: str
+
+
+class Session:
+    def __init__(self, session_id: str, *, max_turns: int = 6, max_history: int = 1000) -> None:
+        self.session_id = session_id
+        self.max_history = max_history
+        self.requests = 0
+        self.purchase_history: List[Dict[str, Any]] = []
+        self.top_merchants: List[Dict[str, Any]] = []
+        self.favorite_merchants: List[str] = []
+        self.average_purchase_amount: Optional[float] = None
+        self.total_purchases: Optional[int] = None
+        self.turns: Deque[Turn] = deque(maxlen=max(0, max_turns))
+        self.summary = ""
+        self.fingerprint = input_fingerprint([], [], [])
+        self.rendered_turns = ""
+        self._history_keys: Set[Tuple[str, str, str]] = set()
+
+    def merge_shopping(
+        self,
+        *,
+        purchase_history: Sequence[Dict[str, Any]] = (),
+        top_merchants: Sequence[Dict[str, Any]] = (),
+        favorite_merchants: Sequence[str] = (),
+        average_purchase_amount: Optional[float] = None,
+        total_purchases: Optional[int] = None,
+    ) -> None:
+        """Fold a request's shopping fields in; empty fields keep the stored values."""
+        new_items = []
+        for item in purchase_history:
+            key = _history_key(item)
+            if key not in self._history_keys:
+                self._history_keys.add(key)
+                new_items.append(item)
+        if new_items:
+            history = sorted(
+                new_items + self.purchase_history,
+                key=lambda item: str(item.get("date") or ""),
+                reverse=True,
+            )
+            self.purchase_history = history[: self.max_history]
+            self._history_keys = {_history_key(item) for item in self.purchase_history}
+        changed = bool(new_items)
+        if top_merchants and list(top_merchants) != self.top_merchants:
+            self.top_merchants = list(top_merchants)
+            changed = True
+        if favorite_merchants and list(favorite_merchants) != self.favorite_merchants:
+            self.favorite_merchants = list(favorite_merchants)
+            changed = True
+        if average_purchase_amount is not None:
+            self.average_purchase_amount = average_purchase_amount
+        elif new_items and self.purchase_history:
+            amounts = [_amount(item.get("amount")) for item in self.purchase_history]
+            self.average_purchase_amount = round(sum(amounts) / len(amounts), 2)
+        if total_purchases is not None:
+            self.total_purchases = total_purchases
+        elif new_items:
+            self.total_purchases = len(self.purchase_history)
+        if changed:
+            # Derived once per change; requests that only reuse the context skip this.
+            self.summary = condense_history(self.purchase_history, self.top_merchants)
+            self.fingerprint = input_fingerprint(
+                self.top_merchants, self.favorite_merchants, self.purchase_history
+            )
+
+    def shopping_fields(self) -> Dict[str, Any]:
+        return {
+            "purchase_history": self.purchase_history,
+            "top_merchants": self.top_merchants,
+            "favorite_merchants": self.favorite_merchants,
+            "average_purchase_amount": self.average_purchase_amount,
+            "total_purchases": self.total_purchases,
+        }
+
+    def add_turn(self, question: str, answer: str) -> None:
+        if self.turns.maxlen == 0:
+            return
+        self.turns.append(Turn(clip_text(question, 200), clip_text(answer, 400)))
+        self.rendered_turns = "\n".join(
+            f"User: {turn.question}\nAssistant: {turn.answer}" for turn in self.turns
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.session_id,
+            "new": self.requests <= 1,
+            "turns": len(self.turns),
+            "history_items": len(self.purchase_history),
+        }
+
+
+class SessionStore:
+    """Sessions by ID, least recently used dropped first, each expiring when idle."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        ttl_seconds: float = 1800.0,
+        *,
+        max_turns: int = 6,
+        max_history: int = 1000,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.max_history = max_history
+        self._sessions: "OrderedDict[str, Tuple[float, Session]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"hits": 0, "created": 0, "evicted": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def open(self, session_id: str) -> Session:
+        """The live session for ``session_id``, created empty if unknown or expired."""
+        if not session_id or len(session_id) > MAX_SESSION_ID:
+            raise ValueError(f"session_id must be 1-{MAX_SESSION_ID} characters.")
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None and entry[0] < now:
+                self.counters["expired"] += 1
+                entry = None
+            if entry is None:
+                session = Session(
+                    session_id, max_turns=self.max_turns, max_history=self.max_history
+                )
+                self.counters["created"] += 1
+            else:
+                session = entry[1]
+                self.counters["hits"] += 1
+            session.requests += 1
+            self._sessions[session_id] = (now + self.ttl_seconds, session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.counters["evicted"] += 1
+        return session
+
+    def peek(self, session_id: Optional[str]) -> Optional[Session]:
+        """The session if it is live, without counting a request or refreshing its TTL."""
+        if not session_id:
+            return None
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry[1] if entry is not None and entry[0] >= time.monotonic() else None
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self.counters,
+                sessions=len(self._sessions),
+                max_sessions=self.max_sessions,
+                ttl_seconds=self.ttl_seconds,
+                max_turns=self.max_turns,
+            )
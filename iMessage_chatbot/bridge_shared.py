@@ -0,0 +1,381 @@
+"""
+Cross-worker state for multi-process deployments.
+
+With several uvicorn workers, each process would otherwise keep its own
+response cache, coalesce only its own calls and enforce model limits on its
+own. Pointing ``DEDALUS_BRIDGE_SHARED_STATE`` at a SQLite file (WAL mode) moves
+three things into that file, shared by every worker on the host:
+
+* ``SharedResponseCache`` - the response cache, with the same interface as
+  ``ResponseCache``.
+* ``SharedFlights`` - a lease per cache key. When one worker is already asking
+  the model a question, other workers wait for its answer to land in the shared
+  cache instead of sending a duplicate request.
+* ``SharedSlots`` - leased per-model slots, so ``ModelLimiter`` limits hold
+  across all workers instead of per process.
+
+A write waits up to five seconds for another worker's lock, so the async paths
+send every statement to the store's own thread (``SharedStore.run``) instead of
+running it on the event loop. Leases expire, so a crashed worker cannot hold a
+key or a slot forever.
+
+The schema registry, stored results and sessions are not shared: their IDs are
+only known to the worker that issued them.
+"""
+
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from bridge_cache import CacheStats
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used);
+CREATE TABLE IF NOT EXISTS flights (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slots_model ON slots (model, expires_at);
+"""
+
+
+class SharedStore:
+    """One SQLite connection per worker onto the shared state file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # One thread: statements are serialized by the lock anyway, and a single
+        # busy wait should not tie up the default executor.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bridge-shared")
+
+    async def run(
+        self,
+        function: Callable[..., T],
+        *args: Any,
+        on_abandon: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        """
+        Call ``function(*args)`` on the store's thread. If the caller is cancelled
+        while it runs, the call still completes; ``on_abandon`` then gets its
+        result, so a lease taken for a caller that left can be given back.
+        """
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if on_abandon is not None:
+
+                def hand_back(done: "asyncio.Future[T]") -> None:
+                    if not done.cancelled() and done.exception() is None:
+                        on_abandon(done.result())
+
+                future.add_done_callback(hand_back)
+            raise
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> None:
+        """Queue ``function(*args)`` on the store's thread without waiting for it."""
+        try:
+            self._executor.submit(function, *args)
+        except RuntimeError:
+            # Shutting down; whatever this would have released expires with its lease.
+            pass
+
+    def query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+class SharedResponseCache:
+    """``ResponseCache`` backed by the shared store; LRU by last use, TTL by wall clock."""
+
+    def __init__(
+        self,
+        store: SharedStore,
+        *,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl_seconds: float = 300.0,
+    ) -> None:
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def __len__(self) -> int:
+        return self.store.query("SELECT COUNT(*) FROM cache")[0][0]
+
+    def peek(self, key: str) -> Optional[str]:
+        """Read a live entry without touching stats or recency."""
+        rows = self.store.query(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        )
+        return rows[0][0] if rows else None
+
+    def get(self, endpoint: str, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        rows = self.store.query("SELECT value, expires_at FROM cache WHERE key = ?", (key,))
+        if rows and rows[0][1] <= now:
+            self.store.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.stats.incr(endpoint, "evictions")
+            rows = []
+        if not rows:
+            self.stats.incr(endpoint, "misses")
+            return None
+        self.store.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+        self.stats.incr(endpoint, "hits")
+        return rows[0][0]
+
+    async def aget(self, endpoint: str, key: str) -> Optional[str]:
+        return await self.store.run(self.get, endpoint, key)
+
+    def set(self, endpoint: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        if not self.enabled or value is None:
+            return
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl is None else ttl)
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, value, size, expires_at, now),
+            )
+            evicted = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+            evicted += conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used "
+                "LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?))",
+                (self.max_entries,),
+            ).rowcount
+            while conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0] > (
+                self.max_bytes
+            ):
+                evicted += conn.execute(
+                    "DELETE FROM cache WHERE key = (SELECT key FROM cache ORDER BY last_used "
+                    "LIMIT 1)"
+                ).rowcount
+        self.stats.incr(endpoint, "stores")
+        for _ in range(evicted):
+            self.stats.incr(endpoint, "evictions")
+
+    async def aset(
+        self, endpoint: str, key: str, value: str, ttl: Optional[float] = None
+    ) -> None:
+        await self.store.run(self.set, endpoint, key, value, ttl)
+
+    def invalidate(self, key: str) -> None:
+        self.store.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def ainvalidate(self, key: str) -> None:
+        await self.store.run(self.invalidate, key)
+
+    def clear(self) -> None:
+        self.store.execute("DELETE FROM cache")
+
+    def describe(self) -> Dict[str, Any]:
+        entries, size = self.store.query("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache")[0]
+        return {
+            "enabled": self.enabled,
+            "shared": self.store.path,
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "endpoints": self.stats.snapshot(),
+        }
+
+
+class SharedFlights:
+    """Cross-worker single-flight for cached calls, built on per-key leases."""
+
+    def __init__(
+        self,
+        cache: SharedResponseCache,
+        *,
+        lease_seconds: float = 120.0,
+        poll_interval: float = 0.05,
+    ) -> None:
+        self.cache = cache
+        self.store = cache.store
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.counters: Dict[str, int] = {"leases": 0, "waited": 0, "served_remote": 0}
+
+    def _claim(self, key: str) -> bool:
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM flights WHERE key = ? AND expires_at <= ?", (key, now))
+            return bool(
+                conn.execute(
+                    "INSERT OR IGNORE INTO flights VALUES (?, ?, ?)",
+                    (key, self.store.owner, now + self.lease_seconds),
+                ).rowcount
+            )
+
+    def _held(self, key: str) -> bool:
+        return bool(
+            self.store.query(
+                "SELECT 1 FROM flights WHERE key = ? AND expires_at > ?", (key, time.time())
+            )
+        )
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``factory`` unless another worker holds the lease for ``key``. In that
+        case, poll the shared cache for its answer; if the other worker finishes
+        without storing one (or dies), run ``factory`` here after all.
+        """
+        run = self.store.run
+        if not await run(self._claim, key, on_abandon=self._abandoned(key)):
+            self.counters["waited"] += 1
+            deadline = time.monotonic() + self.lease_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                cached = await run(self.cache.peek, key)
+                if cached is not None:
+                    self.counters["served_remote"] += 1
+                    return cached
+                if not await run(self._held, key):
+                    break
+            if not await run(self._claim, key, on_abandon=self._abandoned(key)):
+                return await factory()
+
+        self.counters["leases"] += 1
+        try:
+            return await factory()
+        finally:
+            self.store.submit(self._release, key)
+
+    def _release(self, key: str) -> None:
+        self.store.execute(
+            "DELETE FROM flights WHERE key = ? AND owner = ?", (key, self.store.owner)
+        )
+
+    def _abandoned(self, key: str) -> Callable[[bool], None]:
+        def release_if_claimed(claimed: bool) -> None:
+            if claimed:
+                self.store.submit(self._release, key)
+
+        return release_if_claimed
+
+    def describe(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+
+class SharedSlots:
+    """Leased concurrency slots per model, counted across every worker."""
+
+    def __init__(
+        self, store: SharedStore, *, lease_seconds: float = 300.0, poll_interval: float = 0.02
+    ) -> None:
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def try_acquire(self, model: str, limit: int) -> Optional[int]:
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM slots WHERE expires_at <= ?", (now,))
+            (active,) = conn.execute(
+                "SELECT COUNT(*) FROM slots WHERE model = ?", (model,)
+            ).fetchone()
+            if active >= limit:
+                return None
+            return conn.execute(
+                "INSERT INTO slots (model, owner, expires_at) VALUES (?, ?, ?)",
+                (model, self.store.owner, now + self.lease_seconds),
+            ).lastrowid
+
+    async def acquire(self, model: str, limit: int, timeout: Optional[float]) -> Optional[int]:
+        """Wait for a slot; returns its token, or None if ``timeout`` ran out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            token = await self.store.run(
+                self.try_acquire, model, limit, on_abandon=self._abandoned
+            )
+            if token is not None:
+                return token
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self, token: int) -> None:
+        """Give the slot back; the delete is queued on the store's thread."""
+        self.store.submit(self._delete, token)
+
+    def _delete(self, token: int) -> None:
+        self.store.execute("DELETE FROM slots WHERE id = ?", (token,))
+
+    def _abandoned(self, token: Optional[int]) -> None:
+        if token is not None:
+            self.release(token)
+
+    def active(self) -> Dict[str, int]:
+        rows = self.store.query(
+            "SELECT model, COUNT(*) FROM slots WHERE expires_at > ? GROUP BY model",
+            (time.time(),),
+        )
+        return dict(rows)
@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing for identical in-flight Dedalus calls.
+
+When a burst of users asks the same question, only the first call (the leader)
+goes upstream; concurrent callers with the same key await the same task. The
+upstream task is owned by the group rather than by the leader, so a leader whose
+client disconnects does not cancel the answer its followers are waiting on. The
+upstream call is only cancelled once every waiter has gone away.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def flight_key(
+    input_text: str,
+    model: str,
+    system_prompt: Optional[str] = None,
+    mcp_servers: Optional[List[str]] = None,
+) -> str:
+    raw = json.dumps([input_text, model, system_prompt or "", sorted(mcp_servers or [])])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+        self.counters: Dict[str, int] = {
+            "leaders": 0,
+            "collapsed": 0,
+            "abandoned": 0,
+            "upstream_cancelled": 0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(
+                lambda _task, key=key, flight=flight: self._forget(key, flight)
+            )
+            self.counters["leaders"] += 1
+        else:
+            self.counters["collapsed"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                self.counters["abandoned"] += 1
+                if flight.waiters == 1:
+                    flight.task.cancel()
+                    self.counters["upstream_cancelled"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def describe(self) -> Dict[str, int]:
+        return dict(self.counters, in_flight=self.in_flight)
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark the exception as retrieved when every waiter has already left.
+            flight.task.exception()
@@ -0,0 +1,200 @@
+"""
+Few-shot examples for /generate-sql, learned from the bridge's own answers.
+
+Every model-generated query that passes validation is saved with its question
+and schema ID in a local SQLite file, so it outlives restarts. For a new
+question, the closest saved questions for the same schema are found with BM25
+over word unigrams and bigrams (no embeddings), and their question/SQL pairs
+are put into the prompt as worked examples.
+
+Each worker keeps the index in memory. Before every lookup it reads rows added
+since its last sync (an indexed rowid range), so examples recorded by other
+workers are picked up without a restart. That read and the write in ``record``
+can wait on another worker's lock, so the bridge calls both from a thread.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_examples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    schema_id TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    question TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (schema_id, normalized)
+);
+"""
+
+_WORD = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an and are did do does for from have i in is it me my of on or show "
+    "that the to was were what which with you".split()
+)
+_K1 = 1.2
+_B = 0.75
+
+
+def question_terms(question: str) -> List[str]:
+    words = [word for word in _WORD.findall(question.lower()) if word not in _STOPWORDS]
+    return words + [f"{left} {right}" for left, right in zip(words, words[1:])]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(_WORD.findall(question.lower()))
+
+
+@dataclass(frozen=True)
+class SQLExample:
+    question: str
+    sql: str
+    score: float
+
+
+class _SchemaIndex:
+    """BM25 postings for the examples of one schema."""
+
+    def __init__(self) -> None:
+        self.examples: List[Tuple[str, str]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.by_question: Dict[str, int] = {}
+
+    def add(self, normalized: str, question: str, sql: str) -> None:
+        position = self.by_question.get(normalized)
+        if position is not None:
+            # Same question answered again: keep the latest SQL.
+            self.examples[position] = (question, sql)
+            return
+        position = len(self.examples)
+        counts = Counter(question_terms(question))
+        self.by_question[normalized] = position
+        self.examples.append((question, sql))
+        self.lengths.append(sum(counts.values()))
+        for term, count in counts.items():
+            self.postings[term][position] = count
+
+    def search(self, question: str, k: int) -> List[SQLExample]:
+        total = len(self.examples)
+        if not total:
+            return []
+        average = sum(self.lengths) / total or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(question_terms(question)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings.items():
+                norm = _K1 * (1 - _B + _B * self.lengths[position] / average)
+                scores[position] += idf * count * (_K1 + 1) / (count + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            SQLExample(*self.examples[position], score=round(score, 3))
+            for position, score in ranked
+        ]
+
+
+class SQLExampleStore:
+    def __init__(self, path: str, *, min_score: float = 1.0) -> None:
+        self.path = path
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._indexes: Dict[str, _SchemaIndex] = defaultdict(_SchemaIndex)
+        self._last_id = 0
+        self.counters: Dict[str, int] = {"recorded": 0, "lookups": 0, "hits": 0}
+        self._sync()
+
+    def _sync(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, schema_id, normalized, question, sql FROM sql_examples "
+            "WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        for row_id, schema_id, normalized, question, sql in rows:
+            self._indexes[schema_id].add(normalized, question, sql)
+            self._last_id = row_id
+
+    def __len__(self) -> int:
+        return sum(len(index.examples) for index in self._indexes.values())
+
+    def record(self, question: str, sql: str, schema_id: str) -> None:
+        """Save a validated question/SQL pair; a repeated question replaces its SQL."""
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        with self._lock:
+            self._sync()
+            index = self._indexes.get(schema_id)
+            position = index.by_question.get(normalized) if index is not None else None
+            if position is not None and index.examples[position][1] == sql:
+                return
+            # Delete + insert (not update) so the row gets a new id and other
+            # workers' rowid sync sees the new SQL.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM sql_examples WHERE schema_id = ? AND normalized = ?",
+                    (schema_id, normalized),
+                )
+                self._conn.execute(
+                    "INSERT INTO sql_examples (schema_id, normalized, question, sql, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (schema_id, normalized, question, sql, time.time()),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._sync()
+            self.counters["recorded"] += 1
+
+    def nearest(self, question: str, schema_id: str, k: int = 3) -> List[SQLExample]:
+        """Up to ``k`` saved examples for ``schema_id`` scoring at least ``min_score``."""
+        with self._lock:
+            self._sync()
+            self.counters["lookups"] += 1
+            index = self._indexes.get(schema_id)
+            examples = index.search(question, k) if index is not None else []
+            examples = [example for example in examples if example.score >= self.min_score]
+            if examples:
+                self.counters["hits"] += 1
+        return examples
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def describe(self) -> Dict[str, Any]:
+        # No lock: a lookup holding it may be waiting on SQLite, and this is
+        # served on the event loop.
+        indexes = list(self._indexes.values())
+        counters = dict(self.counters)
+        lookups = counters["lookups"]
+        return dict(
+            counters,
+            path=self.path,
+            examples=sum(len(index.examples) for index in indexes),
+            schemas=len(indexes),
+            hit_rate=round(counters["hits"] / lookups, 3) if lookups else None,
+        )
+
+
+def render_examples(examples: List[SQLExample]) -> Optional[str]:
+    if not examples:
+        return None
+    return "\n\n".join(f"Question: {example.question}\nSQL: {example.sql}" for example in examples)
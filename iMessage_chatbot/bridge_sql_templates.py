@@ -0,0 +1,258 @@
+"""
+Parameterized SQL templates for canned analytics questions.
+
+The head of the /generate-sql distribution maps directly onto the queries in
+``dataset/knot_data/query_snowflake.py`` (spend by merchant, recent
+transactions, FSA/HSA products, ...). Those queries are kept here as templates
+whose merchant, date range and limit slots are filled locally, so a match costs
+microseconds and only misses go to the model.
+
+Slot values never come from free text: merchants are taken from a fixed list and
+dates/limits are parsed into typed values before being rendered. A question with
+a constraint no slot captures (a second merchant or one not on the list, any
+other "at/on/in/for X" qualifier, an order status or payment method, a negation,
+an amount threshold, "least", a count or a date the parsers did not resolve)
+matches nothing, rather than being answered with SQL that silently drops the
+constraint.
+
+Templates are written for Snowflake. Where another executor's dialect differs
+(SQLite has no ``DATE_TRUNC``), ``match`` renders that dialect's expression.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+
+from bridge_intents import (
+    find_merchant,
+    parse_limit,
+    parse_time_range,
+    unresolved_constraints,
+)
+
+
+@dataclass(frozen=True)
+class SQLTemplate:
+    name: str
+    pattern: Pattern[str]
+    sql: str
+    requires: Sequence[str]
+    default_limit: Optional[int] = None
+    max_limit: int = 100
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    name: str
+    sql: str
+    slots: Dict[str, Optional[str]]
+
+
+def _template(name: str, pattern: str, sql: str, requires: Sequence[str], **kwargs) -> SQLTemplate:
+    return SQLTemplate(name, re.compile(pattern), sql.strip(), tuple(requires), **kwargs)
+
+
+# Questions about the Nessie tables never match the purchase templates.
+_EXCLUDE = re.compile(r"\b(bills?|loans?|deposits?|nessie)\b")
+
+# Dialect-specific expressions, keyed by executor name; Snowflake's is the default.
+_MONTH_EXPRESSIONS = {
+    "snowflake": "DATE_TRUNC('month', datetime)",
+    "duckdb": "DATE_TRUNC('month', datetime)",
+    "sqlite": "strftime('%Y-%m', datetime)",
+}
+
+# Ordered from most to least specific; the first match wins.
+TEMPLATES: List[SQLTemplate] = [
+    _template(
+        "fsa_hsa_products",
+        r"\b(fsa|hsa)\b",
+        """
+SELECT product_name, merchant_name, quantity, product_total, eligibility
+FROM products
+WHERE eligibility LIKE '%FSA_HSA%'{product_filters}
+ORDER BY product_total DESC
+LIMIT {limit}
+""",
+        ("products", "eligibility", "product_total"),
+        default_limit=20,
+    ),
+    _template(
+        "payment_method_breakdown",
+        r"\b(payment methods?|which cards?|by card|credit card|debit card)\b",
+        """
+SELECT payment_method_brand, payment_method_type,
+       COUNT(*) AS transaction_count, SUM(price_total) AS total_spend
+FROM transactions
+WHERE payment_method_brand IS NOT NULL{transaction_filters}
+GROUP BY payment_method_brand, payment_method_type
+ORDER BY total_spend DESC
+""",
+        ("transactions", "payment_method_brand", "payment_method_type", "price_total"),
+    ),
+    _template(
+        "discount_fee_analysis",
+        r"\b(discounts?|fees?|tipped|tipping|taxes)\b",
+        """
+SELECT merchant_name, COUNT(*) AS transactions,
+       SUM(total_discount) AS total_discounts, SUM(total_fee) AS total_fees,
+       SUM(total_tax) AS total_tax, SUM(total_tip) AS total_tips
+FROM transactions
+WHERE 1 = 1{transaction_filters}
+GROUP BY merchant_name
+ORDER BY total_discounts DESC
+""",
+        ("transactions", "total_discount", "total_fee", "total_tax", "total_tip"),
+    ),
+    _template(
+        "monthly_spending_trend",
+        r"\b(monthly|by month|per month|each month|month over month)\b",
+        """
+SELECT {month} AS month, COUNT(*) AS transaction_count,
+       SUM(price_total) AS monthly_spend, AVG(price_total) AS avg_transaction
+FROM transactions
+WHERE 1 = 1{transaction_filters}
+GROUP BY {month}
+ORDER BY month DESC
+""",
+        ("transactions", "datetime", "price_total"),
+    ),
+    _template(
+        "top_products",
+        r"\b(top|most (bought|purchased)|biggest|best[- ]selling)\b.*\b(products?|items?)\b",
+        """
+SELECT product_name, merchant_name, SUM(quantity) AS total_quantity,
+       SUM(product_total) AS total_spend, AVG(product_unit_price) AS avg_unit_price
+FROM products
+WHERE 1 = 1{product_filters}
+GROUP BY product_name, merchant_name
+ORDER BY total_spend DESC
+LIMIT {limit}
+""",
+        ("products", "product_name", "product_total", "product_unit_price"),
+        default_limit=20,
+    ),
+    _template(
+        "recent_transactions",
+        r"\b(recent|latest|last \d+|last (few|couple))\b.*\b(orders?|purchases?|transactions?)\b",
+        """
+SELECT transaction_id, merchant_name, datetime, order_status, price_total
+FROM transactions
+WHERE 1 = 1{transaction_filters}
+ORDER BY datetime DESC
+LIMIT {limit}
+""",
+        ("transactions", "transaction_id", "datetime", "price_total"),
+        default_limit=10,
+    ),
+    _template(
+        "spend_by_merchant",
+        r"\b(by|per|each|which) (merchant|store)s?\b|\bwhere do i spend\b",
+        """
+SELECT merchant_name, COUNT(*) AS transaction_count,
+       SUM(price_total) AS total_spend, AVG(price_total) AS avg_transaction
+FROM transactions
+WHERE 1 = 1{transaction_filters}
+GROUP BY merchant_name
+ORDER BY total_spend DESC
+""",
+        ("transactions", "merchant_name", "price_total"),
+    ),
+    _template(
+        "total_spend",
+        r"\b(how much|total)\b.*\bspen[dt]\b|\bspen[dt]\b.*\b(in total|altogether|overall)\b",
+        """
+SELECT COUNT(*) AS transaction_count, SUM(price_total) AS total_spend,
+       AVG(price_total) AS avg_transaction
+FROM transactions
+WHERE 1 = 1{transaction_filters}
+""",
+        ("transactions", "price_total"),
+    ),
+]
+
+
+def _transaction_filters(merchant: Optional[str], start: Optional[str], end: Optional[str]) -> str:
+    clauses: List[str] = []
+    if merchant:
+        clauses.append(f"UPPER(merchant_name) = UPPER('{merchant}')")
+    if start:
+        clauses.append(f"datetime >= '{start}'")
+    if end:
+        next_day = date.fromisoformat(end) + timedelta(days=1)
+        clauses.append(f"datetime < '{next_day.isoformat()}'")
+    return "".join(f"\n  AND {clause}" for clause in clauses)
+
+
+def _product_filters(merchant: Optional[str], start: Optional[str], end: Optional[str]) -> str:
+    filters = ""
+    if merchant:
+        filters += f"\n  AND UPPER(merchant_name) = UPPER('{merchant}')"
+    date_filters = _transaction_filters(None, start, end)
+    if date_filters:
+        # The products table has no timestamp; scope it through its transactions.
+        filters += (
+            "\n  AND transaction_id IN (SELECT transaction_id FROM transactions WHERE 1 = 1"
+            + date_filters.replace("\n  ", " ")
+            + ")"
+        )
+    return filters
+
+
+def _schema_supports(template: SQLTemplate, schema: Optional[str]) -> bool:
+    if not schema:
+        return True
+    lowered = schema.lower()
+    return all(re.search(rf"\b{name}\b", lowered) for name in template.requires)
+
+
+class SQLTemplateLibrary:
+    def __init__(self, templates: Optional[Sequence[SQLTemplate]] = None) -> None:
+        self.templates = list(TEMPLATES if templates is None else templates)
+
+    def match(
+        self,
+        question: str,
+        schema: Optional[str] = None,
+        today: Optional[date] = None,
+        dialect: str = "snowflake",
+    ) -> Optional[TemplateMatch]:
+        text = " ".join((question or "").lower().split())
+        if _EXCLUDE.search(text):
+            return None
+        if unresolved_constraints(text, today):
+            return None
+        for template in self.templates:
+            if not template.pattern.search(text):
+                continue
+            if not _schema_supports(template, schema):
+                return None
+            return self._render(template, text, today, dialect)
+        return None
+
+    @staticmethod
+    def _render(
+        template: SQLTemplate, text: str, today: Optional[date], dialect: str
+    ) -> TemplateMatch:
+        merchant = find_merchant(text)
+        time_range = parse_time_range(text, today)
+        limit = parse_limit(text) or template.default_limit
+        if limit is not None:
+            limit = max(1, min(limit, template.max_limit))
+        slots: Dict[str, Optional[str]] = {
+            "merchant": merchant,
+            "start": time_range["start"],
+            "end": time_range["end"],
+            "limit": str(limit) if limit is not None else None,
+        }
+        sql = template.sql.format(
+            transaction_filters=_transaction_filters(merchant, slots["start"], slots["end"]),
+            product_filters=_product_filters(merchant, slots["start"], slots["end"]),
+            limit=limit,
+            month=_MONTH_EXPRESSIONS.get(dialect, _MONTH_EXPRESSIONS["snowflake"]),
+        )
+        return TemplateMatch(template.name, sql, slots)
+
+    def names(self) -> Tuple[str, ...]:
+        return tuple(template.name for template in self.templates)
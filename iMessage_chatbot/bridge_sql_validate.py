@@ -0,0 +1,367 @@
+"""
+Local validation for SQL returned by /generate-sql.
+
+The validator tokenizes the statement (no database round-trip) and checks that:
+
+* it is a single read-only SELECT/WITH statement with balanced parentheses,
+* every table it reads from is declared in the supplied schema,
+* every column reference exists somewhere in that schema.
+
+Unbounded queries get a LIMIT appended. Problems are reported as structured
+``{"code", "message"}`` entries so the bridge can run one targeted repair round
+with the model, and return them to the caller if that fails too.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Union
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<symbol>::|<=|>=|<>|!=|\|\||[(),.;*=<>+\-/%:\[\]])
+  | (?P<space>\s+)
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+FORBIDDEN = frozenset(
+    """
+    INSERT UPDATE DELETE MERGE UPSERT REPLACE DROP CREATE ALTER TRUNCATE RENAME GRANT
+    REVOKE CALL EXECUTE COPY PUT GET REMOVE USE BEGIN COMMIT ROLLBACK UNDROP
+    """.split()
+)
+
+KEYWORDS = frozenset(
+    """
+    SELECT FROM WHERE GROUP BY ORDER HAVING LIMIT OFFSET FETCH NEXT ONLY ROWS ROW AS ON JOIN
+    LEFT RIGHT INNER OUTER FULL CROSS NATURAL USING LATERAL AND OR NOT IN IS NULL LIKE ILIKE
+    RLIKE REGEXP BETWEEN CASE WHEN THEN ELSE END DESC ASC DISTINCT WITH RECURSIVE UNION ALL
+    EXCEPT MINUS INTERSECT ANY SOME EXISTS INTERVAL DATE TIME TIMESTAMP TRUE FALSE OVER
+    PARTITION RANGE PRECEDING FOLLOWING CURRENT UNBOUNDED NULLS FIRST LAST QUALIFY TOP
+    WITHIN FILTER IGNORE RESPECT PIVOT UNPIVOT FOR SAMPLE TABLESAMPLE FLATTEN VALUES
+    YEAR YEARS QUARTER MONTH MONTHS WEEK WEEKS DAY DAYS DAYOFWEEK DOW DOY HOUR MINUTE SECOND
+    EPOCH CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP SYSDATE LOCALTIMESTAMP
+    INT INTEGER BIGINT SMALLINT NUMBER NUMERIC DECIMAL FLOAT DOUBLE REAL VARCHAR CHAR STRING
+    TEXT BOOLEAN VARIANT OBJECT ARRAY TIMESTAMP_NTZ TIMESTAMP_LTZ TIMESTAMP_TZ PRECISION
+    """.split()
+)
+
+# EXTRACT(YEAR FROM col) and TRIM('x' FROM col) use FROM without naming a table.
+_DATE_PARTS = frozenset(
+    """
+    YEAR YEARS QUARTER MONTH MONTHS WEEK WEEKS DAY DAYS DAYOFWEEK DOW DOY HOUR MINUTE SECOND EPOCH
+    """.split()
+)
+
+_CLAUSE_AFTER_TABLE = frozenset(
+    """
+    WHERE GROUP ORDER HAVING LIMIT ON JOIN LEFT RIGHT INNER OUTER FULL CROSS NATURAL USING
+    UNION EXCEPT MINUS INTERSECT QUALIFY OFFSET FETCH WINDOW SAMPLE TABLESAMPLE
+    """.split()
+)
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    text: str
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+    @property
+    def name(self) -> str:
+        """Identifier text with quotes stripped, lowercased for comparisons."""
+        if self.kind == "quoted":
+            return self.text[1:-1].replace('""', '"').lower()
+        return self.text.lower()
+
+
+class SQLValidationError(ValueError):
+    """Generated SQL failed validation even after the repair round."""
+
+    def __init__(self, sql: str, errors: List[Dict[str, str]]) -> None:
+        super().__init__("; ".join(error["message"] for error in errors) or "Invalid SQL.")
+        self.sql = sql
+        self.errors = errors
+
+
+@dataclass
+class ValidationResult:
+    sql: str
+    errors: List[Dict[str, str]] = field(default_factory=list)
+    limit_injected: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class SchemaCatalog:
+    """Tables and columns declared in a free-form schema description."""
+
+    def __init__(self, tables: Dict[str, FrozenSet[str]]) -> None:
+        self.tables = tables
+        self.columns: FrozenSet[str] = frozenset(
+            column for columns in tables.values() for column in columns
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.tables)
+
+
+_TABLE_LINE = re.compile(r"^\s*-?\s*([A-Za-z_][A-Za-z0-9_.]*)\s*:\s*(.*)$")
+_CREATE_TABLE = re.compile(
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"([A-Za-z0-9_.\"]+)\s*\((.*?)\)\s*;",
+    re.IGNORECASE | re.DOTALL,
+)
+_COLUMN_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+
+
+@lru_cache(maxsize=64)
+def parse_schema(schema: Optional[str]) -> SchemaCatalog:
+    """
+    Understand the two shapes the chatbot sends: ``- table: col, col, ...`` lists
+    (columns may wrap onto following lines) and ``CREATE TABLE`` statements.
+    """
+    tables: Dict[str, Set[str]] = {}
+    if not schema:
+        return SchemaCatalog({})
+
+    for match in _CREATE_TABLE.finditer(schema):
+        table = match.group(1).replace('"', "").split(".")[-1].lower()
+        columns = tables.setdefault(table, set())
+        for definition in match.group(2).split(","):
+            words = definition.strip().split()
+            if words and _COLUMN_NAME.match(words[0].strip('"')):
+                columns.add(words[0].strip('"').lower())
+
+    current: Optional[Set[str]] = None
+    for line in schema.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            current = None
+            continue
+        match = _TABLE_LINE.match(stripped)
+        if match and stripped.startswith("-") and "," in match.group(2):
+            table = match.group(1).split(".")[-1].lower()
+            current = tables.setdefault(table, set())
+            stripped = match.group(2)
+        elif current is None or stripped.startswith("-") or "," not in stripped:
+            current = None
+            continue
+        for column in stripped.split(","):
+            column = column.strip()
+            if _COLUMN_NAME.match(column):
+                current.add(column.lower())
+
+    return SchemaCatalog({table: frozenset(columns) for table, columns in tables.items()})
+
+
+def tokenize(sql: str) -> List[Token]:
+    tokens = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        tokens.append(Token(kind, match.group()))
+    return tokens
+
+
+def _error(code: str, message: str) -> Dict[str, str]:
+    return {"code": code, "message": message}
+
+
+class SQLValidator:
+    def __init__(self, max_rows: int = 1000) -> None:
+        self.max_rows = max_rows
+
+    def validate(
+        self, sql: Optional[str], schema: Union[str, SchemaCatalog, None]
+    ) -> ValidationResult:
+        if not sql or not sql.strip():
+            return ValidationResult(sql or "", [_error("empty", "No SQL statement was produced.")])
+
+        sql = sql.strip().rstrip(";").strip()
+        tokens = tokenize(sql)
+        result = ValidationResult(sql)
+
+        if any(token.kind == "other" for token in tokens):
+            bad = next(token.text for token in tokens if token.kind == "other")
+            result.errors.append(_error("syntax", f"Unexpected character {bad!r}."))
+        if any(token.text == ";" for token in tokens):
+            result.errors.append(_error("multiple_statements", "Only one statement is allowed."))
+        if not tokens or tokens[0].upper not in ("SELECT", "WITH"):
+            result.errors.append(_error("not_select", "Only SELECT queries are allowed."))
+
+        # REPLACE(...) and friends are functions; only bare statement keywords are rejected.
+        forbidden = sorted(
+            {
+                token.upper
+                for index, token in enumerate(tokens)
+                if token.kind == "ident"
+                and token.upper in FORBIDDEN
+                and (index + 1 == len(tokens) or tokens[index + 1].text != "(")
+            }
+        )
+        if forbidden:
+            result.errors.append(
+                _error("forbidden_statement", f"Statement uses {', '.join(forbidden)}.")
+            )
+
+        depth = 0
+        for token in tokens:
+            depth += {"(": 1, ")": -1}.get(token.text, 0)
+            if depth < 0:
+                break
+        if depth != 0:
+            result.errors.append(_error("syntax", "Unbalanced parentheses."))
+
+        catalog = schema if isinstance(schema, SchemaCatalog) else parse_schema(schema)
+        if catalog and not result.errors:
+            result.errors.extend(self._check_references(tokens, catalog))
+
+        if result.ok and not self._has_top_level_limit(tokens):
+            result.sql = f"{sql}\nLIMIT {self.max_rows}"
+            result.limit_injected = True
+        return result
+
+    @staticmethod
+    def _has_top_level_limit(tokens: List[Token]) -> bool:
+        depth = 0
+        for index, token in enumerate(tokens):
+            depth += {"(": 1, ")": -1}.get(token.text, 0)
+            if depth:
+                continue
+            if token.kind == "ident" and token.upper in ("LIMIT", "FETCH"):
+                return True
+            previous = tokens[index - 1].upper if index else ""
+            if token.upper == "TOP" and previous in ("SELECT", "DISTINCT"):
+                return True
+        return False
+
+    @staticmethod
+    def _check_references(tokens: List[Token], catalog: SchemaCatalog) -> List[Dict[str, str]]:
+        errors: List[Dict[str, str]] = []
+        ctes: Set[str] = set()
+        aliases: Dict[str, str] = {}
+        defined: Set[str] = set()
+
+        # CTE names: WITH name AS ( ... ), name AS ( ... )
+        for index, token in enumerate(tokens[:-2]):
+            if (
+                token.kind in ("ident", "quoted")
+                and tokens[index + 1].upper == "AS"
+                and tokens[index + 2].text == "("
+                and index > 0
+                and tokens[index - 1].upper in ("WITH", ",", "RECURSIVE")
+            ):
+                ctes.add(token.name)
+
+        # Tables after FROM / JOIN, plus their aliases.
+        for index, token in enumerate(tokens):
+            if token.upper not in ("FROM", "JOIN") or index + 1 >= len(tokens):
+                continue
+            previous = tokens[index - 1] if index else None
+            if previous is not None and (
+                previous.kind == "string" or previous.upper in _DATE_PARTS
+            ):
+                continue
+            position = index + 1
+            while position < len(tokens):
+                name_token = tokens[position]
+                if name_token.text == "(" or name_token.kind not in ("ident", "quoted"):
+                    break
+                parts = [name_token.name]
+                position += 1
+                while position + 1 < len(tokens) and tokens[position].text == ".":
+                    parts.append(tokens[position + 1].name)
+                    position += 2
+                table = parts[-1]
+                if table not in ctes and table not in catalog.tables:
+                    errors.append(
+                        _error("unknown_table", f"Table {'.'.join(parts)} is not in the schema.")
+                    )
+                if position < len(tokens) and tokens[position].upper == "AS":
+                    position += 1
+                if (
+                    position < len(tokens)
+                    and tokens[position].kind in ("ident", "quoted")
+                    and tokens[position].upper not in KEYWORDS | _CLAUSE_AFTER_TABLE
+                ):
+                    aliases[tokens[position].name] = table
+                    position += 1
+                aliases.setdefault(table, table)
+                if token.upper == "JOIN" or position >= len(tokens) or tokens[position].text != ",":
+                    break
+                position += 1
+
+        # Output aliases ("expr AS name", "SUM(x) name", "col name") are valid
+        # references in GROUP BY / ORDER BY / HAVING.
+        for index, token in enumerate(tokens[1:], start=1):
+            if token.kind not in ("ident", "quoted") or token.upper in KEYWORDS:
+                continue
+            previous = tokens[index - 1]
+            if (
+                previous.upper == "AS"
+                or previous.text == ")"
+                or (previous.kind in ("ident", "quoted") and previous.upper not in KEYWORDS)
+            ):
+                defined.add(token.name)
+
+        for index, token in enumerate(tokens):
+            if token.kind not in ("ident", "quoted"):
+                continue
+            previous = tokens[index - 1] if index else None
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if token.kind == "ident" and token.upper in KEYWORDS | FORBIDDEN | _CLAUSE_AFTER_TABLE:
+                continue
+            if following is not None and following.text in ("(", "."):
+                continue  # function call or qualifier
+            if previous is not None and previous.upper in ("FROM", "JOIN", "AS", "::", ")"):
+                continue  # table names, aliases, casts and derived-table aliases
+            name = token.name
+            if previous is not None and previous.text == ".":
+                qualifier = tokens[index - 2].name if index >= 2 else ""
+                table = aliases.get(qualifier, qualifier)
+                columns = catalog.tables.get(table)
+                if columns is not None and name not in columns and name != "*":
+                    errors.append(
+                        _error(
+                            "unknown_column",
+                            f"Column {qualifier}.{name} is not in table {table}.",
+                        )
+                    )
+                continue
+            if name in aliases or name in ctes or name in defined or name in catalog.tables:
+                continue
+            if name not in catalog.columns:
+                errors.append(
+                    _error("unknown_column", f"Column {token.text} is not in the schema.")
+                )
+
+        unique: List[Dict[str, str]] = []
+        for error in errors:
+            if error not in unique:
+                unique.append(error)
+        return unique
+
+
+def repair_prompt(question: str, schema: str, sql: str, errors: List[Dict[str, str]]) -> str:
+    problems = "\n".join(f"- {error['message']}" for error in errors)
+    return (
+        f"You are a Snowflake SQL expert. Given the schema:\n{schema}\n\n"
+        f"This query was generated for the question \"{question}\":\n{sql}\n\n"
+        f"It failed validation:\n{problems}\n\n"
+        "Return ONLY a corrected read-only SELECT query that uses only tables and columns "
+        "from the schema."
+    )
@@ -21,6 +21,9 @@ const MODEL = process.env.OPENAI_MODEL || "gpt-4o-mini"; // adjust as needed
 const USE_DEDALUS_BRIDGE = process.env.USE_DEDALUS_BRIDGE === "true";
 const DEDALUS_BRIDGE_URL = process.env.DEDALUS_BRIDGE_URL || "http://localhost:8000";
 const DEDALUS_BRIDGE_BASE = DEDALUS_BRIDGE_URL.replace(/\/$/, "");
+// Budget per bridge call; the bridge stops working on a request once it has expired.
+const DEDALUS_BRIDGE_TIMEOUT_MS =
+  Number.parseInt(process.env.DEDALUS_BRIDGE_TIMEOUT_MS || "", 10) || 30000;
 const CHAT_CHUNK_SIZE =
   Number.parseInt(process.env.CHAT_RESPONSE_CHUNK_SIZE || "", 10) || 350;
 const CHAT_CHUNK_DELAY_MS =
@@ -83,8 +86,10 @@ async function callDedalusBridge(endpoint, payload) {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Deadline-Ms": String(DEDALUS_BRIDGE_TIMEOUT_MS),
       },
       body: JSON.stringify(payload ?? {}),
+      signal: AbortSignal.timeout(DEDALUS_BRIDGE_TIMEOUT_MS),
     });
 
     if (!response.ok) {
@@ -99,6 +104,28 @@ async function callDedalusBridge(endpoint, payload) {
   }
 }
 
+// Schema text -> bridge schema ID, so /generate-sql does not resend the schema every call.
+const bridgeSchemaIds = new Map();
+
+async function callDedalusBridgeWithSchema(endpoint, payload, schema) {
+  let schemaId = bridgeSchemaIds.get(schema);
+  if (!schemaId) {
+    schemaId = (await callDedalusBridge("/schemas", { schema })).schema_id;
+    bridgeSchemaIds.set(schema, schemaId);
+  }
+
+  try {
+    return await callDedalusBridge(endpoint, { ...payload, schema_id: schemaId });
+  } catch (error) {
+    if (!error.message.includes("responded with 404")) {
+      throw error;
+    }
+    // The bridge restarted or evicted the schema: send it inline and re-register next time.
+    bridgeSchemaIds.delete(schema);
+    return callDedalusBridge(endpoint, { ...payload, schema });
+  }
+}
+
 function formatFinalMessage(message) {
   if (!message) return "";
   let text = String(message)
@@ -435,10 +462,11 @@ async function generateSQLFromNaturalLanguage(naturalLanguageQuery) {
     // Try Dedalus bridge before OpenAI fallback
     if (USE_DEDALUS_BRIDGE) {
       try {
-        const bridgeResponse = await callDedalusBridge("/generate-sql", {
-          question: naturalLanguageQuery,
-          schema: schemaContext,
-        });
+        const bridgeResponse = await callDedalusBridgeWithSchema(
+          "/generate-sql",
+          { question: naturalLanguageQuery },
+          schemaContext
+        );
 
         if (bridgeResponse?.sql) {
           console.log("[DEDALUS] SQL generated via bridge");
@@ -921,6 +949,39 @@ function topProducts({ limit = 5 } = {}) {
     .slice(0, limit);
 }
 
+function merchantSpend({ limit = 10 } = {}) {
+  const agg = new Map();
+  for (const tx of getAllTransactions()) {
+    const name = tx.merchant?.name || knotData.merchant?.name;
+    if (!agg.has(name)) {
+      agg.set(name, { name, count: 0, total: 0 });
+    }
+    const row = agg.get(name);
+    row.count += 1;
+    row.total += parseAmount(tx.price?.total);
+  }
+  return [...agg.values()]
+    .sort((a, b) => b.total - a.total)
+    .slice(0, limit);
+}
+
+// Same fields, order and limits as the Snowflake queries in generateShoppingRecommendations,
+// so the bridge's precomputed answers (keyed by a fingerprint of them) still match.
+function localShoppingInputs() {
+  const items = [...getAllLineItems()].sort(
+    (a, b) => new Date(b.datetime) - new Date(a.datetime)
+  );
+  return {
+    purchaseHistory: items.slice(0, 50).map(item => ({
+      merchant: item.merchant_name,
+      product: item.name,
+      amount: item.total,
+      date: item.datetime
+    })),
+    topMerchants: merchantSpend({ limit: 10 }),
+  };
+}
+
 // ---------- NESSIE API FUNCTIONS ----------
 
 async function fetchBills() {
@@ -1808,33 +1869,11 @@ async function generateShoppingRecommendations(category = null) {
       } catch (snowflakeErr) {
         console.error("[ERROR] Failed to fetch from Snowflake:", snowflakeErr.message);
         // Fallback to local data
-        const items = getAllLineItems();
-        purchaseHistory = items.slice(0, 50).map(item => ({
-          merchant: item.merchant_name,
-          product: item.name,
-          amount: item.total,
-          date: item.datetime
-        }));
-        topMerchants = topProducts({ limit: 10 }).map(p => ({
-          name: p.name,
-          count: p.qty,
-          total: p.spend
-        }));
+        ({ purchaseHistory, topMerchants } = localShoppingInputs());
       }
     } else {
       // Use local data
-      const items = getAllLineItems();
-      purchaseHistory = items.slice(0, 50).map(item => ({
-        merchant: item.merchant_name,
-        product: item.name,
-        amount: item.total,
-        date: item.datetime
-      }));
-      topMerchants = topProducts({ limit: 10 }).map(p => ({
-        name: p.name,
-        count: p.qty,
-        total: p.spend
-      }));
+      ({ purchaseHistory, topMerchants } = localShoppingInputs());
     }
 
     // Analyze spending patterns
@@ -5,14 +5,80 @@ Run this FastAPI service to expose Dedalus Labs capabilities over HTTP so that
 the Node.js chatbot can call them. Requires Python 3.9+.
 """
 
+import asyncio
+import contextvars
+import functools
+import inspect
 import json
 import os
-from typing import Any, Dict, List, Optional
+import tempfile
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 
+from bridge_arrow import (
+    ARROW_STREAM_TYPE,
+    InvalidArrowStream,
+    compact_arrow,
+    read_arrow_stream,
+)
+from bridge_breaker import CLOSED, STATE_CODES, BreakerBoard, CircuitOpen
+from bridge_cache import ResponseCache, make_cache_key
+from bridge_deadline import DeadlineExceeded, DeadlineMiddleware, bounded, set_deadline
+from bridge_executors import DEFAULT_TABLES, QueryExecutor, create_executor
+from bridge_hedge import Hedger, parse_hedge_policies
+from bridge_intents import IntentClassifier
+from bridge_json import (
+    BridgeJSONResponse,
+    InvalidPayload,
+    PayloadTooLarge,
+    decode_payload,
+    dumps_text,
+    read_body,
+    split_lists,
+)
+from bridge_limits import (
+    BACKGROUND,
+    INTERACTIVE,
+    CapacityExceeded,
+    ModelLimiter,
+    parse_weights,
+)
+from bridge_metrics import BYTE_BUCKETS, SIZE_BUCKETS, MetricsRegistry, gauge_lines
+from bridge_products import Product, ProductIndex, recommendation_queries
+from bridge_recommendations import RecommendationJob, RecommendationStore, input_fingerprint
+from bridge_routing import ModelRouter, shopping_complexity, sql_complexity
+from bridge_results import (
+    CompactResults,
+    ResultStore,
+    UnknownResultError,
+    clip_text,
+    compact_results,
+    summarize_results,
+)
+from bridge_schemas import RegisteredSchema, SchemaRegistry, UnknownSchemaError
+from bridge_sessions import Session, SessionStore
+from bridge_shared import SharedFlights, SharedResponseCache, SharedSlots, SharedStore
+from bridge_singleflight import SingleFlight, flight_key
+from bridge_sql_examples import SQLExampleStore, render_examples
+from bridge_sql_templates import SQLTemplateLibrary
+from bridge_sql_validate import SQLValidationError, SQLValidator, repair_prompt
+
 try:
     from dedalus_labs import AsyncDedalus, DedalusRunner
 except ImportError as exc:
@@ -22,41 +88,440 @@ except ImportError as exc:
 
 load_dotenv()
 
-app = FastAPI(title="Dedalus Bridge Service", version="0.1.0")
+app = FastAPI(
+    title="Dedalus Bridge Service", version="0.1.0", default_response_class=BridgeJSONResponse
+)
 
 
 DEFAULT_MODEL = os.getenv("DEDALUS_BRIDGE_MODEL", "openai/gpt-5-mini")
 SQL_MODEL = os.getenv("DEDALUS_SQL_MODEL", "openai/gpt-5")
 SHOPPING_MODEL = os.getenv("DEDALUS_SHOPPING_MODEL", "openai/gpt-5")
 
+FORMAT_SYSTEM_PROMPT = (
+    "You are a helpful financial assistant who can summarize database query results "
+    "into clear, actionable explanations."
+)
+SQL_SYSTEM_PROMPT = "You are a SQL expert. Respond only with valid Snowflake SQL."
+INTERPRET_SYSTEM_PROMPT = (
+    "You are a router for a financial wellness assistant chatbot. Analyze the user's question "
+    "and return a compact JSON object with intent, time range, limit, and params."
+)
+SHOPPING_SYSTEM_PROMPT = (
+    "You are a shopping assistant who suggests personalized products based on purchase history. "
+    "Be friendly, concise, and specific."
+)
+
+CACHE_TTL_SECONDS = float(os.getenv("DEDALUS_BRIDGE_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("DEDALUS_BRIDGE_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("DEDALUS_BRIDGE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+QUERY_EXECUTOR = os.getenv("DEDALUS_BRIDGE_EXECUTOR", "none")
+
+DEFAULT_MODEL_CONCURRENCY = int(os.getenv("DEDALUS_BRIDGE_MODEL_CONCURRENCY", "8"))
+SQL_MODEL_CONCURRENCY = int(os.getenv("DEDALUS_SQL_MODEL_CONCURRENCY", "4"))
+SHOPPING_MODEL_CONCURRENCY = int(os.getenv("DEDALUS_SHOPPING_MODEL_CONCURRENCY", "2"))
+MODEL_QUEUE_DEPTH = int(os.getenv("DEDALUS_BRIDGE_QUEUE_DEPTH", "32"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("DEDALUS_BRIDGE_QUEUE_TIMEOUT", "10"))
+PRIORITY_WEIGHTS = parse_weights(os.getenv("DEDALUS_BRIDGE_PRIORITY_WEIGHTS", ""))
+INTERACTIVE_RESERVED = float(os.getenv("DEDALUS_BRIDGE_INTERACTIVE_RESERVED", "0.25"))
+BATCH_MAX_ITEMS = int(os.getenv("DEDALUS_BRIDGE_BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("DEDALUS_BRIDGE_BATCH_CONCURRENCY", "8"))
+BACKGROUND_ENDPOINTS = frozenset(
+    endpoint.strip()
+    for endpoint in os.getenv(
+        "DEDALUS_BRIDGE_BACKGROUND_ENDPOINTS", "shopping-recommendations"
+    ).split(",")
+    if endpoint.strip()
+)
+# Seconds; 0 leaves a request without X-Deadline-Ms, or a stage, unbounded.
+REQUEST_TIMEOUT = float(os.getenv("DEDALUS_BRIDGE_REQUEST_TIMEOUT", "120"))
+UPSTREAM_TIMEOUT = float(os.getenv("DEDALUS_BRIDGE_UPSTREAM_TIMEOUT", "60")) or None
+EXECUTE_TIMEOUT = float(os.getenv("DEDALUS_BRIDGE_EXECUTE_TIMEOUT", "30")) or None
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("DEDALUS_BRIDGE_INTENT_THRESHOLD", "0.8"))
+INTENT_MODEL_PATH = os.getenv("DEDALUS_BRIDGE_INTENT_MODEL")
+
+SQL_MAX_ROWS = int(os.getenv("DEDALUS_BRIDGE_SQL_MAX_ROWS", "1000"))
+SQL_EXAMPLES_PATH = os.getenv(
+    "DEDALUS_BRIDGE_SQL_EXAMPLES",
+    os.path.join(tempfile.gettempdir(), "dedalus-bridge-sql-examples.sqlite3"),
+)
+SQL_EXAMPLES_K = int(os.getenv("DEDALUS_BRIDGE_SQL_EXAMPLES_K", "3"))
+SCHEMA_MAX_ENTRIES = int(os.getenv("DEDALUS_BRIDGE_SCHEMA_MAX_ENTRIES", "256"))
+FORMAT_SAMPLE_ROWS = int(os.getenv("DEDALUS_BRIDGE_FORMAT_SAMPLE_ROWS", "20"))
+FORMAT_TOP_K = int(os.getenv("DEDALUS_BRIDGE_FORMAT_TOP_K", "3"))
+MAX_BODY_BYTES = int(os.getenv("DEDALUS_BRIDGE_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+MAX_RESULT_ROWS = int(os.getenv("DEDALUS_BRIDGE_MAX_RESULT_ROWS", "100000"))
+MAX_HISTORY_ITEMS = int(os.getenv("DEDALUS_BRIDGE_MAX_HISTORY_ITEMS", "1000"))
+# Path of a SQLite file shared by all workers; empty keeps cache/limits per process.
+SHARED_STATE_PATH = os.getenv("DEDALUS_BRIDGE_SHARED_STATE", "")
+WORKERS = int(os.getenv("DEDALUS_BRIDGE_WORKERS", "1"))
+RESULT_STORE_ENTRIES = int(os.getenv("DEDALUS_BRIDGE_RESULT_STORE_ENTRIES", "64"))
+RESULT_STORE_TTL = float(os.getenv("DEDALUS_BRIDGE_RESULT_STORE_TTL", "600"))
+# Conversation sessions kept per worker; 0 ignores ``session_id`` on requests.
+SESSION_MAX_ENTRIES = int(os.getenv("DEDALUS_BRIDGE_SESSION_MAX_ENTRIES", "1024"))
+SESSION_TTL = float(os.getenv("DEDALUS_BRIDGE_SESSION_TTL", "1800"))
+SESSION_TURNS = int(os.getenv("DEDALUS_BRIDGE_SESSION_TURNS", "6"))
+
+RECOMMEND_INTERVAL = float(os.getenv("DEDALUS_BRIDGE_RECOMMEND_INTERVAL", "60"))
+RECOMMEND_USER = os.getenv("DEDALUS_BRIDGE_RECOMMEND_USER", "default")
+RECOMMEND_CATEGORIES = os.getenv("DEDALUS_BRIDGE_RECOMMEND_CATEGORIES", "")
+RECOMMEND_MAX_ENTRIES = int(os.getenv("DEDALUS_BRIDGE_RECOMMEND_MAX_ENTRIES", "256"))
+RECOMMEND_CANDIDATES = int(os.getenv("DEDALUS_BRIDGE_RECOMMEND_CANDIDATES", "12"))
+PRODUCTS_CSV = os.getenv("DEDALUS_BRIDGE_PRODUCTS_CSV", str(DEFAULT_TABLES["products"]))
+ROUTING_ENABLED = os.getenv("DEDALUS_BRIDGE_ROUTING", "1").lower() not in ("0", "false", "off")
+SQL_ROUTE_THRESHOLD = int(os.getenv("DEDALUS_BRIDGE_SQL_ROUTE_THRESHOLD", "2"))
+SHOPPING_ROUTE_THRESHOLD = int(os.getenv("DEDALUS_BRIDGE_SHOPPING_ROUTE_THRESHOLD", "2"))
+BREAKER_ENABLED = os.getenv("DEDALUS_BRIDGE_BREAKER", "1").lower() not in ("0", "false", "off")
+BREAKER_FAILURE_RATIO = float(os.getenv("DEDALUS_BRIDGE_BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("DEDALUS_BRIDGE_BREAKER_MIN_CALLS", "5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("DEDALUS_BRIDGE_BREAKER_SLOW_SECONDS", "20"))
+BREAKER_COOLDOWN = float(os.getenv("DEDALUS_BRIDGE_BREAKER_COOLDOWN", "30"))
+# Comma-separated ``endpoint=percentile[:backup_model]`` entries; empty disables hedging.
+HEDGE_POLICIES = os.getenv("DEDALUS_BRIDGE_HEDGE", "")
+HEDGE_MIN_DELAY = float(os.getenv("DEDALUS_BRIDGE_HEDGE_MIN_DELAY", "0.25"))
+HEDGE_FALLBACK_DELAY = float(os.getenv("DEDALUS_BRIDGE_HEDGE_FALLBACK_DELAY", "4"))
+
+
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter(
+    "bridge_http_requests_total",
+    "HTTP requests served, by route and status.",
+    ("route", "method", "status"),
+)
+HTTP_LATENCY = metrics.histogram(
+    "bridge_http_request_duration_seconds", "End-to-end HTTP request latency.", ("route", "method")
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "bridge_http_in_flight_requests", "HTTP requests currently being served."
+)
+HTTP_REQUEST_BYTES = metrics.histogram(
+    "bridge_http_request_bytes", "HTTP request body size.", ("route",), buckets=BYTE_BUCKETS
+)
+UPSTREAM_CALLS = metrics.counter(
+    "bridge_upstream_calls_total",
+    "Dedalus calls by model, endpoint and outcome.",
+    ("model", "endpoint", "outcome"),
+)
+UPSTREAM_LATENCY = metrics.histogram(
+    "bridge_upstream_duration_seconds", "Dedalus call latency.", ("model", "endpoint")
+)
+UPSTREAM_IN_FLIGHT = metrics.gauge(
+    "bridge_upstream_in_flight", "Dedalus calls in progress.", ("model",)
+)
+DEADLINES_EXCEEDED = metrics.counter(
+    "bridge_deadline_exceeded_total",
+    "Stages cut off by their own timeout or the request's deadline.",
+    ("stage", "budget"),
+)
+ABANDONED_REQUESTS = metrics.counter(
+    "bridge_abandoned_requests_total",
+    "Requests cancelled because the client disconnected or the deadline passed.",
+    ("reason",),
+)
+BATCH_OPERATIONS_RUN = metrics.counter(
+    "bridge_batch_operations_total", "/batch operations by op and status.", ("op", "status")
+)
+PRIORITY_LATENCY = metrics.histogram(
+    "bridge_priority_latency_seconds",
+    "Time Dedalus calls spend queued for a slot and upstream, per priority.",
+    ("priority", "stage"),
+)
+QUEUE_WAIT = metrics.histogram(
+    "bridge_model_queue_wait_seconds", "Time spent waiting for a model slot.", ("model",)
+)
+PROMPT_BYTES = metrics.histogram(
+    "bridge_prompt_bytes", "Size of prompts sent upstream.", ("endpoint",), buckets=BYTE_BUCKETS
+)
+PAYLOAD_ITEMS = metrics.histogram(
+    "bridge_payload_items",
+    "List sizes of incoming payloads.",
+    ("endpoint", "field"),
+    buckets=SIZE_BUCKETS,
+)
+INTERPRET_PATHS = metrics.counter(
+    "bridge_interpret_path_total", "Interpret requests answered locally vs by the model.", ("path",)
+)
+SQL_SOURCES = metrics.counter(
+    "bridge_sql_source_total", "Generated SQL served from templates vs the model.", ("source",)
+)
+SQL_EXAMPLE_LOOKUP = metrics.histogram(
+    "bridge_sql_example_lookup_seconds",
+    "Few-shot example retrieval for /generate-sql prompts.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+SQL_FIRST_TRY = metrics.counter(
+    "bridge_sql_first_try_total",
+    "Model SQL that validated on the first attempt, with and without few-shot examples.",
+    ("examples", "outcome"),
+)
+ROUTE_DECISIONS = metrics.counter(
+    "bridge_route_decisions_total",
+    "Requests routed to the fast or heavy model (or an explicit one), per route.",
+    ("route", "tier"),
+)
+ROUTE_ESCALATIONS = metrics.counter(
+    "bridge_route_escalations_total",
+    "Fast-model answers that failed validation and were escalated to the heavy model.",
+    ("route",),
+)
+ROUTED_LATENCY = metrics.histogram(
+    "bridge_routed_duration_seconds",
+    "Model time per routed request, including any escalation.",
+    ("route", "tier"),
+)
+DEGRADED_RESPONSES = metrics.counter(
+    "bridge_degraded_responses_total",
+    "Answers served without the model while its circuit breaker was open.",
+    ("endpoint", "fallback"),
+)
+PRODUCT_SEARCH = metrics.histogram(
+    "bridge_product_search_seconds",
+    "Product-similarity lookups for shopping prompts.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+SQL_VALIDATION = metrics.counter(
+    "bridge_sql_validation_total",
+    "Validation outcomes for generated SQL (valid, repaired, invalid, ...).",
+    ("outcome",),
+)
+
+
+def _collect_state_metrics() -> List[str]:
+    """Snapshot cache, coalescing and capacity stats at scrape time."""
+    lines: List[str] = []
+    cache: Optional[ResponseCache] = getattr(app.state, "response_cache", None)
+    if cache is not None:
+        endpoints = cache.describe()["endpoints"]
+        lines += gauge_lines(
+            "bridge_cache_events",
+            "Response cache hits, misses, stores and evictions per endpoint.",
+            (
+                ({"endpoint": endpoint, "event": event}, value)
+                for endpoint, counters in endpoints.items()
+                for event, value in counters.items()
+                if event != "hit_rate"
+            ),
+        )
+        lines += gauge_lines(
+            "bridge_cache_entries", "Entries held in the response cache.", [({}, len(cache))]
+        )
+    single_flight: Optional[SingleFlight] = getattr(app.state, "single_flight", None)
+    if single_flight is not None:
+        lines += gauge_lines(
+            "bridge_coalescing_events",
+            "Single-flight leaders, collapsed followers and cancellations.",
+            (({"event": event}, value) for event, value in single_flight.describe().items()),
+        )
+    schemas: Optional[SchemaRegistry] = getattr(app.state, "schema_registry", None)
+    if schemas is not None:
+        lines += gauge_lines(
+            "bridge_schema_registry",
+            "Registered schemas and ID lookups (hits, unknown IDs, evictions).",
+            (({"field": field}, value) for field, value in schemas.describe().items()),
+        )
+    sql_examples: Optional[SQLExampleStore] = getattr(app.state, "sql_examples", None)
+    if sql_examples is not None:
+        lines += gauge_lines(
+            "bridge_sql_examples",
+            "Saved few-shot SQL examples, lookups and lookups that found examples.",
+            (
+                ({"field": field}, value)
+                for field, value in sql_examples.describe().items()
+                if isinstance(value, int)
+            ),
+        )
+    hedger: Optional[Hedger] = getattr(app.state, "hedger", None)
+    if hedger is not None:
+        lines += gauge_lines(
+            "bridge_hedge_events",
+            "Hedged calls, backup requests fired and which request won, per endpoint.",
+            (
+                ({"endpoint": endpoint, "event": event}, value)
+                for endpoint, counters in hedger.describe().items()
+                for event, value in counters.items()
+                if isinstance(value, int)
+            ),
+        )
+    recommendations: Optional[RecommendationStore] = getattr(
+        app.state, "recommendation_store", None
+    )
+    if recommendations is not None:
+        job: Optional[RecommendationJob] = app.state.recommendation_job
+        job_counters = job.counters if job is not None else {}
+        lines += gauge_lines(
+            "bridge_recommendation_events",
+            "Precomputed recommendation hits, stale/missing lookups and background refreshes.",
+            (
+                ({"source": source, "event": event}, value)
+                for source, counters in (("store", recommendations.counters), ("job", job_counters))
+                for event, value in counters.items()
+            ),
+        )
+    breakers: Optional[BreakerBoard] = getattr(app.state, "breakers", None)
+    if breakers is not None:
+        described = breakers.describe()
+        lines += gauge_lines(
+            "bridge_breaker_state",
+            "Circuit breaker state per model (0 closed, 1 half-open, 2 open).",
+            (({"model": model}, STATE_CODES[state["state"]]) for model, state in described.items()),
+        )
+        lines += gauge_lines(
+            "bridge_breaker_events",
+            "Circuit breaker trips, recoveries, rejected calls, probes and failures per model.",
+            (
+                ({"model": model, "event": event}, value)
+                for model, state in described.items()
+                for event, value in state.items()
+                if event in ("opened", "closed", "rejected", "probes", "failures", "slow")
+            ),
+        )
+    sessions: Optional[SessionStore] = getattr(app.state, "session_store", None)
+    if sessions is not None:
+        lines += gauge_lines(
+            "bridge_sessions",
+            "Live conversation sessions and session hits, creations, evictions and expiries.",
+            (
+                ({"field": field}, value)
+                for field, value in sessions.describe().items()
+                if field in ("sessions", "hits", "created", "evicted", "expired")
+            ),
+        )
+    limiter: Optional[ModelLimiter] = getattr(app.state, "model_limiter", None)
+    if limiter is not None:
+        lines += gauge_lines(
+            "bridge_model_lane",
+            "Per-model concurrency lane state (active, queue depth, rejections).",
+            (
+                ({"model": model, "field": field}, value)
+                for model, lane in limiter.describe().items()
+                for field, value in lane.items()
+                if not isinstance(value, dict)
+            ),
+        )
+        lines += gauge_lines(
+            "bridge_model_priority",
+            "Per-model, per-priority slot use, queue depth, admissions and rejections.",
+            (
+                ({"model": model, "priority": priority, "field": field}, value)
+                for model, lane in limiter.describe().items()
+                # Models only other workers have used carry just "shared_active".
+                for priority, counters in lane.get("priorities", {}).items()
+                for field, value in counters.items()
+            ),
+        )
+    return lines
+
+
+metrics.add_collector(_collect_state_metrics)
+
+
+def observe_payload(endpoint: str, **sizes: int) -> None:
+    for field, size in sizes.items():
+        PAYLOAD_ITEMS.observe(size, endpoint, field)
+
+
+async def read_payload(
+    request: Request, model: Any, endpoint: str, **list_caps: int
+) -> Tuple[Any, Dict[str, int]]:
+    """
+    Decode a JSON body into ``model`` with the fast codec. The row lists named in
+    ``list_caps`` are truncated to their cap and attached without per-row
+    validation. Returns the payload and the list sizes the caller sent.
+    """
+    try:
+        body = await read_body(request, MAX_BODY_BYTES)
+        data, lists, sizes = decode_payload(body, max_bytes=MAX_BODY_BYTES, list_caps=list_caps)
+        payload = model(**data)
+    except PayloadTooLarge as error:
+        raise HTTPException(status_code=413, detail=str(error)) from error
+    except ValidationError as error:
+        raise HTTPException(status_code=422, detail=json.loads(error.json())) from error
+    except InvalidPayload as error:
+        raise HTTPException(status_code=422, detail=error.detail()) from error
+    for field, rows in lists.items():
+        setattr(payload, field, rows)
+    observe_payload(endpoint, **sizes)
+    return payload, sizes
+
+
+def payload_from_data(
+    model: Any, data: Dict[str, Any], **list_caps: int
+) -> Tuple[Any, Dict[str, int]]:
+    """``read_payload`` for an already decoded object, e.g. one /batch operation."""
+    try:
+        lists, sizes = split_lists(data, list_caps)
+        payload = model(**data)
+    except ValidationError as error:
+        raise HTTPException(status_code=422, detail=json.loads(error.json())) from error
+    except InvalidPayload as error:
+        raise HTTPException(status_code=422, detail=error.detail()) from error
+    for field, rows in lists.items():
+        setattr(payload, field, rows)
+    return payload, sizes
+
 
 class FormatPayload(BaseModel):
     user_query: str
     sql_query: Optional[str] = None
     results: List[Dict[str, Any]] = []
+    result_id: Optional[str] = None
     model: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class SchemaPayload(BaseModel):
+    schema: str
 
 
 class SQLPayload(BaseModel):
     question: str
-    schema: str
+    schema: Optional[str] = None
+    schema_id: Optional[str] = None
     model: Optional[str] = None
+    use_templates: bool = True
 
 
 class ShoppingPayload(BaseModel):
     category: Optional[str] = None
+    user_id: Optional[str] = None
     purchase_history: List[Dict[str, Any]] = []
     top_merchants: List[Dict[str, Any]] = []
     favorite_merchants: List[str] = []
     average_purchase_amount: Optional[float] = None
     total_purchases: Optional[int] = None
     model: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class ProductsPayload(BaseModel):
+    products: List[Dict[str, Any]] = []
 
 
 class InterpretPayload(BaseModel):
     message: str
     system_prompt: Optional[str] = None
     model: Optional[str] = None
+    fast_path: bool = True
+    session_id: Optional[str] = None
+
+
+class BatchPayload(BaseModel):
+    operations: List[Dict[str, Any]] = []
+    priority: Literal["interactive", "background"] = BACKGROUND
+
+
+class AskPayload(BaseModel):
+    message: str
+    schema: Optional[str] = None
+    schema_id: Optional[str] = None
+    question: Optional[str] = None
+    interpret: bool = True
+    system_prompt: Optional[str] = None
+    model: Optional[str] = None
+    sql_model: Optional[str] = None
+    max_rows: int = Field(50, ge=1, le=SQL_MAX_ROWS)
+    session_id: Optional[str] = None
 
 
 @app.on_event("startup")
@@ -65,12 +530,130 @@ async def startup_event():
     runner = DedalusRunner(client)
     app.state.dedalus_client = client
     app.state.dedalus_runner = runner
+    shared_store = SharedStore(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+    app.state.shared_store = shared_store
+    if shared_store is not None:
+        app.state.response_cache = SharedResponseCache(
+            shared_store,
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            ttl_seconds=CACHE_TTL_SECONDS,
+        )
+        app.state.shared_flights = SharedFlights(app.state.response_cache)
+    else:
+        app.state.response_cache = ResponseCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            ttl_seconds=CACHE_TTL_SECONDS,
+        )
+        app.state.shared_flights = None
+    app.state.single_flight = SingleFlight()
+    app.state.breakers = BreakerBoard(
+        enabled=BREAKER_ENABLED,
+        min_calls=BREAKER_MIN_CALLS,
+        failure_ratio=BREAKER_FAILURE_RATIO,
+        slow_call_seconds=BREAKER_SLOW_SECONDS,
+        cooldown_seconds=BREAKER_COOLDOWN,
+    )
+    app.state.hedger = Hedger(
+        parse_hedge_policies(
+            HEDGE_POLICIES,
+            backup_model=DEFAULT_MODEL,
+            min_delay=HEDGE_MIN_DELAY,
+            fallback_delay=HEDGE_FALLBACK_DELAY,
+        )
+    )
+    app.state.model_router = ModelRouter(
+        DEFAULT_MODEL,
+        {
+            "generate-sql": SQL_ROUTE_THRESHOLD,
+            "shopping-recommendations": SHOPPING_ROUTE_THRESHOLD,
+        },
+        enabled=ROUTING_ENABLED,
+    )
+    app.state.query_executor = create_executor(QUERY_EXECUTOR)
+    app.state.intent_classifier = IntentClassifier.from_file(INTENT_MODEL_PATH)
+    app.state.sql_templates = SQLTemplateLibrary()
+    app.state.result_store = ResultStore(
+        max_entries=RESULT_STORE_ENTRIES, ttl_seconds=RESULT_STORE_TTL
+    )
+    app.state.schema_registry = SchemaRegistry(max_entries=SCHEMA_MAX_ENTRIES)
+    app.state.session_store = SessionStore(
+        SESSION_MAX_ENTRIES,
+        SESSION_TTL,
+        max_turns=SESSION_TURNS,
+        max_history=MAX_HISTORY_ITEMS,
+    )
+    app.state.sql_validator = SQLValidator(max_rows=SQL_MAX_ROWS)
+    app.state.sql_examples = (
+        SQLExampleStore(SQL_EXAMPLES_PATH) if SQL_EXAMPLES_PATH and SQL_EXAMPLES_K > 0 else None
+    )
+    app.state.model_limiter = ModelLimiter(
+        {
+            DEFAULT_MODEL: DEFAULT_MODEL_CONCURRENCY,
+            SQL_MODEL: SQL_MODEL_CONCURRENCY,
+            SHOPPING_MODEL: SHOPPING_MODEL_CONCURRENCY,
+        },
+        default_limit=DEFAULT_MODEL_CONCURRENCY,
+        max_queue=MODEL_QUEUE_DEPTH,
+        queue_timeout=MODEL_QUEUE_TIMEOUT,
+        shared=SharedSlots(shared_store) if shared_store is not None else None,
+        weights=PRIORITY_WEIGHTS,
+        reserved=INTERACTIVE_RESERVED,
+    )
+    if PRODUCTS_CSV and os.path.exists(PRODUCTS_CSV):
+        app.state.product_index = await asyncio.to_thread(ProductIndex.from_csv, PRODUCTS_CSV)
+    else:
+        app.state.product_index = ProductIndex()
+    app.state.recommendation_store = RecommendationStore(max_entries=RECOMMEND_MAX_ENTRIES)
+    app.state.recommendation_job = None
+    app.state.recommendation_task = None
+    if app.state.query_executor is not None and RECOMMEND_INTERVAL > 0:
+        job = RecommendationJob(
+            app.state.query_executor,
+            app.state.recommendation_store,
+            precompute_recommendations,
+            user_id=RECOMMEND_USER,
+            categories=[""] + [item for item in RECOMMEND_CATEGORIES.split(",") if item.strip()],
+            interval=RECOMMEND_INTERVAL,
+            products=app.state.product_index,
+        )
+        app.state.recommendation_job = job
+        app.state.recommendation_task = asyncio.ensure_future(job.run_forever())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     client: AsyncDedalus = app.state.dedalus_client
-    await client.aclose()
+    # Older SDK releases expose ``aclose``; current ones only ``close``.
+    closed = (getattr(client, "aclose", None) or client.close)()
+    if inspect.isawaitable(closed):
+        await closed
+    task: Optional[asyncio.Future] = app.state.recommendation_task
+    if task is not None:
+        task.cancel()
+    executor: Optional[QueryExecutor] = app.state.query_executor
+    if executor is not None:
+        await executor.close()
+    sql_examples: Optional[SQLExampleStore] = app.state.sql_examples
+    if sql_examples is not None:
+        sql_examples.close()
+    shared_store: Optional[SharedStore] = app.state.shared_store
+    if shared_store is not None:
+        shared_store.close()
+
+
+# Set by /batch for its operations, overriding the per-endpoint priority.
+_batch_priority: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "batch_priority", default=None
+)
+
+
+def endpoint_priority(endpoint: str) -> str:
+    override = _batch_priority.get()
+    if override is not None:
+        return override
+    return BACKGROUND if endpoint in BACKGROUND_ENDPOINTS else INTERACTIVE
 
 
 async def run_dedalus(
@@ -79,15 +662,266 @@ async def run_dedalus(
     *,
     system_prompt: Optional[str] = None,
     mcp_servers: Optional[List[str]] = None,
+    endpoint: str = "default",
+    cache_key: Optional[str] = None,
+    accept: Optional[Callable[[str], bool]] = None,
 ) -> str:
+    """
+    Run a prompt through Dedalus. When ``cache_key`` is given the response cache
+    is consulted first and successful answers are stored under that key.
+    Identical concurrent calls share a single upstream request. Endpoints with a
+    hedging policy race a backup request against slow calls; ``accept`` decides
+    which answers are good enough to win. Models whose circuit breaker is open
+    raise ``CircuitOpen`` without being called. Each model call is limited to
+    ``UPSTREAM_TIMEOUT`` and the caller's wait to its request deadline; both
+    raise ``DeadlineExceeded``. Endpoints in ``BACKGROUND_ENDPOINTS`` queue for
+    model slots at background priority.
+    """
+    cache: ResponseCache = app.state.response_cache
+    priority = endpoint_priority(endpoint)
+    if cache_key is not None:
+        cached = await cache.aget(endpoint, cache_key)
+        if cached is not None:
+            return cached
+
+    async def call_model(target_model: str) -> str:
+        runner: DedalusRunner = app.state.dedalus_runner
+        limiter: ModelLimiter = app.state.model_limiter
+        breakers: BreakerBoard = app.state.breakers
+        kwargs: Dict[str, Any] = {}
+        if system_prompt:
+            kwargs["system_prompt"] = system_prompt
+        if mcp_servers:
+            kwargs["mcp_servers"] = mcp_servers
+        probe = breakers.admit(target_model)
+        outcome = "rejected"
+        elapsed = 0.0
+        try:
+            async with limiter.slot(target_model, priority=priority) as waited:
+                QUEUE_WAIT.observe(waited, target_model)
+                PRIORITY_LATENCY.observe(waited, priority, "queue")
+                UPSTREAM_IN_FLIGHT.inc(target_model)
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await bounded(
+                        "upstream",
+                        runner.run(input=input_text, model=target_model, **kwargs),
+                        UPSTREAM_TIMEOUT,
+                    )
+                    outcome = "ok"
+                except DeadlineExceeded:
+                    outcome = "timeout"
+                    raise
+                except asyncio.CancelledError:
+                    outcome = "cancelled"
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    PRIORITY_LATENCY.observe(elapsed, priority, "upstream")
+                    UPSTREAM_IN_FLIGHT.dec(target_model)
+                    UPSTREAM_LATENCY.observe(elapsed, target_model, endpoint)
+                    UPSTREAM_CALLS.inc(target_model, endpoint, outcome)
+        finally:
+            breakers.record(target_model, probe, outcome, elapsed)
+        return result.final_output
+
+    async def call_upstream() -> str:
+        # This task is shared by every caller of the flight, so it only has the
+        # per-stage limits; each caller bounds its own wait by its deadline below.
+        set_deadline(None)
+        hedger: Hedger = app.state.hedger
+        PROMPT_BYTES.observe(len(input_text.encode("utf-8")), endpoint)
+        final_output = await hedger.run(endpoint, model, call_model, accept)
+        if cache_key is not None and final_output:
+            await cache.aset(endpoint, cache_key, final_output)
+        return final_output
+
+    async def call_shared_upstream() -> str:
+        # Other workers asking the same cached question wait for this answer.
+        return await shared_flights.do(cache_key, call_upstream)
+
+    shared_flights: Optional[SharedFlights] = app.state.shared_flights
+    use_shared = cache_key is not None and shared_flights is not None
+    factory = call_shared_upstream if use_shared else call_upstream
+
+    single_flight: SingleFlight = app.state.single_flight
+    return await bounded(
+        endpoint,
+        single_flight.do(flight_key(input_text, model, system_prompt, mcp_servers), factory),
+    )
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Pull the text delta out of a streamed chunk (OpenAI-style or plain string)."""
+    if isinstance(chunk, str):
+        return chunk
+    choices = getattr(chunk, "choices", None)
+    if choices:
+        delta = getattr(choices[0], "delta", None)
+        return getattr(delta, "content", None) or ""
+    return getattr(chunk, "content", None) or ""
+
+
+async def stream_dedalus(
+    input_text: str,
+    model: str,
+    *,
+    system_prompt: Optional[str] = None,
+    mcp_servers: Optional[List[str]] = None,
+    priority: str = INTERACTIVE,
+) -> AsyncIterator[str]:
+    """
+    Yield text deltas from Dedalus as the model produces them. The circuit
+    breaker judges streams by time to first token, since long answers take long
+    to finish on a healthy model too.
+    """
     runner: DedalusRunner = app.state.dedalus_runner
-    kwargs: Dict[str, Any] = {}
+    limiter: ModelLimiter = app.state.model_limiter
+    breakers: BreakerBoard = app.state.breakers
+    kwargs: Dict[str, Any] = {"stream": True}
     if system_prompt:
         kwargs["system_prompt"] = system_prompt
     if mcp_servers:
         kwargs["mcp_servers"] = mcp_servers
-    result = await runner.run(input=input_text, model=model, **kwargs)
-    return result.final_output
+    probe = breakers.admit(model)
+    outcome = "rejected"
+    first_token: Optional[float] = None
+    try:
+        async with limiter.slot(model, priority=priority) as waited:
+            QUEUE_WAIT.observe(waited, model)
+            PRIORITY_LATENCY.observe(waited, priority, "queue")
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                stream = runner.run(input=input_text, model=model, **kwargs)
+                if inspect.isawaitable(stream):
+                    stream = await bounded("upstream", stream, UPSTREAM_TIMEOUT)
+                chunks = stream.__aiter__()
+                try:
+                    while True:
+                        # UPSTREAM_TIMEOUT bounds the gap between chunks, not the stream.
+                        try:
+                            chunk = await bounded("upstream", chunks.__anext__(), UPSTREAM_TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        text = _chunk_text(chunk)
+                        if text:
+                            if first_token is None:
+                                first_token = time.perf_counter() - started
+                            yield text
+                finally:
+                    aclose = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+                    if aclose is not None:
+                        closed = aclose()
+                        if inspect.isawaitable(closed):
+                            await closed
+                outcome = "ok"
+            except DeadlineExceeded as error:
+                outcome = "timeout" if error.budget == "stage" else "cancelled"
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"
+                raise
+            finally:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+    finally:
+        breakers.record(model, probe, outcome, first_token or 0.0)
+
+
+async def replay_text(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps_text(data)}\n\n"
+
+
+def sse_response(
+    tokens: AsyncIterator[str],
+    *,
+    result_field: str,
+    on_done: Optional[Callable[[str], None]] = None,
+) -> StreamingResponse:
+    """
+    Relay a token stream as Server-Sent Events: one ``token`` event per delta, then
+    a ``done`` event carrying the full text under the same field name the JSON
+    route uses, or an ``error`` event if the upstream call fails. ``on_done`` is
+    called with the full text once the stream completes.
+    """
+
+    async def events() -> AsyncIterator[str]:
+        parts: List[str] = []
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except DeadlineExceeded as error:
+            DEADLINES_EXCEEDED.inc(error.stage, error.budget)
+            yield sse_event("error", dict(error.describe(), detail=str(error)))
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            yield sse_event("error", {"detail": str(error)})
+            return
+        text = "".join(parts)
+        if on_done is not None:
+            on_done(text)
+        yield sse_event("done", {result_field: text})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def bridge_http_error(error: Exception, status_code: int = 500, **context: Any) -> HTTPException:
+    """Map an exception raised while serving a route onto the HTTP error returned to callers."""
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, SQLValidationError):
+        return HTTPException(
+            status_code=422,
+            detail=dict(context, error="invalid_sql", errors=error.errors, sql=error.sql),
+        )
+    if isinstance(error, UnknownResultError):
+        return HTTPException(
+            status_code=404,
+            detail=dict(
+                context,
+                error="unknown_result",
+                result_id=error.result_id,
+                worker=os.getpid(),
+                message=str(error),
+            ),
+        )
+    if isinstance(error, UnknownSchemaError):
+        return HTTPException(
+            status_code=404,
+            detail=dict(
+                context,
+                error="unknown_schema",
+                schema_id=error.schema_id,
+                worker=os.getpid(),
+                message=str(error),
+            ),
+        )
+    if isinstance(error, DeadlineExceeded):
+        DEADLINES_EXCEEDED.inc(error.stage, error.budget)
+        return HTTPException(status_code=504, detail=dict(error.describe(), **context))
+    if isinstance(error, CapacityExceeded):
+        return HTTPException(
+            status_code=error.status_code,
+            detail=dict(context, error=str(error), reason=error.reason, model=error.model)
+            if context
+            else str(error),
+            headers={"Retry-After": str(error.retry_after)},
+        )
+    return HTTPException(
+        status_code=status_code,
+        detail=dict(context, error=str(error)) if context else str(error),
+    )
 
 
 def extract_sql(response_text: str) -> Optional[str]:
@@ -106,124 +940,1081 @@ def extract_sql(response_text: str) -> Optional[str]:
                 sql_candidate = sql_candidate[3:]
             return sql_candidate.strip()
 
-    if response_text.upper().startswith("SELECT"):
+    if response_text.upper().startswith(("SELECT", "WITH")):
         return response_text.strip().rstrip(";")
 
     return None
 
 
+# Added before the metrics middleware so it runs inside it: requests it cuts off are
+# recorded with its 504/499 status.
+app.add_middleware(
+    DeadlineMiddleware, default_budget=REQUEST_TIMEOUT, on_abandon=ABANDONED_REQUESTS.inc
+)
+
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_LATENCY.observe(time.perf_counter() - started, path, request.method)
+        HTTP_REQUESTS.inc(path, request.method, status)
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            HTTP_REQUEST_BYTES.observe(int(content_length), path)
+
+
+async def shared_state_call(function: Callable[..., Any], *args: Any) -> Any:
+    """
+    Call ``function`` on the shared store's thread when cross-worker state is on,
+    since it may wait on another worker's SQLite lock; inline otherwise.
+    """
+    shared_store: Optional[SharedStore] = app.state.shared_store
+    if shared_store is None:
+        return function(*args)
+    return await shared_store.run(function, *args)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    rendered = await shared_state_call(metrics.render)
+    return PlainTextResponse(rendered, media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    breakers: BreakerBoard = app.state.breakers
+    described = breakers.describe()
+    healthy = all(state["state"] == CLOSED for state in described.values())
+    return {"status": "ok" if healthy else "degraded", "breakers": described}
 
 
-@app.post("/format-results")
-async def format_results(payload: FormatPayload):
-    summaries = json.dumps(payload.results[:20], indent=2, default=str)
-    prompt = (
-        f'You are a helpful financial assistant. A user asked: "{payload.user_query}"\n'
-        f"I executed a SQL query ({payload.sql_query or 'unknown'}) and got "
-        f"{len(payload.results)} row(s). Here is a sample:\n\n{summaries}\n\n"
+@app.get("/cache/stats")
+async def cache_stats():
+    cache: ResponseCache = app.state.response_cache
+    return await shared_state_call(cache.describe)
+
+
+@app.get("/capacity/stats")
+async def capacity_stats():
+    limiter: ModelLimiter = app.state.model_limiter
+    return await shared_state_call(limiter.describe)
+
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    single_flight: SingleFlight = app.state.single_flight
+    stats: Dict[str, Any] = dict(single_flight.describe())
+    shared_flights: Optional[SharedFlights] = app.state.shared_flights
+    if shared_flights is not None:
+        stats["shared"] = shared_flights.describe()
+    return stats
+
+
+@app.get("/routing/stats")
+async def routing_stats():
+    router: ModelRouter = app.state.model_router
+    return router.describe()
+
+
+@app.get("/hedging/stats")
+async def hedging_stats():
+    hedger: Hedger = app.state.hedger
+    return hedger.describe()
+
+
+@app.get("/recommendations/stats")
+async def recommendation_stats():
+    store: RecommendationStore = app.state.recommendation_store
+    job: Optional[RecommendationJob] = app.state.recommendation_job
+    products: ProductIndex = app.state.product_index
+    return {
+        "store": store.describe(),
+        "job": job.describe() if job is not None else None,
+        "products": products.describe(),
+    }
+
+
+@app.post("/recommendations/refresh")
+async def refresh_recommendations():
+    job: Optional[RecommendationJob] = app.state.recommendation_job
+    if job is None:
+        raise HTTPException(
+            status_code=503, detail="No query executor configured for precomputed recommendations."
+        )
+    job.notify()
+    return {"status": "scheduled"}
+
+
+@app.post("/products")
+async def add_products(request: Request):
+    """Add products-table rows to the similarity index as they are loaded."""
+    try:
+        payload, _ = await read_payload(
+            request, ProductsPayload, "products", products=MAX_RESULT_ROWS
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error) from error
+    products: ProductIndex = app.state.product_index
+    added = await asyncio.to_thread(products.add_rows, payload.products)
+    return {"added": added, "products": len(products)}
+
+
+@app.get("/sql-examples/stats")
+async def sql_example_stats():
+    sql_examples: Optional[SQLExampleStore] = app.state.sql_examples
+    return sql_examples.describe() if sql_examples is not None else {"enabled": False}
+
+
+@app.post("/schemas")
+async def register_schema(payload: SchemaPayload):
+    registry: SchemaRegistry = app.state.schema_registry
+    return registry.register(payload.schema).describe()
+
+
+@app.get("/schemas/stats")
+async def schema_stats():
+    registry: SchemaRegistry = app.state.schema_registry
+    return registry.describe()
+
+
+@app.get("/schemas/{schema_id}")
+async def get_schema(schema_id: str):
+    registry: SchemaRegistry = app.state.schema_registry
+    try:
+        entry = registry.get(schema_id)
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error) from error
+    return dict(entry.describe(), schema=entry.text)
+
+
+@app.delete("/cache")
+async def clear_cache():
+    cache: ResponseCache = app.state.response_cache
+    await shared_state_call(cache.clear)
+    return {"status": "cleared"}
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    sessions: SessionStore = app.state.session_store
+    return sessions.describe()
+
+
+@app.delete("/sessions/{session_id}")
+async def drop_session(session_id: str):
+    sessions: SessionStore = app.state.session_store
+    if not sessions.drop(session_id):
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "unknown_session",
+                "session_id": session_id,
+                "worker": os.getpid(),
+                "message": f"Session {session_id} is not held by this worker.",
+            },
+        )
+    return {"status": "dropped"}
+
+
+def open_session(session_id: Optional[str]) -> Optional[Session]:
+    """The conversation session a request names, or None when it names none."""
+    sessions: SessionStore = app.state.session_store
+    if not session_id or not sessions.enabled:
+        return None
+    try:
+        return sessions.open(session_id)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+
+
+def live_session(session_id: Optional[str]) -> Optional[Session]:
+    """The named session if it is live; unlike ``open_session`` it is not a new request."""
+    sessions: SessionStore = app.state.session_store
+    return sessions.peek(session_id)
+
+
+def with_session(response: Dict[str, Any], session: Optional[Session]) -> Dict[str, Any]:
+    if session is not None:
+        response["session"] = session.describe()
+    return response
+
+
+def conversation_context(session: Optional[Session]) -> str:
+    if session is None or not session.rendered_turns:
+        return ""
+    return f"Earlier in this conversation:\n{session.rendered_turns}\n\n"
+
+
+def build_format_prompt(
+    user_query: str,
+    sql_query: Optional[str],
+    results: CompactResults,
+    session: Optional[Session] = None,
+) -> str:
+    return (
+        f"{conversation_context(session)}"
+        f'You are a helpful financial assistant. A user asked: "{user_query}"\n'
+        f"I executed a SQL query ({sql_query or 'unknown'}) and got "
+        f"{results.total_rows} row(s).\n\n{results.render()}\n\n"
         "Explain the results in a friendly, conversational tone, highlighting key insights.\n"
+        "Base totals and averages on the statistics, not on the sample rows.\n"
         "Format numbers nicely with commas and currency symbols where appropriate.\n"
         "Keep the response to 2-4 sentences."
     )
 
+
+async def read_arrow_format_request(request: Request) -> Tuple[FormatPayload, CompactResults]:
     try:
-        final_output = await run_dedalus(
-            prompt,
-            model=payload.model or DEFAULT_MODEL,
-            system_prompt=(
-                "You are a helpful financial assistant who can summarize database query results "
-                "into clear, actionable explanations."
-            ),
+        payload = FormatPayload(**request.query_params)
+    except ValidationError as error:
+        raise HTTPException(status_code=422, detail=json.loads(error.json())) from error
+    try:
+        table = read_arrow_stream(await read_body(request, MAX_BODY_BYTES))
+    except PayloadTooLarge as error:
+        raise HTTPException(status_code=413, detail=str(error)) from error
+    except InvalidArrowStream as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    except ImportError as error:
+        raise HTTPException(status_code=415, detail=str(error)) from error
+    observe_payload("format-results", results=table.num_rows)
+    return payload, compact_arrow(table, FORMAT_SAMPLE_ROWS, FORMAT_TOP_K)
+
+
+async def read_format_request(request: Request) -> Tuple[FormatPayload, CompactResults]:
+    """
+    Accept a JSON ``FormatPayload`` carrying either ``results`` or the ``result_id``
+    of a result the bridge executed, or an Arrow IPC stream body with the text
+    fields passed as query parameters.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == ARROW_STREAM_TYPE:
+        return await read_arrow_format_request(request)
+
+    payload, sizes = await read_payload(
+        request, FormatPayload, "format-results", results=MAX_RESULT_ROWS
+    )
+    return payload, await payload_results(payload, sizes["results"])
+
+
+async def payload_results(payload: FormatPayload, sent_rows: int) -> CompactResults:
+    if payload.result_id:
+        store: ResultStore = app.state.result_store
+        return store.get(payload.result_id)
+    # A full pass over every cell; off the event loop so other requests keep moving.
+    return await asyncio.to_thread(
+        compact_results,
+        payload.results,
+        FORMAT_SAMPLE_ROWS,
+        FORMAT_TOP_K,
+        sent_rows=sent_rows,
+    )
+
+
+async def format_answer(
+    user_query: str,
+    sql_query: str,
+    results: CompactResults,
+    model: str,
+    endpoint: str,
+    session: Optional[Session] = None,
+) -> Tuple[str, bool]:
+    """
+    The model's answer, or a locally rendered summary of the results while the
+    model's circuit breaker is open. Returns ``(answer, degraded)``. The answer
+    becomes a turn of ``session``, if given.
+    """
+    try:
+        answer = await run_dedalus(
+            build_format_prompt(user_query, sql_query, results, session),
+            model=model,
+            system_prompt=FORMAT_SYSTEM_PROMPT,
+            endpoint=endpoint,
         )
-        return {"answer": final_output}
+        degraded = False
+    except CircuitOpen:
+        DEGRADED_RESPONSES.inc(endpoint, "summary")
+        answer, degraded = summarize_results(results), True
+    if session is not None:
+        session.add_turn(user_query, answer)
+    return answer, degraded
+
+
+async def format_response(payload: FormatPayload, results: CompactResults) -> Dict[str, Any]:
+    session = open_session(payload.session_id)
+    answer, degraded = await format_answer(
+        payload.user_query,
+        payload.sql_query,
+        results,
+        payload.model or DEFAULT_MODEL,
+        "format-results",
+        session,
+    )
+    response = {"answer": answer, "degraded": True} if degraded else {"answer": answer}
+    return with_session(response, session)
+
+
+@app.post("/format-results")
+async def format_results(request: Request):
+    try:
+        payload, results = await read_format_request(request)
+        return await format_response(payload, results)
     except Exception as error:  # pylint: disable=broad-except
-        raise HTTPException(status_code=500, detail=str(error)) from error
+        raise bridge_http_error(error) from error
 
 
-@app.post("/generate-sql")
-async def generate_sql(payload: SQLPayload):
+@app.post("/stream/format-results")
+async def stream_format_results(request: Request):
+    try:
+        payload, results = await read_format_request(request)
+        session = open_session(payload.session_id)
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error) from error
+    on_done = None
+    if session is not None:
+        on_done = functools.partial(session.add_turn, payload.user_query)
+    breakers: BreakerBoard = app.state.breakers
+    if breakers.is_open(payload.model or DEFAULT_MODEL):
+        DEGRADED_RESPONSES.inc("stream-format-results", "summary")
+        return sse_response(
+            replay_text(summarize_results(results)), result_field="answer", on_done=on_done
+        )
+    return sse_response(
+        stream_dedalus(
+            build_format_prompt(payload.user_query, payload.sql_query, results, session),
+            model=payload.model or DEFAULT_MODEL,
+            system_prompt=FORMAT_SYSTEM_PROMPT,
+        ),
+        result_field="answer",
+        on_done=on_done,
+    )
+
+
+def resolve_schema(schema: Optional[str], schema_id: Optional[str]) -> RegisteredSchema:
+    if not schema and not schema_id:
+        raise HTTPException(status_code=422, detail="Provide either schema or schema_id.")
+    registry: SchemaRegistry = app.state.schema_registry
+    return registry.resolve(schema, schema_id)
+
+
+def template_sql(question: str, schema: RegisteredSchema) -> Optional[Dict[str, Any]]:
+    """The local template answer for a question, if one matches and validates."""
+    templates: SQLTemplateLibrary = app.state.sql_templates
+    executor: Optional[QueryExecutor] = app.state.query_executor
+    # Local executors run the SQL themselves; otherwise the caller runs it on Snowflake.
+    dialect = executor.name if executor is not None else "snowflake"
+    match = templates.match(question, schema.text, dialect=dialect)
+    if match is None:
+        return None
+    validation = app.state.sql_validator.validate(match.sql, schema.catalog)
+    if not validation.ok:
+        return None
+    return {"sql": validation.sql, "source": "template", "template": match.name}
+
+
+async def generate_sql_text(
+    question: str,
+    schema: RegisteredSchema,
+    model: Optional[str] = None,
+    *,
+    use_templates: bool = True,
+) -> Dict[str, Any]:
+    """
+    Produce SQL for a question. Canned analytics questions are answered from the
+    local template library; everything else goes to the model, with the closest
+    previously validated questions for the same schema as worked examples. While
+    the model's circuit breaker is open, a template match is used even when
+    ``use_templates`` is off.
+    """
+    if use_templates:
+        matched = template_sql(question, schema)
+        if matched is not None:
+            SQL_SOURCES.inc("template")
+            return matched
+
+    sql_examples: Optional[SQLExampleStore] = app.state.sql_examples
+    examples = []
+    if sql_examples is not None:
+        started = time.perf_counter()
+        examples = await asyncio.to_thread(
+            sql_examples.nearest, question, schema.schema_id, SQL_EXAMPLES_K
+        )
+        SQL_EXAMPLE_LOOKUP.observe(time.perf_counter() - started)
+    rendered_examples = render_examples(examples)
     prompt = (
-        f"You are a Snowflake SQL expert. Given the schema:\n{payload.schema}\n\n"
-        f"Generate a SQL query for the question: \"{payload.question}\"\n\n"
+        f"You are a Snowflake SQL expert. Given the schema:\n{schema.text}\n\n"
+        + (
+            f"Questions already answered correctly for this schema:\n{rendered_examples}\n\n"
+            if rendered_examples
+            else ""
+        )
+        + f"Generate a SQL query for the question: \"{question}\"\n\n"
         "Return ONLY the SQL query."
     )
 
+    complexity = None
+    if model is None:
+        router: ModelRouter = app.state.model_router
+        complexity = sql_complexity(question, schema.catalog)
+        model, tier = router.choose("generate-sql", SQL_MODEL, complexity)
+    else:
+        tier = "explicit"
+    ROUTE_DECISIONS.inc("generate-sql", tier)
+    cache: ResponseCache = app.state.response_cache
+    validator: SQLValidator = app.state.sql_validator
+    cache_key = make_cache_key(
+        "generate-sql", question, model, SQL_SYSTEM_PROMPT, schema.schema_id
+    )
+
+    started = time.perf_counter()
     try:
         final_output = await run_dedalus(
             prompt,
-            model=payload.model or SQL_MODEL,
-            system_prompt="You are a SQL expert. Respond only with valid Snowflake SQL.",
+            model=model,
+            system_prompt=SQL_SYSTEM_PROMPT,
+            endpoint="generate-sql",
+            cache_key=cache_key,
+            accept=lambda output: validator.validate(extract_sql(output), schema.catalog).ok,
+        )
+    except CircuitOpen:
+        matched = template_sql(question, schema)
+        if matched is None:
+            raise
+        DEGRADED_RESPONSES.inc("generate-sql", "template")
+        SQL_SOURCES.inc("template")
+        return dict(matched, degraded=True)
+    sql = extract_sql(final_output)
+    validation = validator.validate(sql, schema.catalog)
+    SQL_FIRST_TRY.inc("yes" if examples else "no", "valid" if validation.ok else "invalid")
+    repaired = False
+    if not validation.ok:
+        # One targeted repair round: show the model its query and what was wrong with it.
+        # A fast-model miss is repaired by the heavy model.
+        await cache.ainvalidate(cache_key)
+        SQL_VALIDATION.inc("repair_attempted")
+        repair_model = model
+        if tier == "fast":
+            repair_model = SQL_MODEL
+            router.escalated("generate-sql")
+            ROUTE_ESCALATIONS.inc("generate-sql")
+        repair_output = await run_dedalus(
+            repair_prompt(question, schema.text, sql or final_output, validation.errors),
+            model=repair_model,
+            system_prompt=SQL_SYSTEM_PROMPT,
+            endpoint="generate-sql-repair",
+        )
+        repaired_sql = extract_sql(repair_output)
+        validation = validator.validate(repaired_sql, schema.catalog)
+        ROUTED_LATENCY.observe(time.perf_counter() - started, "generate-sql", tier)
+        if not validation.ok:
+            SQL_VALIDATION.inc("invalid")
+            raise SQLValidationError(repaired_sql or sql or final_output, validation.errors)
+        await cache.aset("generate-sql", cache_key, repair_output)
+        repaired = True
+    else:
+        ROUTED_LATENCY.observe(time.perf_counter() - started, "generate-sql", tier)
+    SQL_VALIDATION.inc("repaired" if repaired else "valid")
+    if validation.limit_injected:
+        SQL_VALIDATION.inc("limit_injected")
+    SQL_SOURCES.inc("model")
+    if sql_examples is not None:
+        await asyncio.to_thread(sql_examples.record, question, validation.sql, schema.schema_id)
+    response: Dict[str, Any] = {
+        "sql": validation.sql,
+        "source": "model",
+        "repaired": repaired,
+        "examples": len(examples),
+        "model": model,
+        "tier": tier,
+    }
+    if complexity is not None:
+        response["complexity"] = complexity.describe()
+    return response
+
+
+@app.post("/generate-sql")
+async def generate_sql(payload: SQLPayload):
+    try:
+        return await generate_sql_text(
+            payload.question,
+            resolve_schema(payload.schema, payload.schema_id),
+            payload.model,
+            use_templates=payload.use_templates,
         )
-        sql = extract_sql(final_output)
-        if not sql:
-            raise ValueError("Could not extract SQL from Dedalus response.")
-        return {"sql": sql}
     except Exception as error:  # pylint: disable=broad-except
-        raise HTTPException(status_code=500, detail=str(error)) from error
+        raise bridge_http_error(error) from error
 
 
-@app.post("/shopping-recommendations")
-async def shopping_recommendations(payload: ShoppingPayload):
-    history_preview = json.dumps(payload.purchase_history[:20], indent=2, default=str)
+def shopping_candidates(payload: ShoppingPayload) -> List[Product]:
+    """Indexed products most similar to the customer's history, for the prompt."""
+    products: ProductIndex = app.state.product_index
+    if not len(products) or RECOMMEND_CANDIDATES <= 0:
+        return []
+    started = time.perf_counter()
+    matches = products.search(
+        recommendation_queries(payload.purchase_history, payload.category),
+        RECOMMEND_CANDIDATES,
+        exclude=(str(item.get("product") or "") for item in payload.purchase_history),
+    )
+    PRODUCT_SEARCH.observe(time.perf_counter() - started)
+    return [product for product, score in matches if score > 0]
+
+
+def build_shopping_prompt(
+    payload: ShoppingPayload, candidates: Sequence[Product] = (), summary: str = ""
+) -> str:
     top_merchants = ", ".join(
         f"{item.get('name')} (${item.get('total', 0):,.2f})"
         for item in payload.top_merchants[:5]
     )
+    if candidates:
+        recent = "; ".join(
+            clip_text(str(item["product"]))
+            for item in payload.purchase_history[:5]
+            if item.get("product")
+        )
+        evidence = (
+            f"Recently bought: {recent}\n"
+            "Candidate products from their stores, most similar to their history first:\n"
+            + "\n".join(dumps_text(product.describe()) for product in candidates)
+            + "\n\n"
+        )
+        task = (
+            "Recommend three of the candidate products that match the customer's preferences. "
+            "For each recommendation include: product name, price, merchant, short description, "
+            "and why it fits their history."
+        )
+    else:
+        history_preview = dumps_text(payload.purchase_history[:20], indent=True)
+        evidence = f"Purchase history sample:\n{history_preview}\n\n"
+        task = (
+            "Recommend three realistic products (fake is ok) that match the customer's "
+            "preferences. For each recommendation include: product name, price estimate, "
+            "merchant, short description, and why it fits their history."
+        )
 
-    prompt = (
+    return (
         f"The customer is interested in: {payload.category or 'general shopping'}.\n"
-        f"Purchase history sample:\n{history_preview}\n\n"
+        + (f"Purchase summary: {summary}\n" if summary else "")
+        + f"{evidence}"
         f"Favorite merchants: {', '.join(payload.favorite_merchants)}\n"
         f"Top merchants by spending: {top_merchants}\n"
         f"Average purchase amount: ${payload.average_purchase_amount or 0:,.2f}\n"
         f"Total recent purchases: {payload.total_purchases or len(payload.purchase_history)}\n\n"
-        "Recommend three realistic products (fake is ok) that match the customer's preferences. "
-        "For each recommendation include: product name, price estimate, merchant, short description, "
-        "and why it fits their history."
+        f"{task}"
     )
 
+
+async def read_shopping_request(request: Request) -> Tuple[ShoppingPayload, Optional[Session]]:
+    payload, sizes = await read_payload(
+        request,
+        ShoppingPayload,
+        "shopping-recommendations",
+        purchase_history=MAX_HISTORY_ITEMS,
+        top_merchants=MAX_HISTORY_ITEMS,
+    )
+    return prepare_shopping(payload, sizes)
+
+
+def prepare_shopping(
+    payload: ShoppingPayload, sizes: Dict[str, int]
+) -> Tuple[ShoppingPayload, Optional[Session]]:
+    """
+    Merge the request into its session, if it names one, and take the full
+    context from there: callers with a session only send new purchases.
+    """
+    session = open_session(payload.session_id)
+    if session is not None:
+        session.merge_shopping(
+            purchase_history=payload.purchase_history,
+            top_merchants=payload.top_merchants,
+            favorite_merchants=payload.favorite_merchants,
+            average_purchase_amount=payload.average_purchase_amount,
+            total_purchases=payload.total_purchases,
+        )
+        for field, value in session.shopping_fields().items():
+            setattr(payload, field, value)
+    if payload.total_purchases is None:
+        payload.total_purchases = sizes["purchase_history"]
+    return payload, session
+
+
+def shopping_fingerprint(payload: ShoppingPayload) -> str:
+    session = live_session(payload.session_id)
+    if session is not None:
+        return session.fingerprint
+    return input_fingerprint(
+        payload.top_merchants, payload.favorite_merchants, payload.purchase_history
+    )
+
+
+def shopping_request(payload: ShoppingPayload) -> Tuple[str, str, str]:
+    """Prompt, model and routing tier for a recommendation request."""
+    candidates = shopping_candidates(payload)
+    if payload.model:
+        model, tier = payload.model, "explicit"
+    else:
+        router: ModelRouter = app.state.model_router
+        model, tier = router.choose(
+            "shopping-recommendations",
+            SHOPPING_MODEL,
+            shopping_complexity(len(payload.purchase_history), payload.category, len(candidates)),
+        )
+    ROUTE_DECISIONS.inc("shopping-recommendations", tier)
+    session = live_session(payload.session_id)
+    summary = session.summary if session is not None else ""
+    return build_shopping_prompt(payload, candidates, summary), model, tier
+
+
+async def generate_recommendations(payload: ShoppingPayload, fingerprint: str) -> str:
+    prompt, model, tier = shopping_request(payload)
+    started = time.perf_counter()
     try:
-        final_output = await run_dedalus(
+        return await run_dedalus(
             prompt,
-            model=payload.model or SHOPPING_MODEL,
-            system_prompt=(
-                "You are a shopping assistant who suggests personalized products based on purchase history. "
-                "Be friendly, concise, and specific."
+            model=model,
+            system_prompt=SHOPPING_SYSTEM_PROMPT,
+            endpoint="shopping-recommendations",
+            # Workers refreshing the same inputs share one upstream call.
+            cache_key=make_cache_key(
+                "shopping-recommendations", payload.category or "", fingerprint, model
             ),
         )
-        return {"recommendations": final_output}
+    finally:
+        ROUTED_LATENCY.observe(time.perf_counter() - started, "shopping-recommendations", tier)
+
+
+async def precompute_recommendations(category: str, inputs: Dict[str, Any]) -> str:
+    payload = ShoppingPayload(category=category or None, **inputs)
+    return await generate_recommendations(payload, shopping_fingerprint(payload))
+
+
+def lookup_recommendation(payload: ShoppingPayload, fingerprint: str) -> Optional[str]:
+    """Stored text for these exact inputs, if any. Custom models always go upstream."""
+    if payload.model not in (None, SHOPPING_MODEL):
+        return None
+    store: RecommendationStore = app.state.recommendation_store
+    entry = store.lookup(payload.user_id or RECOMMEND_USER, payload.category, fingerprint)
+    return entry.text if entry is not None else None
+
+
+def degraded_recommendations(payload: ShoppingPayload) -> Optional[Tuple[str, str]]:
+    """
+    Recommendations without the model: the last stored answer for this user and
+    category even if its inputs changed, else the retrieved candidate products.
+    Returns ``(text, source)``, or None when there is nothing to show.
+    """
+    store: RecommendationStore = app.state.recommendation_store
+    entry = store.get(payload.user_id or RECOMMEND_USER, payload.category or "")
+    if entry is not None:
+        return entry.text, "stale"
+    candidates = shopping_candidates(payload)[:3]
+    if not candidates:
+        return None
+    lines = ["Products similar to your recent purchases:"]
+    for product in candidates:
+        price = f" (${product.unit_price:,.2f})" if product.unit_price is not None else ""
+        lines.append(f"- {product.name}{price} at {product.merchant}")
+    return "\n".join(lines), "candidates"
+
+
+async def recommend(payload: ShoppingPayload) -> Dict[str, Any]:
+    """Stored, freshly generated or (breaker open) degraded recommendations."""
+    fingerprint = shopping_fingerprint(payload)
+    stored = lookup_recommendation(payload, fingerprint)
+    if stored is not None:
+        return {"recommendations": stored, "source": "precomputed"}
+    try:
+        final_output = await generate_recommendations(payload, fingerprint)
+    except CircuitOpen:
+        fallback = degraded_recommendations(payload)
+        if fallback is None:
+            raise
+        text, source = fallback
+        DEGRADED_RESPONSES.inc("shopping-recommendations", source)
+        return {"recommendations": text, "source": source, "degraded": True}
+    if payload.model in (None, SHOPPING_MODEL) and final_output:
+        store: RecommendationStore = app.state.recommendation_store
+        store.put(
+            payload.user_id or RECOMMEND_USER,
+            payload.category,
+            fingerprint,
+            final_output,
+            source="model",
+        )
+    return {"recommendations": final_output, "source": "model"}
+
+
+@app.post("/shopping-recommendations")
+async def shopping_recommendations(request: Request):
+    try:
+        payload, session = await read_shopping_request(request)
+        return with_session(await recommend(payload), session)
     except Exception as error:  # pylint: disable=broad-except
-        raise HTTPException(status_code=500, detail=str(error)) from error
+        raise bridge_http_error(error) from error
 
 
-@app.post("/interpret-query")
-async def interpret_query(payload: InterpretPayload):
-    system_prompt = payload.system_prompt or (
-        "You are a router for a financial wellness assistant chatbot. Analyze the user's question "
-        "and return a compact JSON object with intent, time range, limit, and params."
+@app.post("/stream/shopping-recommendations")
+async def stream_shopping_recommendations(request: Request):
+    try:
+        payload, _ = await read_shopping_request(request)
+        stored = lookup_recommendation(payload, shopping_fingerprint(payload))
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error) from error
+    if stored is not None:
+        return sse_response(replay_text(stored), result_field="recommendations")
+    prompt, model, _ = shopping_request(payload)
+    breakers: BreakerBoard = app.state.breakers
+    if breakers.is_open(model):
+        fallback = degraded_recommendations(payload)
+        if fallback is not None:
+            text, source = fallback
+            DEGRADED_RESPONSES.inc("stream-shopping-recommendations", source)
+            return sse_response(replay_text(text), result_field="recommendations")
+    return sse_response(
+        stream_dedalus(
+            prompt,
+            model=model,
+            system_prompt=SHOPPING_SYSTEM_PROMPT,
+            priority=endpoint_priority("shopping-recommendations"),
+        ),
+        result_field="recommendations",
     )
 
+
+async def interpret_message(
+    message: str,
+    system_prompt: Optional[str] = None,
+    model: Optional[str] = None,
+    *,
+    fast_path: bool = True,
+    session: Optional[Session] = None,
+) -> Dict[str, Any]:
+    """
+    Classify a chat message. High-confidence matches from the local classifier
+    are answered without a model call; custom system prompts always go to the model
+    because they may ask for a different output shape. While the model's circuit
+    breaker is open, the local classification is returned whatever its confidence.
+    The model also sees ``session``'s recent turns, so follow-ups can be resolved.
+    """
+    classifier: IntentClassifier = app.state.intent_classifier
+    if fast_path and not system_prompt:
+        interpretation, confidence = classifier.classify(message)
+        if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+            INTERPRET_PATHS.inc("local")
+            return {
+                "interpretation": json.dumps(interpretation),
+                "path": "local",
+                "confidence": confidence,
+            }
+
+    custom_prompt = bool(system_prompt)
+    system_prompt = system_prompt or INTERPRET_SYSTEM_PROMPT
+    model = model or DEFAULT_MODEL
+    context = conversation_context(session)
+    prompt = f"{context}Current message: {message}" if context else message
     try:
         final_output = await run_dedalus(
-            payload.message,
-            model=payload.model or DEFAULT_MODEL,
+            prompt,
+            model=model,
             system_prompt=system_prompt,
+            endpoint="interpret-query",
+            cache_key=make_cache_key("interpret-query", prompt, model, system_prompt),
+        )
+    except CircuitOpen:
+        if custom_prompt:
+            raise
+        interpretation, confidence = classifier.classify(message)
+        DEGRADED_RESPONSES.inc("interpret-query", "local")
+        INTERPRET_PATHS.inc("local")
+        return {
+            "interpretation": json.dumps(interpretation),
+            "path": "local",
+            "confidence": confidence,
+            "degraded": True,
+        }
+    INTERPRET_PATHS.inc("model")
+    return {"interpretation": final_output, "path": "model"}
+
+
+@app.post("/interpret-query")
+async def interpret_query(payload: InterpretPayload):
+    try:
+        session = open_session(payload.session_id)
+        interpretation = await interpret_message(
+            payload.message,
+            payload.system_prompt,
+            payload.model,
+            fast_path=payload.fast_path,
+            session=session,
+        )
+        return with_session(interpretation, session)
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error) from error
+
+
+async def _timed(
+    timings: Dict[str, float],
+    stage: str,
+    awaitable: Awaitable[Any],
+    limit: Optional[float] = None,
+) -> Any:
+    started = time.perf_counter()
+    try:
+        return await bounded(stage, awaitable, limit)
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+
+@app.post("/ask")
+async def ask(payload: AskPayload):
+    """
+    Run interpret -> SQL -> execute -> format in-process. Interpretation and SQL
+    generation are independent, so they run concurrently. Every stage is bounded
+    by the request deadline, and the execute stage also by ``EXECUTE_TIMEOUT``.
+    """
+    executor: Optional[QueryExecutor] = app.state.query_executor
+    if executor is None:
+        raise HTTPException(status_code=503, detail="No query executor configured for /ask.")
+
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    question = payload.question or payload.message
+    try:
+        schema = resolve_schema(payload.schema, payload.schema_id)
+    except Exception as error:  # pylint: disable=broad-except
+        raise bridge_http_error(error, stage="generate_sql") from error
+    session = open_session(payload.session_id)
+
+    sql_task = asyncio.ensure_future(
+        _timed(
+            timings,
+            "generate_sql",
+            generate_sql_text(question, schema, payload.sql_model),
+        )
+    )
+    interpret_task = None
+    if payload.interpret:
+        interpret_task = asyncio.ensure_future(
+            _timed(
+                timings,
+                "interpret",
+                interpret_message(
+                    payload.message, payload.system_prompt, payload.model, session=session
+                ),
+            )
         )
-        return {"interpretation": final_output}
+
+    try:
+        try:
+            generated = await sql_task
+            sql = generated["sql"]
+        except Exception as error:  # pylint: disable=broad-except
+            raise bridge_http_error(error, stage="generate_sql") from error
+
+        try:
+            rows = await _timed(timings, "execute", executor.execute(sql), EXECUTE_TIMEOUT)
+        except Exception as error:  # pylint: disable=broad-except
+            raise bridge_http_error(error, 502, stage="execute", sql=sql) from error
+
+        observe_payload("ask", results=len(rows))
+        results = await asyncio.to_thread(
+            compact_results, rows, FORMAT_SAMPLE_ROWS, FORMAT_TOP_K
+        )
+        result_store: ResultStore = app.state.result_store
+        result_id = result_store.put(results)
+        try:
+            answer, degraded = await _timed(
+                timings,
+                "format",
+                format_answer(
+                    payload.message,
+                    sql,
+                    results,
+                    payload.model or DEFAULT_MODEL,
+                    "ask",
+                    session,
+                ),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            raise bridge_http_error(error, stage="format", sql=sql) from error
+
+        interpretation = None
+        errors: Dict[str, str] = {}
+        if interpret_task is not None:
+            try:
+                interpretation = (await interpret_task)["interpretation"]
+            except Exception as error:  # pylint: disable=broad-except
+                errors["interpret"] = str(error)
+
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        response: Dict[str, Any] = {
+            "answer": answer,
+            "sql": sql,
+            "interpretation": interpretation,
+            "row_count": len(rows),
+            "rows": rows[: payload.max_rows],
+            "result_id": result_id,
+            "executor": executor.name,
+            "timings_ms": timings,
+        }
+        if errors:
+            response["errors"] = errors
+        if degraded or generated.get("degraded"):
+            response["degraded"] = True
+        with_session(response, session)
+        # Rows can be large; skip FastAPI's generic encoder and serialize them directly.
+        return BridgeJSONResponse(response)
+    finally:
+        # A failed, timed-out or abandoned request leaves no model calls running.
+        for task in (sql_task, interpret_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def _batch_format(payload: FormatPayload, sizes: Dict[str, int]) -> Dict[str, Any]:
+    return await format_response(payload, await payload_results(payload, sizes["results"]))
+
+
+async def _batch_sql(payload: SQLPayload, _sizes: Dict[str, int]) -> Dict[str, Any]:
+    return await generate_sql_text(
+        payload.question,
+        resolve_schema(payload.schema, payload.schema_id),
+        payload.model,
+        use_templates=payload.use_templates,
+    )
+
+
+async def _batch_shopping(payload: ShoppingPayload, sizes: Dict[str, int]) -> Dict[str, Any]:
+    payload, session = prepare_shopping(payload, sizes)
+    return with_session(await recommend(payload), session)
+
+
+async def _batch_interpret(payload: InterpretPayload, _sizes: Dict[str, int]) -> Dict[str, Any]:
+    session = open_session(payload.session_id)
+    interpretation = await interpret_message(
+        payload.message,
+        payload.system_prompt,
+        payload.model,
+        fast_path=payload.fast_path,
+        session=session,
+    )
+    return with_session(interpretation, session)
+
+
+BatchHandler = Callable[[Any, Dict[str, int]], Awaitable[Dict[str, Any]]]
+BATCH_OPERATIONS: Dict[str, Tuple[Any, Dict[str, int], BatchHandler]] = {
+    "format": (FormatPayload, {"results": MAX_RESULT_ROWS}, _batch_format),
+    "sql": (SQLPayload, {}, _batch_sql),
+    "shopping": (
+        ShoppingPayload,
+        {"purchase_history": MAX_HISTORY_ITEMS, "top_merchants": MAX_HISTORY_ITEMS},
+        _batch_shopping,
+    ),
+    "interpret": (InterpretPayload, {}, _batch_interpret),
+}
+
+
+async def run_batch_operation(
+    index: int, operation: Dict[str, Any], semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    """Run one /batch operation; failures become the item's status instead of raising."""
+    op = operation.get("op")
+    item: Dict[str, Any] = {"index": index, "op": op}
+    started = time.perf_counter()
+    try:
+        spec = BATCH_OPERATIONS.get(op) if isinstance(op, str) else None
+        if spec is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown op {op!r}; expected one of {', '.join(BATCH_OPERATIONS)}.",
+            )
+        model, list_caps, handler = spec
+        data = operation.get("payload")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="payload must be a JSON object.")
+        payload, sizes = payload_from_data(model, dict(data), **list_caps)
+        async with semaphore:
+            item["result"] = await handler(payload, sizes)
+        item["status"] = 200
     except Exception as error:  # pylint: disable=broad-except
-        raise HTTPException(status_code=500, detail=str(error)) from error
+        http_error = bridge_http_error(error)
+        item["status"] = http_error.status_code
+        item["error"] = http_error.detail
+        retry_after = (http_error.headers or {}).get("Retry-After")
+        if retry_after:
+            item["retry_after"] = int(retry_after)
+    item["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    # Caller-chosen op strings would give the counter unbounded label values.
+    known = isinstance(op, str) and op in BATCH_OPERATIONS
+    BATCH_OPERATIONS_RUN.inc(op if known else "unknown", str(item["status"]))
+    return item
+
+
+@app.post("/batch")
+async def batch(request: Request):
+    """
+    Run a list of ``{"op": "format"|"sql"|"shopping"|"interpret", "payload": {...}}``
+    operations concurrently, at most ``BATCH_CONCURRENCY`` at a time and at the
+    batch's priority (background unless it asks for interactive). Each payload is
+    the body the op's own route takes. Results come back in request order, each
+    with its own status; one failed operation does not fail the batch.
+    """
+    payload, sizes = await read_payload(
+        request, BatchPayload, "batch", operations=BATCH_MAX_ITEMS
+    )
+    if sizes["operations"] > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch has {sizes['operations']} operations; the limit is {BATCH_MAX_ITEMS}.",
+        )
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    token = _batch_priority.set(payload.priority)
+    try:
+        # gather() wraps each operation in a task, which copies the priority set above.
+        results = await asyncio.gather(
+            *(
+                run_batch_operation(index, operation, semaphore)
+                for index, operation in enumerate(payload.operations)
+            )
+        )
+    finally:
+        _batch_priority.reset(token)
+    failed = sum(1 for item in results if item["status"] >= 400)
+    return BridgeJSONResponse(
+        {
+            "results": results,
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+    )
 
 
 if __name__ == "__main__":
     import uvicorn
 
+    port = int(os.getenv("DEDALUS_BRIDGE_PORT", "8000"))
+    if WORKERS > 1 and not SHARED_STATE_PATH:
+        # Workers re-import this module, so they pick the shared file up from the env.
+        os.environ["DEDALUS_BRIDGE_SHARED_STATE"] = os.path.join(
+            tempfile.gettempdir(), f"dedalus-bridge-{port}.sqlite3"
+        )
     uvicorn.run(
         "dedalus_bridge:app",
         host=os.getenv("DEDALUS_BRIDGE_HOST", "0.0.0.0"),
-        port=int(os.getenv("DEDALUS_BRIDGE_PORT", "8000")),
+        port=port,
         reload=False,
+        workers=WORKERS,
     )
 
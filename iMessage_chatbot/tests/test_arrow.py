@@ -0,0 +1,68 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from bridge_arrow import (  # noqa: E402  pylint: disable=wrong-import-position
+    ARROW_STREAM_TYPE,
+    InvalidArrowStream,
+    compact_arrow,
+    read_arrow_stream,
+)
+
+
+def test_numeric_column_with_nulls_and_fewer_values_than_top_k():
+    table = pa.table({"amount": pa.array([1, None])})
+    stats = compact_arrow(table, top_k=3).stats["amount"]
+    assert stats == {"count": 1, "sum": 1, "mean": 1, "min": 1, "max": 1, "top": [1]}
+
+
+def test_nested_columns_only_report_counts():
+    table = pa.table(
+        {
+            "tags": pa.array([["a", "b"], None, ["a"]]),
+            "item": pa.array([{"sku": 1}, {"sku": 2}, {"sku": 1}]),
+            "merchant": pa.array(["Amazon", "Target", "Amazon"]),
+        }
+    )
+    stats = compact_arrow(table).stats
+    assert stats["tags"] == {"count": 2}
+    assert stats["item"] == {"count": 3}
+    assert stats["merchant"]["top"][0] == ["Amazon", 2]
+
+
+def test_dictionary_encoded_columns_are_decoded():
+    table = pa.table(
+        {
+            "merchant": pa.array(["Amazon", "Target", "Amazon"]).dictionary_encode(),
+            "quantity": pa.array([1, 2, 1]).dictionary_encode(),
+        }
+    )
+    stats = compact_arrow(table).stats
+    assert stats["merchant"]["min"] == "Amazon" and stats["merchant"]["max"] == "Target"
+    assert stats["merchant"]["top"][0] == ["Amazon", 2]
+    assert stats["quantity"]["sum"] == 4
+
+
+def test_truncated_stream_is_rejected():
+    sink = pa.BufferOutputStream()
+    table = pa.table({"amount": [1.5, 2.5]})
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    body = sink.getvalue().to_pybytes()
+    for broken in (body[: len(body) // 2], b"not arrow"):
+        with pytest.raises(InvalidArrowStream):
+            read_arrow_stream(broken)
+
+
+def test_format_results_answers_400_for_a_malformed_stream():
+    dedalus_bridge = pytest.importorskip("dedalus_bridge")
+    testclient = pytest.importorskip("fastapi.testclient")
+    with testclient.TestClient(dedalus_bridge.app) as client:
+        response = client.post(
+            "/format-results",
+            params={"user_query": "q", "sql_query": "SELECT 1"},
+            content=b"not arrow",
+            headers={"Content-Type": ARROW_STREAM_TYPE},
+        )
+    assert response.status_code == 400
+    assert "Arrow IPC" in response.json()["detail"]
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.mark.parametrize("max_rows", [-1, 0, 10**9])
+def test_ask_rejects_out_of_range_max_rows(max_rows):
+    dedalus_bridge = pytest.importorskip("dedalus_bridge")
+    testclient = pytest.importorskip("fastapi.testclient")
+    with testclient.TestClient(dedalus_bridge.app) as client:
+        response = client.post("/ask", json={"message": "recent orders", "max_rows": max_rows})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] == "max_rows"
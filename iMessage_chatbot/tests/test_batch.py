@@ -0,0 +1,14 @@
+import pytest
+
+
+def test_unknown_ops_share_one_metric_label():
+    dedalus_bridge = pytest.importorskip("dedalus_bridge")
+    testclient = pytest.importorskip("fastapi.testclient")
+    operations = [{"op": f"made-up-{index}", "payload": {}} for index in range(3)]
+    operations.append({"op": ["not", "a", "string"], "payload": {}})
+    with testclient.TestClient(dedalus_bridge.app) as client:
+        response = client.post("/batch", json={"operations": operations})
+        assert [item["status"] for item in response.json()["results"]] == [400] * 4
+        lines = client.get("/metrics").text.splitlines()
+    ops = [line for line in lines if line.startswith("bridge_batch_operations_total")]
+    assert ops and all('op="unknown"' in line for line in ops)
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from bridge_intents import IntentClassifier, parse_limit, unresolved_constraints
+
+TODAY = date(2024, 6, 15)
+
+# Each names a merchant or time range the slots cannot carry, or an ordering or
+# filter they have no place for.
+UNRESOLVED = [
+    ("How much did I spend at Amazon vs Walmart?", "several merchants"),
+    ("How much did I spend everywhere except Amazon last month?", "negation"),
+    ("How much did I spend at Costco in 2024?", "unresolved time"),
+    ("How much did I spend between January and March?", "unresolved time"),
+    ("Show my recent orders over $100", "amount threshold"),
+    ("Which merchant did I spend the least at?", "ascending order"),
+    ("How much did I spend after October 1st?", "unresolved time"),
+    ("how much did I spend at Starbucks", "unknown merchant"),
+    ("recent orders from wayfair", "unknown merchant"),
+    ("total spend on tv", "qualifier"),
+    ("spend on food", "qualifier"),
+    ("how much did I spend in groceries", "qualifier"),
+    ("show my cancelled orders", "order status"),
+    ("how much did I spend with apple pay", "payment method"),
+]
+
+RESOLVED = [
+    ("How much did I spend at Amazon last month?", "total_spend"),
+    ("how much did I spend in March 2024", "total_spend"),
+    ("how much did I spend in the last 90 days", "total_spend"),
+    ("show my last 5 orders", "recent_orders"),
+    ("monthly spending breakdown", "monthly_breakdown"),
+    ("can I afford a $500 tv", "affordability"),
+    ("how much did I spend at Uber Eats this month", "total_spend"),
+    ("5 most recent orders", "recent_orders"),
+]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("last 90 days", None),
+        ("last 2 weeks", None),
+        ("last 5 orders", 5),
+        ("top three", 3),
+        ("5 most recent orders", 5),
+        ("three biggest purchases", 3),
+    ],
+)
+def test_parse_limit_skips_time_ranges(text, expected):
+    assert parse_limit(text) == expected
+
+
+@pytest.mark.parametrize("message, reason", UNRESOLVED)
+def test_unresolved_constraints(message, reason):
+    assert reason in unresolved_constraints(message.lower(), TODAY)
+
+
+@pytest.mark.parametrize("message, _", UNRESOLVED)
+def test_classify_defers_unresolved_constraints(message, _):
+    _, confidence = IntentClassifier().classify(message, TODAY)
+    assert confidence < 0.8
+
+
+@pytest.mark.parametrize("message, intent", RESOLVED)
+def test_classify_keeps_resolved_questions(message, intent):
+    result, confidence = IntentClassifier().classify(message, TODAY)
+    assert result["intent"] == intent
+    assert confidence >= 0.8
+    assert not unresolved_constraints(message.lower(), TODAY)
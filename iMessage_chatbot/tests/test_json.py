@@ -0,0 +1,54 @@
+import pytest
+
+from bridge_json import InvalidPayload, PayloadTooLarge, decode_payload
+
+
+def test_invalid_json_reports_its_position():
+    with pytest.raises(InvalidPayload) as caught:
+        decode_payload(b'{"user_query": ', max_bytes=1024, list_caps={})
+    detail = caught.value.detail()
+    assert detail[0]["type"] == "json_invalid" and detail[0]["loc"][0] == "body"
+
+
+def test_row_lists_must_hold_objects():
+    with pytest.raises(InvalidPayload) as caught:
+        decode_payload(b'{"results": [1, 2]}', max_bytes=1024, list_caps={"results": 10})
+    assert caught.value.detail()[0]["loc"] == ["body", "results"]
+
+
+def test_oversized_body_is_refused_before_decoding():
+    with pytest.raises(PayloadTooLarge):
+        decode_payload(b"not json at all", max_bytes=4, list_caps={})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    dedalus_bridge = pytest.importorskip("dedalus_bridge")
+    testclient = pytest.importorskip("fastapi.testclient")
+    monkeypatch.setattr(dedalus_bridge, "MAX_BODY_BYTES", 64)
+    with testclient.TestClient(dedalus_bridge.app) as test_client:
+        yield test_client
+
+
+def test_invalid_json_answers_422(client):
+    response = client.post(
+        "/format-results", content=b"{not json", headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+
+def test_non_object_body_answers_422(client):
+    response = client.post("/format-results", json=[1, 2, 3])
+    assert response.status_code == 422
+
+
+def test_declared_length_over_the_limit_answers_413(client):
+    response = client.post("/format-results", content=b"x" * 65)
+    assert response.status_code == 413
+
+
+def test_chunked_body_is_cut_off_at_the_limit(client):
+    response = client.post("/format-results", content=(b"x" * 40 for _ in range(4)))
+    assert response.status_code == 413
+    assert "over 64 bytes" in response.json()["detail"]
@@ -0,0 +1,34 @@
+import pytest
+
+from bridge_limits import ModelLimiter
+from bridge_shared import SharedSlots, SharedStore
+
+
+@pytest.fixture
+def shared_limiter(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store, other_worker = SharedStore(path), SharedStore(path)
+    # Another worker holds a slot for a model this one has never called.
+    assert SharedSlots(other_worker).try_acquire("other/model", 2) is not None
+    yield ModelLimiter(
+        {"openai/gpt-5-mini": 2},
+        default_limit=2,
+        max_queue=4,
+        queue_timeout=1.0,
+        shared=SharedSlots(store),
+    )
+    store.close()
+    other_worker.close()
+
+
+def test_describe_lists_models_used_by_other_workers(shared_limiter):
+    lanes = shared_limiter.describe()
+    assert lanes["other/model"] == {"shared_active": 1}
+    assert "priorities" in lanes["openai/gpt-5-mini"]
+
+
+def test_state_metrics_render_shared_only_lanes(shared_limiter, monkeypatch):
+    dedalus_bridge = pytest.importorskip("dedalus_bridge")
+    monkeypatch.setattr(dedalus_bridge.app.state, "model_limiter", shared_limiter, raising=False)
+    lines = dedalus_bridge._collect_state_metrics()
+    assert 'bridge_model_lane{model="other/model",field="shared_active"} 1' in lines
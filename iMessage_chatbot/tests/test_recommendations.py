@@ -0,0 +1,95 @@
+import asyncio
+import csv
+
+import pytest
+
+from bridge_recommendations import HISTORY_SQL, MERCHANTS_SQL, input_fingerprint, shopping_inputs
+
+
+def test_rows_without_a_merchant_are_not_favorites():
+    history_rows = [
+        {"MERCHANT_NAME": None, "PRODUCT_NAME": "Gift card", "PRODUCT_TOTAL": 25, "DATETIME": "x"},
+        {"MERCHANT_NAME": "Target", "PRODUCT_NAME": "Soap", "PRODUCT_TOTAL": 4, "DATETIME": "y"},
+    ]
+    inputs = shopping_inputs(history_rows, [])
+    assert inputs["favorite_merchants"] == ["Target"]
+
+
+def test_fingerprint_ignores_missing_favorites():
+    assert input_fingerprint([], [None, "Target", ""], []) == input_fingerprint([], ["Target"], [])
+
+
+TRANSACTIONS = [
+    # transaction_id, merchant_name, datetime, price_total
+    ("t1", "Amazon", "2024-05-01T10:00:00", 30.0),
+    ("t2", "Target", "2024-05-03T09:30:00", 12.5),
+    ("t3", "Amazon", "2024-05-04T18:00:00", 7.25),
+]
+PRODUCTS = [
+    # transaction_id, product_name, product_total
+    ("t1", "Headphones", 25.0),
+    ("t1", "Cable", 5.0),
+    ("t2", "Soap", 12.5),
+    ("t3", "Batteries", 7.25),
+]
+
+
+def chatbot_fallback_payload():
+    """What chat.js sends from local data (localShoppingInputs and favorite merchants)."""
+    datetimes = {tx_id: (merchant, when) for tx_id, merchant, when, _ in TRANSACTIONS}
+    items = [
+        {
+            "merchant": datetimes[tx_id][0],
+            "product": name,
+            "amount": total,
+            "date": datetimes[tx_id][1],
+        }
+        for tx_id, name, total in PRODUCTS
+    ]
+    history = sorted(items, key=lambda item: item["date"], reverse=True)[:50]
+    spend = {}
+    for _, merchant, _, total in TRANSACTIONS:
+        row = spend.setdefault(merchant, {"name": merchant, "count": 0, "total": 0.0})
+        row["count"] += 1
+        row["total"] += total
+    top_merchants = sorted(spend.values(), key=lambda row: row["total"], reverse=True)[:10]
+    favorites = list(dict.fromkeys(item["merchant"] for item in history))[:5]
+    return top_merchants, favorites, history
+
+
+def test_chatbot_fallback_fingerprints_like_the_job(tmp_path):
+    executors = pytest.importorskip("bridge_executors")
+    transactions = tmp_path / "transactions.csv"
+    with transactions.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["transaction_id", "merchant_name", "datetime", "price_total"])
+        writer.writerows(TRANSACTIONS)
+    products = tmp_path / "products.csv"
+    merchants = {tx_id: merchant for tx_id, merchant, _, _ in TRANSACTIONS}
+    with products.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            [
+                "transaction_id",
+                "merchant_name",
+                "product_name",
+                "product_total",
+                "product_external_id",
+                "product_unit_price",
+                "eligibility",
+            ]
+        )
+        for tx_id, name, total in PRODUCTS:
+            writer.writerow([tx_id, merchants[tx_id], name, total, name.lower(), total, ""])
+    executor = executors.SQLiteExecutor({"transactions": transactions, "products": products})
+
+    async def job_inputs():
+        history = await executor.execute(HISTORY_SQL)
+        merchant_rows = await executor.execute(MERCHANTS_SQL)
+        return shopping_inputs(history, merchant_rows)
+
+    inputs = asyncio.run(job_inputs())
+    job = input_fingerprint(
+        inputs["top_merchants"], inputs["favorite_merchants"], inputs["purchase_history"]
+    )
+    assert input_fingerprint(*chatbot_fallback_payload()) == job
@@ -0,0 +1,30 @@
+from bridge_results import column_stats, compact_results, summarize_results
+
+
+def test_zero_padded_strings_stay_text():
+    stats = column_stats(["0012", "0012", "0345"])
+    assert "sum" not in stats
+    assert stats["top"][0] == ["0012", 2]
+
+
+def test_decimal_strings_are_numbers():
+    stats = column_stats(["12.50", "7", "-0.5"])
+    assert stats["sum"] == 19
+    assert stats["max"] == 12.5
+
+
+def test_long_digit_strings_stay_text():
+    assert "sum" not in column_stats(["4111111111111111", "4000056655665556"])
+
+
+def test_render_states_rows_cut_by_the_cap():
+    rows = [{"amount": index} for index in range(10)]
+    full = compact_results(rows)
+    assert "Exact statistics over all 10 row(s)" in full.render()
+
+    capped = compact_results(rows, sent_rows=250)
+    assert capped.total_rows == 250 and capped.dropped_rows == 240
+    rendered = capped.render()
+    assert "Exact" not in rendered
+    assert "first 10 of 250 row(s)" in rendered
+    assert summarize_results(capped).startswith("The query returned 250 row(s).")
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+from bridge_shared import SharedFlights, SharedResponseCache, SharedSlots, SharedStore
+
+
+def test_store_calls_run_off_the_event_loop(tmp_path):
+    store = SharedStore(str(tmp_path / "state.sqlite3"))
+    cache = SharedResponseCache(store)
+
+    async def scenario():
+        await cache.aset("generate-sql", "key", "SELECT 1")
+        thread = await store.run(threading.current_thread)
+        return await cache.aget("generate-sql", "key"), thread
+
+    value, thread = asyncio.run(scenario())
+    store.close()
+    assert value == "SELECT 1"
+    assert thread is not threading.main_thread()
+
+
+def test_cancelled_acquire_gives_its_slot_back(tmp_path):
+    store = SharedStore(str(tmp_path / "state.sqlite3"))
+    slots = SharedSlots(store)
+    entered = threading.Event()
+    proceed = threading.Event()
+    try_acquire = slots.try_acquire
+
+    def slow_try_acquire(model, limit):
+        entered.set()
+        proceed.wait(5)
+        return try_acquire(model, limit)
+
+    slots.try_acquire = slow_try_acquire
+
+    async def scenario():
+        task = asyncio.ensure_future(slots.acquire("model-a", 1, timeout=5))
+        await asyncio.to_thread(entered.wait, 5)
+        task.cancel()
+        proceed.set()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # The abandoned slot is released by a delete queued behind the acquire.
+        await store.run(lambda: None)
+        await store.run(lambda: None)
+        return slots.active()
+
+    assert asyncio.run(scenario()) == {}
+    store.close()
+
+
+def test_flight_lease_is_released_after_the_call(tmp_path):
+    store = SharedStore(str(tmp_path / "state.sqlite3"))
+    flights = SharedFlights(SharedResponseCache(store))
+
+    async def answer():
+        return "answer"
+
+    async def scenario():
+        result = await flights.do("key", answer)
+        await store.run(lambda: None)
+        return result, await store.run(flights._held, "key")
+
+    assert asyncio.run(scenario()) == ("answer", False)
+    store.close()
@@ -0,0 +1,17 @@
+from bridge_sql_examples import SQLExampleStore
+
+
+def test_recorded_examples_are_found(tmp_path):
+    store = SQLExampleStore(str(tmp_path / "examples.sqlite3"), min_score=0.0)
+    store.record("total spent at Amazon", "SELECT SUM(amount) FROM t", "schema-1")
+    examples = store.nearest("how much at Amazon in total", "schema-1")
+    assert [example.sql for example in examples] == ["SELECT SUM(amount) FROM t"]
+    assert store.nearest("how much at Amazon in total", "schema-2") == []
+    store.close()
+
+
+def test_describe_does_not_wait_for_a_busy_lookup(tmp_path):
+    store = SQLExampleStore(str(tmp_path / "examples.sqlite3"))
+    with store._lock:
+        assert store.describe()["examples"] == 0
+    store.close()
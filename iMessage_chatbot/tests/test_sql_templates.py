@@ -0,0 +1,77 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from bridge_sql_templates import SQLTemplateLibrary
+
+TODAY = date(2024, 6, 15)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "How much did I spend at Amazon vs Walmart?",
+        "How much did I spend at Amazon compared to Target?",
+        "How much did I spend everywhere except Amazon last month?",
+        "Total spending excluding Costco",
+        "How much did I spend at Costco in 2024?",
+        "How much did I spend between January and March?",
+        "Show my recent orders over $100",
+        "Show recent orders of more than $50",
+        "Which merchant did I spend the least at?",
+        "How much did I spend after October 1st?",
+        "How much did I spend at Best Buy last month?",
+        "How much did I spend at Starbucks?",
+        "recent orders from wayfair",
+        "top 3 products at bestbuy",
+        "How much did I spend in groceries?",
+        "How much did I spend via apple pay?",
+        "Total spending by visa",
+        "Show my recent cancelled orders",
+        "Show my recent delivered orders",
+        "5 most recent cancelled orders",
+        "Show 5 of my recent orders",
+    ],
+)
+def test_unresolved_constraints_do_not_match(question):
+    assert SQLTemplateLibrary().match(question, today=TODAY) is None
+
+
+@pytest.mark.parametrize(
+    "question, name, fragments",
+    [
+        (
+            "How much did I spend at Amazon last month?",
+            "total_spend",
+            ["UPPER('Amazon')", "datetime >= '2024-05-01'", "datetime < '2024-06-01'"],
+        ),
+        ("Show my last 5 orders", "recent_transactions", ["LIMIT 5"]),
+        ("Spending by merchant this year", "spend_by_merchant", ["datetime >= '2024-01-01'"]),
+        ("monthly spending at Target", "monthly_spending_trend", ["UPPER('Target')"]),
+        ("How much did I spend in March 2024?", "total_spend", ["datetime >= '2024-03-01'"]),
+        ("5 most recent orders", "recent_transactions", ["LIMIT 5"]),
+        ("recent orders from Uber Eats", "recent_transactions", ["UPPER('Ubereats')"]),
+    ],
+)
+def test_slot_questions_match(question, name, fragments):
+    match = SQLTemplateLibrary().match(question, today=TODAY)
+    assert match is not None and match.name == name
+    for fragment in fragments:
+        assert fragment in match.sql
+
+
+def test_monthly_trend_renders_the_executor_dialect():
+    library = SQLTemplateLibrary()
+    snowflake = library.match("monthly spending", today=TODAY)
+    sqlite = library.match("monthly spending", today=TODAY, dialect="sqlite")
+    assert "DATE_TRUNC('month', datetime)" in snowflake.sql
+    assert "DATE_TRUNC" not in sqlite.sql
+    assert "GROUP BY strftime('%Y-%m', datetime)" in sqlite.sql
+
+
+def test_monthly_trend_runs_on_sqlite():
+    executors = pytest.importorskip("bridge_executors")
+    match = SQLTemplateLibrary().match("monthly spending", today=TODAY, dialect="sqlite")
+    rows = asyncio.run(executors.SQLiteExecutor().execute(match.sql))
+    assert rows and all(len(row["month"]) == 7 for row in rows)